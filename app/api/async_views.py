@@ -0,0 +1,227 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from app.api.events import get_shopping_list_channel
+from app.api.mixins import ShoppingListConditionalGetMixin
+from app.api.models import ShoppingItem, ShoppingList
+from app.api.permission import annotate_membership, remember_shopping_list_membership
+from app.api.serializers import ShoppingItemValuesSerializer, ShoppingListSummaryValuesSerializer, ShoppingListValuesSerializer
+from utils.authentication import CachedTokenAuthentication
+from utils.events import get_event_hub
+from utils.pagination import ShoppingItemPagination
+from utils.renderers import FastJSONRenderer
+from utils.timing import stage
+
+
+class StreamingUnavailable(exceptions.APIException):
+    status_code = 501
+    default_detail = "Event streams are only served under ASGI."
+    default_code = "streaming_unavailable"
+
+
+class AsyncAPIView(View):
+    """
+    Read only counterpart of DRF's APIView for ASGI deployments. Authentication, throttling
+    and permission checks await the async ORM instead of occupying a worker thread, and
+    responses are rendered exactly like the JSON responses of the sync views.
+    """
+    http_method_names = ["get", "head", "options"]
+    renderer = FastJSONRenderer()
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    pagination_class = api_settings.DEFAULT_PAGINATION_CLASS
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.request = Request(request)
+        self.request.accepted_renderer = self.renderer
+
+        if request.method.lower() in self.http_method_names:
+            handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+        else:
+            handler = self.http_method_not_allowed
+
+        try:
+            await self.initial(self.request)
+            return await handler(self.request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return self.handle_exception(exc)
+
+    async def initial(self, request):
+        with stage("auth"):
+            request.user = await self.authenticate(request)
+        if not request.user.is_authenticated:
+            raise exceptions.NotAuthenticated()
+
+        with stage("throttle"):
+            await self.check_throttles(request)
+
+    async def authenticate(self, request):
+        # Same order as DEFAULT_AUTHENTICATION_CLASSES: the session first, then the token
+        user = await request._request.auser()
+        if user.is_authenticated:
+            return user
+
+        credentials = await CachedTokenAuthentication().aauthenticate(request)
+        if credentials is not None:
+            return credentials[0]
+
+        return user
+
+    async def check_throttles(self, request):
+        throttle_durations = []
+        for throttle in [throttle_class() for throttle_class in self.throttle_classes]:
+            # The throttles may hit the shared rate store, which is sync code
+            if not await sync_to_async(throttle.allow_request)(request, self):
+                throttle_durations.append(throttle.wait())
+
+        if throttle_durations:
+            durations = [duration for duration in throttle_durations if duration is not None]
+            raise exceptions.Throttled(max(durations, default=None))
+
+    async def get_shopping_list(self, request, pk, not_found_message):
+        shopping_lists = annotate_membership(ShoppingList.objects.all(), request.user)
+        with stage("permission"):
+            shopping_list = await shopping_lists.filter(pk=pk).afirst()
+
+        if shopping_list is None:
+            raise exceptions.NotFound(not_found_message)
+
+        remember_shopping_list_membership(request, shopping_list.pk, shopping_list.is_member)
+        if not request.user.is_superuser and not shopping_list.is_member:
+            raise exceptions.PermissionDenied()
+
+        return shopping_list
+
+    async def paginate_queryset(self, queryset):
+        if self.pagination_class is None:
+            self.paginator = None
+            return [instance async for instance in queryset]
+
+        self.paginator = self.pagination_class()
+        if hasattr(self.paginator, "apaginate_queryset"):
+            return await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+
+        return await sync_to_async(self.paginator.paginate_queryset)(queryset, self.request, view=self)
+
+    def get_paginated_data(self, data):
+        if self.paginator is None:
+            return data
+
+        return self.paginator.get_paginated_response(data).data
+
+    def render(self, data, status=200):
+        return HttpResponse(self.renderer.render(data), content_type=self.renderer.media_type, status=status)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            # Like the sync views, whose session authentication sends no WWW-Authenticate header
+            exc.status_code = 403
+
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+        response = self.render(data, status=exc.status_code)
+
+        if getattr(exc, "wait", None):
+            response["Retry-After"] = "%d" % exc.wait
+
+        return response
+
+
+class AsyncListShoppingLists(AsyncAPIView):
+
+    async def get(self, request, *args, **kwargs):
+        queryset = ShoppingList.objects.filter(members=request.user).values(*ShoppingListSummaryValuesSerializer.get_value_fields())
+        page = await self.paginate_queryset(queryset)
+        # The members of the page are read while serializing
+        data = await sync_to_async(lambda: ShoppingListSummaryValuesSerializer(page, many=True).data)()
+
+        return self.render(self.get_paginated_data(data))
+
+
+class AsyncShoppingListDetail(ShoppingListConditionalGetMixin, AsyncAPIView):
+
+    async def get(self, request, pk, *args, **kwargs):
+        shopping_list = await self.get_shopping_list(request, pk, "No ShoppingList matches the given query.")
+
+        not_modified = self.get_not_modified_response(request, shopping_list)
+        if not_modified is not None:
+            return not_modified
+
+        serializer = ShoppingListValuesSerializer(ShoppingListValuesSerializer.get_row(shopping_list))
+        response = self.render(await sync_to_async(lambda: serializer.data)())
+
+        return self.set_conditional_headers(request, response, shopping_list)
+
+
+class AsyncListShoppingItems(ShoppingListConditionalGetMixin, AsyncAPIView):
+    pagination_class = ShoppingItemPagination
+
+    async def get(self, request, pk, *args, **kwargs):
+        shopping_list = await self.get_shopping_list(request, pk, "The specified shopping list does not exist")
+
+        not_modified = self.get_not_modified_response(request, shopping_list)
+        if not_modified is not None:
+            return not_modified
+
+        queryset = ShoppingItem.objects.filter(shopping_list=pk).order_by("purchased", "id")
+        page = await self.paginate_queryset(queryset.values(*ShoppingItemValuesSerializer.get_value_fields()))
+        serializer = ShoppingItemValuesSerializer(page, many=True)
+        response = self.render(self.get_paginated_data(serializer.data))
+
+        return self.set_conditional_headers(request, response, shopping_list)
+
+
+class ShoppingListEvents(AsyncAPIView):
+    """
+    Streams the changes of a shopping list as server-sent events until the list is deleted
+    or the client is removed from its members. utils.asgi.ASGIHandler serves it without a
+    thread per open stream.
+    """
+    long_lived = True
+    retry = 3000
+
+    async def get(self, request, pk, *args, **kwargs):
+        if not isinstance(request._request, ASGIRequest):
+            # A WSGI worker would be held for the lifetime of the stream
+            raise StreamingUnavailable()
+
+        await self.get_shopping_list(request, pk, "The specified shopping list does not exist")
+
+        response = StreamingHttpResponse(self.stream(request, pk), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+
+        return response
+
+    async def stream(self, request, pk):
+        with get_event_hub().subscribe(get_shopping_list_channel(pk)) as subscription:
+            yield f"retry: {self.retry}\n\n"
+
+            while True:
+                try:
+                    event = await subscription.get(timeout=settings.EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                if event is None:
+                    # Fell behind, the client reconnects and refetches the list
+                    return
+
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+                if self.ends_stream(request, event):
+                    return
+
+    def ends_stream(self, request, event):
+        if event["type"] == "list.deleted":
+            return True
+
+        return event["type"] == "members.removed" and request.user.pk in event["members"] and not request.user.is_superuser
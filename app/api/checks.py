@@ -0,0 +1,40 @@
+from django.core import checks
+from django.db import connections
+
+from app.api.search import FTS_TABLE
+
+FTS_TRIGGERS = {f"{FTS_TABLE}_insert", f"{FTS_TABLE}_delete", f"{FTS_TABLE}_update"}
+
+
+@checks.register(checks.Tags.database)
+def check_search_triggers(app_configs, databases=None, **kwargs):
+    """
+    The triggers that keep the FTS5 search index in sync with the items. SQLite migrations that
+    rebuild the api_shoppingitem table drop them and renumber the rowids the index refers to.
+    """
+    errors = []
+    for alias in databases or []:
+        connection = connections[alias]
+        if connection.vendor != "sqlite":
+            continue
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT type, name FROM sqlite_master WHERE name = %s OR tbl_name = 'api_shoppingitem'", [FTS_TABLE])
+            names = {name for object_type, name in cursor.fetchall() if object_type in ("table", "trigger")}
+
+        # Before migration 0007
+        if FTS_TABLE not in names:
+            continue
+
+        missing = sorted(FTS_TRIGGERS - names)
+        if missing:
+            errors.append(checks.Warning(
+                f"The item search index of database {alias} is not kept in sync, {', '.join(missing)} missing.",
+                hint=(
+                    "Recreate the triggers of migration 0007_shoppingitem_search and rebuild the index with "
+                    f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')."
+                ),
+                id="api.W001",
+            ))
+
+    return errors
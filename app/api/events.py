@@ -0,0 +1,33 @@
+from collections import defaultdict
+
+from utils.events import publish
+
+
+def get_shopping_list_channel(shopping_list_id):
+    return f"shopping-list:{shopping_list_id}"
+
+
+def get_item_event_data(shopping_item):
+    if isinstance(shopping_item, dict):
+        return {"id": str(shopping_item["id"]), "name": shopping_item["name"], "purchased": shopping_item["purchased"]}
+
+    return {"id": str(shopping_item.id), "name": shopping_item.name, "purchased": shopping_item.purchased}
+
+
+def publish_shopping_list_event(shopping_list_id, event_type, **data):
+    channel = get_shopping_list_channel(shopping_list_id)
+    publish(channel, {"type": event_type, "shopping_list": str(shopping_list_id), **data})
+
+
+def publish_item_events(event_type, shopping_items):
+    """
+    Publish one event per shopping list for the items, which are instances or values() rows
+    with id, name, purchased and shopping_list_id.
+    """
+    items_by_list = defaultdict(list)
+    for shopping_item in shopping_items:
+        shopping_list_id = shopping_item["shopping_list_id"] if isinstance(shopping_item, dict) else shopping_item.shopping_list_id
+        items_by_list[shopping_list_id].append(get_item_event_data(shopping_item))
+
+    for shopping_list_id, items in items_by_list.items():
+        publish_shopping_list_event(shopping_list_id, event_type, items=items)
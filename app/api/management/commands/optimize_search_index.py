@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from app.api.search import optimize_search_index
+
+
+class Command(BaseCommand):
+    help = "Merge the item search index, after bulk writes or periodically."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        optimize_search_index(options["database"])
+        self.stdout.write("Optimized the item search index")
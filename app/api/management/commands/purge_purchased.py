@@ -0,0 +1,55 @@
+import datetime
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app.api.models import ShoppingItem, ShoppingItemTombstone, ShoppingList, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete purchased shopping items in batches, of a list, of the lists of a user or of all lists,"
+        " and the tombstones of their deleted items older than --tombstone-days."
+    )
+
+    def add_arguments(self, parser):
+        scope = parser.add_mutually_exclusive_group(required=True)
+        scope.add_argument("--shopping-list", help="the id of the list")
+        scope.add_argument("--user", help="the username of the member of the lists")
+        scope.add_argument("--all", action="store_true", help="all lists")
+        parser.add_argument("--batch-size", type=int, default=1000, help="the items deleted per transaction")
+        parser.add_argument(
+            "--tombstone-days", type=int, default=30,
+            help="the days that delta sync clients can be behind, older ones start over",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+        if options["tombstone_days"] < 0:
+            raise CommandError("--tombstone-days must not be negative")
+
+        queryset = ShoppingItem.objects.all()
+        tombstones = ShoppingItemTombstone.objects.all()
+        if options["shopping_list"]:
+            try:
+                if not ShoppingList.objects.filter(pk=options["shopping_list"]).exists():
+                    raise CommandError(f"Shopping list {options['shopping_list']} does not exist")
+            except ValidationError:
+                raise CommandError(f"{options['shopping_list']} is not a valid shopping list id")
+            queryset = queryset.filter(shopping_list_id=options["shopping_list"])
+            tombstones = tombstones.filter(shopping_list_id=options["shopping_list"])
+        elif options["user"]:
+            user = User.objects.filter(username=options["user"]).first()
+            if user is None:
+                raise CommandError(f"User {options['user']} does not exist")
+            queryset = queryset.filter(shopping_list__members=user)
+            tombstones = tombstones.filter(shopping_list__members=user)
+
+        deleted = queryset.delete_purchased(batch_size=options["batch_size"])
+        self.stdout.write(f"Deleted {deleted} purchased shopping items")
+
+        before = timezone.now() - datetime.timedelta(days=options["tombstone_days"])
+        pruned = tombstones.prune(before, batch_size=options["batch_size"])
+        self.stdout.write(f"Pruned {pruned} tombstones older than {options['tombstone_days']} days")
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from utils.throttling import DatabaseRateStore
+
+
+class Command(BaseCommand):
+    help = "Delete the rate limit rows of utils.throttling.DatabaseRateStore whose arrival is in the past, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="the rows deleted per query")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        pruned = DatabaseRateStore().prune(now=time.time(), batch_size=options["batch_size"])
+
+        self.stdout.write(f"Deleted {pruned} expired rate limits")
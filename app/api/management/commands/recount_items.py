@@ -0,0 +1,40 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from app.api.models import ShoppingList
+
+
+class Command(BaseCommand):
+    help = "Recompute the item counters of a list or of all lists from their items, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shopping-list", help="the id of the list, all lists by default")
+        parser.add_argument("--batch-size", type=int, default=1000, help="the lists recounted per transaction")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        queryset = ShoppingList.objects.order_by("pk")
+        if options["shopping_list"]:
+            try:
+                queryset = queryset.filter(pk=options["shopping_list"])
+                if not queryset.exists():
+                    raise CommandError(f"Shopping list {options['shopping_list']} does not exist")
+            except ValidationError:
+                raise CommandError(f"{options['shopping_list']} is not a valid shopping list id")
+
+        recounted = 0
+        last_pk = None
+        while True:
+            batch = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            pks = list(batch.values_list("pk", flat=True)[:options["batch_size"]])
+            if not pks:
+                break
+
+            with transaction.atomic():
+                recounted += ShoppingList.objects.filter(pk__in=pks).recount()
+            last_pk = pks[-1]
+
+        self.stdout.write(f"Recounted the items of {recounted} shopping lists")
@@ -0,0 +1,150 @@
+import csv
+import io
+import itertools
+import random
+import time
+import uuid
+
+from array import array
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from app.api.models import ShoppingItem, ShoppingList, User
+from app.api.search import optimize_search_index
+
+PRODUCTS = [
+    "Apples", "Bananas", "Bread", "Butter", "Cheese", "Coffee", "Eggs", "Flour", "Milk", "Oats",
+    "Onions", "Pasta", "Pepper", "Potatoes", "Rice", "Salt", "Sugar", "Tea", "Tomatoes", "Yogurt",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate deterministic synthetic users, shopping lists, memberships and items for load tests. "
+        "Rows are streamed in batches, through COPY on PostgreSQL and bulk_create elsewhere."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--lists", type=int, default=1000)
+        parser.add_argument("--members-per-list", type=int, default=5)
+        parser.add_argument("--items-per-list", type=int, default=100)
+        parser.add_argument("--purchased-ratio", type=float, default=0.3)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0, help="the same seed generates the same rows")
+        parser.add_argument("--password", default="seed-password", help="the password of every generated user")
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        if options["members_per_list"] > options["users"]:
+            raise CommandError("--members-per-list can't exceed --users")
+
+        self.connection = connections[options["database"]]
+        self.batch_size = options["batch_size"]
+        self.rng = random.Random(options["seed"])
+        self.username_prefix = f"seed-{options['seed']}-"
+
+        if User.objects.using(options["database"]).filter(username__startswith=self.username_prefix).exists():
+            raise CommandError(f"Users of seed {options['seed']} exist already, pick another --seed")
+
+        user_ids = self.seed_users(options["users"], options["password"])
+        list_ids = self.seed_lists(options["lists"])
+        self.seed_memberships(list_ids, user_ids, options["members_per_list"])
+        self.seed_items(list_ids, options["items_per_list"], options["purchased_ratio"])
+
+    def uuid(self):
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def report(self, model, count, start):
+        self.stdout.write(f"{count} {model._meta.verbose_name_plural} in {time.perf_counter() - start:.1f}s")
+
+    def write(self, model, rows):
+        """
+        Insert the rows, dicts of field name to value, in batches and return their count.
+        """
+        count = 0
+        for batch in itertools.batched(rows, self.batch_size):
+            with transaction.atomic(using=self.connection.alias):
+                if self.connection.vendor == "postgresql":
+                    self.copy(model, batch)
+                else:
+                    model.objects.using(self.connection.alias).bulk_create(model(**row) for row in batch)
+            count += len(batch)
+
+        return count
+
+    def copy(self, model, batch):
+        # COPY skips the Django side defaults, so every concrete column is written
+        fields = [field for field in model._meta.concrete_fields if not field.auto_created or field.name in batch[0]]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        for row in batch:
+            obj = model(**row)
+            writer.writerow(field.get_db_prep_save(field.pre_save(obj, True), self.connection) for field in fields)
+        buffer.seek(0)
+
+        columns = ", ".join(self.connection.ops.quote_name(field.column) for field in fields)
+        table = self.connection.ops.quote_name(model._meta.db_table)
+        with self.connection.cursor() as cursor:
+            # The psycopg2 cursor under Django's wrapper
+            cursor.cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+    def seed_users(self, count, password):
+        start = time.perf_counter()
+        # One hash for all users, hashing per user would dominate the run
+        password = make_password(password, salt=self.username_prefix.replace("-", ""))
+        user_ids = array("q")
+
+        users = (User(username=f"{self.username_prefix}{index}", password=password) for index in range(count))
+        for batch in itertools.batched(users, self.batch_size):
+            # Not copied, the generated ids are needed for the memberships
+            with transaction.atomic(using=self.connection.alias):
+                created = User.objects.using(self.connection.alias).bulk_create(batch)
+            user_ids.extend(user.pk for user in created)
+
+        self.report(User, count, start)
+        return user_ids
+
+    def seed_lists(self, count):
+        start = time.perf_counter()
+        list_ids = [self.uuid() for _ in range(count)]
+        self.write(ShoppingList, ({"id": list_id, "name": f"List {index}"} for index, list_id in enumerate(list_ids)))
+
+        self.report(ShoppingList, count, start)
+        return list_ids
+
+    def seed_memberships(self, list_ids, user_ids, members_per_list):
+        start = time.perf_counter()
+        # The through table is filled directly, members.add() would cost queries per list
+        through = ShoppingList.members.through
+        memberships = (
+            {"shoppinglist_id": list_id, "user_id": user_ids[index]}
+            for list_id in list_ids
+            for index in self.rng.sample(range(len(user_ids)), members_per_list)
+        )
+        count = self.write(through, memberships)
+
+        self.report(through, count, start)
+
+    def seed_items(self, list_ids, items_per_list, purchased_ratio):
+        start = time.perf_counter()
+        items = (
+            {
+                "id": self.uuid(),
+                "name": f"{PRODUCTS[index % len(PRODUCTS)]} {index // len(PRODUCTS)}",
+                "purchased": self.rng.random() < purchased_ratio,
+                "shopping_list_id": list_id,
+            }
+            for list_id in list_ids
+            for index in range(items_per_list)
+        )
+        count = self.write(ShoppingItem, items)
+        # The rows skip the item counters of the lists
+        for batch in itertools.batched(list_ids, self.batch_size):
+            ShoppingList.objects.using(self.connection.alias).filter(pk__in=batch).recount()
+        optimize_search_index(self.connection.alias)
+
+        self.report(ShoppingItem, count, start)
@@ -0,0 +1,29 @@
+import django.db.models.deletion
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shoppingitem',
+            index=models.Index(fields=['shopping_list', 'purchased', 'id'], name='shoppingitem_list_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingitem',
+            index=models.Index(condition=models.Q(('purchased', False)), fields=[
+                               'shopping_list', 'name'], name='shoppingitem_unpurchased_idx'),
+        ),
+        # The composite indexes above lead with shopping_list, so the plain foreign key index is redundant
+        migrations.AlterField(
+            model_name='shoppingitem',
+            name='shopping_list',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE,
+                                    related_name='shopping_items', to='api.shoppinglist'),
+        ),
+    ]
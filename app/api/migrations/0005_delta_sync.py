@@ -0,0 +1,55 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def stamp_existing_rows(apps, schema_editor):
+    # Existing items and members count as changed at the current version of their list
+    ShoppingItem = apps.get_model("api", "ShoppingItem")
+    ShoppingList = apps.get_model("api", "ShoppingList")
+
+    ShoppingList.objects.update(members_version=models.F("version"))
+    ShoppingItem.objects.update(
+        version=models.Subquery(ShoppingList.objects.filter(pk=models.OuterRef("shopping_list_id")).values("version"))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_ratelimit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingItemTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shopping_item_id', models.UUIDField()),
+                ('version', models.PositiveBigIntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='shoppingitem',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='shoppinglist',
+            name='members_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingitem',
+            index=models.Index(fields=['shopping_list', 'version'], name='shoppingitem_list_version_idx'),
+        ),
+        migrations.AddField(
+            model_name='shoppingitemtombstone',
+            name='shopping_list',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='tombstones', to='api.shoppinglist'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingitemtombstone',
+            index=models.Index(fields=['shopping_list', 'version'], name='tombstone_list_version_idx'),
+        ),
+        migrations.RunPython(stamp_existing_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_existing_items(apps, schema_editor):
+    ShoppingItem = apps.get_model("api", "ShoppingItem")
+    ShoppingList = apps.get_model("api", "ShoppingList")
+
+    items = ShoppingItem.objects.filter(shopping_list=models.OuterRef("pk")).order_by().values("shopping_list")
+
+    def count(items):
+        return Coalesce(models.Subquery(items.annotate(count=models.Count("pk")).values("count")), 0)
+
+    ShoppingList.objects.update(item_count=count(items), unpurchased_count=count(items.filter(purchased=False)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_delta_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shoppinglist',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='shoppinglist',
+            name='unpurchased_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_existing_items, migrations.RunPython.noop),
+    ]
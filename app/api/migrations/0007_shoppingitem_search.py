@@ -0,0 +1,83 @@
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    # External content table over the items, sharing their rowids, with prefix indexes for short
+    # prefixes. The list is indexed to narrow the matches to the lists searched in the index.
+    """
+    CREATE VIRTUAL TABLE api_shoppingitem_fts USING fts5(
+        name, shopping_list_id, content='api_shoppingitem', prefix='2 3'
+    )
+    """,
+    # The indexed words per column, for fuzzy matching
+    "CREATE VIRTUAL TABLE api_shoppingitem_fts_vocab USING fts5vocab(api_shoppingitem_fts, 'col')",
+    """
+    CREATE TRIGGER api_shoppingitem_fts_insert AFTER INSERT ON api_shoppingitem BEGIN
+        INSERT INTO api_shoppingitem_fts (rowid, name, shopping_list_id)
+        VALUES (new.rowid, new.name, new.shopping_list_id);
+    END
+    """,
+    """
+    CREATE TRIGGER api_shoppingitem_fts_delete AFTER DELETE ON api_shoppingitem BEGIN
+        INSERT INTO api_shoppingitem_fts (api_shoppingitem_fts, rowid, name, shopping_list_id)
+        VALUES ('delete', old.rowid, old.name, old.shopping_list_id);
+    END
+    """,
+    # Saves write every column, the index only changes with the indexed ones
+    """
+    CREATE TRIGGER api_shoppingitem_fts_update AFTER UPDATE OF name, shopping_list_id ON api_shoppingitem
+    WHEN old.name IS NOT new.name OR old.shopping_list_id IS NOT new.shopping_list_id BEGIN
+        INSERT INTO api_shoppingitem_fts (api_shoppingitem_fts, rowid, name, shopping_list_id)
+        VALUES ('delete', old.rowid, old.name, old.shopping_list_id);
+        INSERT INTO api_shoppingitem_fts (rowid, name, shopping_list_id)
+        VALUES (new.rowid, new.name, new.shopping_list_id);
+    END
+    """,
+    "INSERT INTO api_shoppingitem_fts (api_shoppingitem_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER api_shoppingitem_fts_update",
+    "DROP TRIGGER api_shoppingitem_fts_delete",
+    "DROP TRIGGER api_shoppingitem_fts_insert",
+    "DROP TABLE api_shoppingitem_fts_vocab",
+    "DROP TABLE api_shoppingitem_fts",
+]
+
+POSTGRESQL_FORWARD = [
+    # Needs a role allowed to create the extension, or pg_trgm installed beforehand
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    # Serves the word prefix regular expressions and the word similarity of app.api.search
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS shoppingitem_name_trgm_idx ON api_shoppingitem USING gin (name gin_trgm_ops)",
+]
+
+POSTGRESQL_BACKWARD = [
+    "DROP INDEX CONCURRENTLY IF EXISTS shoppingitem_name_trgm_idx",
+]
+
+
+def run(statements):
+    def run_statements(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+
+    return run_statements
+
+
+class Migration(migrations.Migration):
+    # Indexes are created concurrently on PostgreSQL, which can't run in a transaction
+    atomic = False
+
+    dependencies = [
+        ('api', '0006_shoppinglist_counts'),
+    ]
+
+    # Not in the model state, the index types are specific to the database. SQLite migrations
+    # that rebuild the api_shoppingitem table drop the triggers and renumber the rowids, such
+    # migrations recreate the triggers and rebuild the FTS5 table, the api.W001 check of
+    # app.api.checks reports missing triggers.
+    operations = [
+        migrations.RunPython(
+            run({"sqlite": SQLITE_FORWARD, "postgresql": POSTGRESQL_FORWARD}),
+            run({"sqlite": SQLITE_BACKWARD, "postgresql": POSTGRESQL_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,34 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+class ShoppingListConditionalGetMixin:
+    """
+    Answers conditional GET requests from the version of a shopping list, before any
+    items or members are loaded or serialized.
+    """
+
+    def get_etag(self, request, shopping_list):
+        query = hashlib.sha1(request.META.get("QUERY_STRING", "").encode()).hexdigest()[:12]
+
+        return f'"{shopping_list.pk.hex}-{shopping_list.version}-{request.accepted_renderer.format}-{query}"'
+
+    def get_not_modified_response(self, request, shopping_list):
+        response = get_conditional_response(
+            request,
+            etag=self.get_etag(request, shopping_list),
+            last_modified=int(shopping_list.updated_at.timestamp()),
+        )
+
+        if response is not None:
+            self.set_conditional_headers(request, response, shopping_list)
+
+        return response
+
+    def set_conditional_headers(self, request, response, shopping_list):
+        response["ETag"] = self.get_etag(request, shopping_list)
+        response["Last-Modified"] = http_date(shopping_list.updated_at.timestamp())
+
+        return response
@@ -1,28 +1,342 @@
+import itertools
 import uuid
 
+from collections import Counter
+
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from app.api.events import publish_item_events
+from app.api.search import get_search_filter
 
 
 class User(AbstractUser):
     pass
 
 
+def get_count_change(field, deltas):
+    """
+    The new value of a counter column, changed by an int, or by a dict of list id to int.
+    """
+    if isinstance(deltas, dict):
+        cases = [models.When(pk=pk, then=models.Value(delta)) for pk, delta in deltas.items() if delta]
+        if not cases:
+            return models.F(field)
+        deltas = models.Case(*cases, default=models.Value(0))
+
+    return models.F(field) + deltas
+
+
+def get_count_changes(items, unpurchased):
+    changes = {}
+    if items:
+        changes["item_count"] = get_count_change("item_count", items)
+    if unpurchased:
+        changes["unpurchased_count"] = get_count_change("unpurchased_count", unpurchased)
+
+    return changes
+
+
+class ShoppingListQuerySet(models.QuerySet):
+
+    def touch(self, members=False, items=0, unpurchased=0):
+        """
+        Bump the version of the lists, whenever the lists, their items or their members change,
+        and change item_count and unpurchased_count by items and unpurchased, an int or a dict
+        of list id to int.
+        """
+        changes = {"version": models.F("version") + 1, "updated_at": timezone.now()}
+        if members:
+            # Assignments see the values from before the update, this is the bumped version
+            changes["members_version"] = models.F("version") + 1
+
+        return self.update(**changes, **get_count_changes(items, unpurchased))
+
+    def count_items(self, items=0, unpurchased=0):
+        """
+        Change item_count and unpurchased_count of the lists as touch() does, without bumping
+        their versions, for changes that touched the lists already.
+        """
+        changes = get_count_changes(items, unpurchased)
+
+        return self.update(**changes) if changes else 0
+
+    def next_version(self, **counts):
+        """
+        Bump the version of the single list of the queryset and return it, to stamp the changed
+        rows with. The bump locks the list row, so concurrent changes get increasing versions.
+        """
+        self.touch(**counts)
+
+        return self.values_list("version", flat=True).get()
+
+    def recount(self):
+        """
+        Recompute item_count and unpurchased_count of the lists from their items.
+        """
+        items = ShoppingItem.objects.filter(shopping_list=models.OuterRef("pk")).order_by().values("shopping_list")
+
+        def count(items):
+            return Coalesce(models.Subquery(items.annotate(count=models.Count("pk")).values("count")), 0)
+
+        return self.update(item_count=count(items), unpurchased_count=count(items.filter(purchased=False)))
+
+
 class ShoppingList(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=200)
     members = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name="shopping_lists")
+    version = models.PositiveBigIntegerField(default=0, editable=False)
+    # The version of the last change to members
+    members_version = models.PositiveBigIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Maintained with every change to the items, see ShoppingListQuerySet.touch and recount
+    item_count = models.PositiveIntegerField(default=0, editable=False)
+    unpurchased_count = models.PositiveIntegerField(default=0, editable=False)
+    # The version of the newest pruned tombstone, delta sync clients behind it start over
+    pruned_version = models.PositiveBigIntegerField(default=0, editable=False)
+
+    objects = ShoppingListQuerySet.as_manager()
 
     def __str__(self):
         return self.name
 
 
+class ShoppingItemQuerySet(models.QuerySet):
+
+    def set_purchased(self, ids, purchased, batch_size=500):
+        """
+        Mark the items of the queryset with the ids purchased or unpurchased, in one transaction
+        that also bumps the versions of their lists, and return the number of changed items per
+        list. The ids are read and updated in batches of batch_size, within the limits on query
+        parameters. Items already in the state are left alone.
+        """
+        # Without duplicates, which could land in separate batches and count twice
+        ids = list(dict.fromkeys(ids))
+        with transaction.atomic():
+            # Locks the lists first, as every change to items does, so that the items read below
+            # stay current until the update. In pk order, so that concurrent calls rarely deadlock.
+            for batch in itertools.batched(ids, batch_size):
+                shopping_lists = ShoppingList.objects.filter(pk__in=self.filter(pk__in=batch).values("shopping_list_id"))
+                list(shopping_lists.order_by("pk").select_for_update().values_list("pk"))
+
+            shopping_items = []
+            for batch in itertools.batched(ids, batch_size):
+                shopping_items += self.filter(pk__in=batch, purchased=not purchased).values("id", "name", "shopping_list_id")
+
+            counts = Counter(item["shopping_list_id"] for item in shopping_items)
+            sign = -1 if purchased else 1
+            for batch in itertools.batched(counts, batch_size):
+                ShoppingList.objects.filter(pk__in=batch).touch(unpurchased={pk: sign * counts[pk] for pk in batch})
+
+            version = ShoppingList.objects.filter(pk=models.OuterRef("shopping_list_id")).values("version")
+            for batch in itertools.batched(shopping_items, batch_size):
+                ShoppingItem.objects.filter(pk__in=[item["id"] for item in batch], purchased=not purchased).update(
+                    purchased=purchased, version=models.Subquery(version)
+                )
+
+            event_type = "items.purchased" if purchased else "items.updated"
+            publish_item_events(event_type, [{**item, "purchased": purchased} for item in shopping_items])
+
+        return counts
+
+    def search(self, query, fuzzy=False, shopping_lists=None):
+        """
+        The items whose names match the query, through the search index, see app.api.search.
+        Restricting the search to the ids of shopping_lists narrows the matches inside the index.
+        """
+        search_filter = get_search_filter(self.db, query, fuzzy=fuzzy, shopping_lists=shopping_lists)
+        if search_filter is None or shopping_lists == []:
+            return self.none()
+
+        return self.filter(search_filter)
+
+    def delete_purchased(self, batch_size=1000):
+        """
+        Delete the purchased items of the queryset in batches of batch_size, each in its own
+        transaction with a single DELETE, and return how many were deleted. Scope the queryset
+        to a list or to the lists of a user first, see the purge_purchased command.
+        """
+        deleted = 0
+        while True:
+            with transaction.atomic():
+                batch = list(self.filter(purchased=True).values_list("id", "shopping_list_id")[:batch_size])
+                if not batch:
+                    break
+
+                # Locks the lists first, as every change to items does, so that the items read below
+                # stay purchased until the delete. In pk order, so that concurrent calls rarely deadlock.
+                shopping_lists = ShoppingList.objects.filter(pk__in={shopping_list_id for _, shopping_list_id in batch})
+                list(shopping_lists.order_by("pk").select_for_update().values_list("pk"))
+
+                ids = [pk for pk, _ in batch]
+                shopping_items = list(self.filter(pk__in=ids, purchased=True).values("id", "name", "purchased", "shopping_list_id"))
+                if shopping_items:
+                    counts = Counter(item["shopping_list_id"] for item in shopping_items)
+                    ShoppingList.objects.filter(pk__in=counts).touch(items={pk: -count for pk, count in counts.items()})
+                    ShoppingItemTombstone.bury(shopping_items)
+                    # Nothing cascades from items, so the collector deletes with one query without loading rows
+                    deleted += ShoppingItem.objects.filter(pk__in=[item["id"] for item in shopping_items], purchased=True).delete()[0]
+                    publish_item_events("items.deleted", shopping_items)
+
+            if len(batch) < batch_size:
+                break
+
+        return deleted
+
+
 class ShoppingItem(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4)
     name = models.CharField(max_length=100)
     purchased = models.BooleanField()
-    shopping_list = models.ForeignKey(ShoppingList, on_delete=models.CASCADE, related_name="shopping_items")
+    # The version of the shopping list that the last change to the item produced
+    version = models.PositiveBigIntegerField(default=0, editable=False)
+    # Indexed through the composite indexes below, which all lead with shopping_list
+    shopping_list = models.ForeignKey(
+        ShoppingList, on_delete=models.CASCADE, related_name="shopping_items", db_index=False
+    )
+
+    objects = ShoppingItemQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Items of a list in page order, see utils.pagination.ShoppingItemPagination
+            models.Index(fields=["shopping_list", "purchased", "id"], name="shoppingitem_list_order_idx"),
+            # Unpurchased items of a list and the duplicate name check on create
+            models.Index(
+                fields=["shopping_list", "name"], condition=models.Q(purchased=False), name="shoppingitem_unpurchased_idx"
+            ),
+            # Items changed since a version, see app.api.views.ShoppingListChanges
+            models.Index(fields=["shopping_list", "version"], name="shoppingitem_list_version_idx"),
+        ]
 
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        saves_purchased = "purchased" in self.__dict__ and (update_fields is None or "purchased" in update_fields)
+
+        with transaction.atomic():
+            shopping_lists = ShoppingList.objects.filter(pk=self.shopping_list_id)
+            if self._state.adding:
+                event_type = "items.created"
+                self.version = shopping_lists.next_version(items=1, unpurchased=int(not self.purchased))
+                super().save(*args, **kwargs)
+            else:
+                # Locks the list first, so that the state read below stays current until the save
+                self.version = shopping_lists.next_version()
+                if update_fields is not None:
+                    kwargs["update_fields"] = {*update_fields, "version"}
+                current_purchased = None
+                if saves_purchased:
+                    current_purchased = ShoppingItem.objects.filter(pk=self.pk).values_list("purchased", flat=True).first()
+                super().save(*args, **kwargs)
+
+                event_type = "items.purchased" if self.purchased and current_purchased is False else "items.updated"
+                if current_purchased is not None:
+                    shopping_lists.count_items(unpurchased=int(current_purchased) - int(self.purchased))
+                elif saves_purchased:
+                    # Deleted meanwhile, the save inserted it again
+                    event_type = "items.created"
+                    shopping_lists.count_items(items=1, unpurchased=int(not self.purchased))
+            publish_item_events(event_type, [self])
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            shopping_lists = ShoppingList.objects.filter(pk=self.shopping_list_id)
+            # Locks the list first, so that the state read below stays current until the delete
+            version = shopping_lists.next_version()
+            current_purchased = ShoppingItem.objects.filter(pk=self.pk).values_list("purchased", flat=True).first()
+            if current_purchased is not None:
+                publish_item_events("items.deleted", [self])
+                ShoppingItemTombstone.objects.create(shopping_item_id=self.pk, shopping_list_id=self.shopping_list_id, version=version)
+            deleted = super().delete(*args, **kwargs)
+            # Deleted meanwhile, the other delete counted it
+            if deleted[0]:
+                shopping_lists.count_items(items=-1, unpurchased=-int(not current_purchased))
+
+        return deleted
+
+
+class ShoppingItemTombstoneQuerySet(models.QuerySet):
+
+    def prune(self, before, batch_size=1000):
+        """
+        Delete the tombstones of the queryset recorded before the datetime before, in batches of
+        batch_size, each in its own transaction, and return how many were deleted. Raises the
+        pruned_version of their lists, so that the clients that would miss the deletes start over.
+        """
+        pruned = 0
+        while True:
+            with transaction.atomic():
+                tombstones = list(self.filter(deleted_at__lt=before).values("id", "shopping_list_id", "version")[:batch_size])
+                if not tombstones:
+                    break
+
+                versions = {}
+                for tombstone in tombstones:
+                    shopping_list_id = tombstone["shopping_list_id"]
+                    versions[shopping_list_id] = max(versions.get(shopping_list_id, 0), tombstone["version"])
+                cases = [models.When(pk=pk, then=models.Value(version)) for pk, version in versions.items()]
+                ShoppingList.objects.filter(pk__in=versions).update(
+                    pruned_version=Greatest("pruned_version", models.Case(*cases, default=models.Value(0)))
+                )
+                pruned += ShoppingItemTombstone.objects.filter(pk__in=[tombstone["id"] for tombstone in tombstones]).delete()[0]
+
+            if len(tombstones) < batch_size:
+                break
+
+        return pruned
+
+
+class ShoppingItemTombstone(models.Model):
+    """
+    Remembers a deleted shopping item, so that delta sync clients learn about the delete.
+    """
+    shopping_item_id = models.UUIDField()
+    # Indexed through the composite index below
+    shopping_list = models.ForeignKey(
+        ShoppingList, on_delete=models.CASCADE, related_name="tombstones", db_index=False
+    )
+    # The version of the shopping list that the delete produced
+    version = models.PositiveBigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    objects = ShoppingItemTombstoneQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["shopping_list", "version"], name="tombstone_list_version_idx"),
+            # Old tombstones, see ShoppingItemTombstoneQuerySet.prune
+            models.Index(fields=["deleted_at"], name="tombstone_deleted_at_idx"),
+        ]
+
+    @classmethod
+    def bury(cls, shopping_items):
+        """
+        Record tombstones for the items, which are values() rows with id and shopping_list_id,
+        about to be deleted. The lists of the items must have been touched already.
+        """
+        shopping_list_ids = {shopping_item["shopping_list_id"] for shopping_item in shopping_items}
+        versions = dict(ShoppingList.objects.filter(pk__in=shopping_list_ids).values_list("id", "version"))
+
+        return cls.objects.bulk_create(
+            cls(
+                shopping_item_id=shopping_item["id"],
+                shopping_list_id=shopping_item["shopping_list_id"],
+                version=versions[shopping_item["shopping_list_id"]],
+            )
+            for shopping_item in shopping_items
+        )
+
+
+class RateLimit(models.Model):
+    """
+    Shared throttle state of utils.throttling.DatabaseRateStore.
+    """
+    key = models.CharField(max_length=255, primary_key=True)
+    arrival = models.FloatField()
@@ -1,18 +1,52 @@
+from django.db.models import Exists, OuterRef
 from rest_framework import permissions
+from rest_framework.exceptions import NotFound
 
 from app.api.models import ShoppingList
 
 
+def _get_memberships(request):
+    if not hasattr(request, "shopping_list_memberships"):
+        request.shopping_list_memberships = {}
+
+    return request.shopping_list_memberships
+
+
+def remember_shopping_list_membership(request, shopping_list_id, is_member):
+    _get_memberships(request)[shopping_list_id] = is_member
+
+
+def annotate_membership(queryset, user):
+    memberships = ShoppingList.members.through.objects.filter(shoppinglist=OuterRef("pk"), user_id=user.pk)
+
+    return queryset.annotate(is_member=Exists(memberships))
+
+
+def is_shopping_list_member(request, shopping_list_id):
+    memberships = _get_memberships(request)
+
+    if shopping_list_id not in memberships:
+        memberships[shopping_list_id] = ShoppingList.members.through.objects.filter(
+            shoppinglist_id=shopping_list_id, user_id=request.user.pk
+        ).exists()
+
+    return memberships[shopping_list_id]
+
+
 class ShoppingListMembersOnly(permissions.BasePermission):
 
     def has_object_permission(self, request, view, obj):
         if request.user.is_superuser:
             return True
 
-        if request.user in obj.members.all():
-            return True
+        prefetched_members = getattr(obj, "_prefetched_objects_cache", {}).get("members")
+        if hasattr(obj, "is_member"):
+            remember_shopping_list_membership(request, obj.pk, obj.is_member)
+        elif prefetched_members is not None:
+            is_member = any(member.pk == request.user.pk for member in prefetched_members)
+            remember_shopping_list_membership(request, obj.pk, is_member)
 
-        return False
+        return is_shopping_list_member(request, obj.pk)
 
 
 class ShoppingItemShoppingListMembersOnly(permissions.BasePermission):
@@ -21,20 +55,22 @@ class ShoppingItemShoppingListMembersOnly(permissions.BasePermission):
         if request.user.is_superuser:
             return True
 
-        if request.user in obj.shopping_list.members.all():
-            return True
-
-        return False
+        return is_shopping_list_member(request, obj.shopping_list_id)
 
 
 class AllShoppingItemsShoppingListMembersOnly(permissions.BasePermission):
 
     def has_permission(self, request, view):
-        if request.user.is_superuser:
-            return True
+        shopping_lists = annotate_membership(ShoppingList.objects.all(), request.user)
+        current_shopping_list = shopping_lists.filter(pk=view.kwargs.get("pk")).first()
+
+        if current_shopping_list is None:
+            raise NotFound("The specified shopping list does not exist")
 
-        current_shopping_list = ShoppingList.objects.get(pk=view.kwargs.get("pk"))
-        if request.user in current_shopping_list.members.all():
+        view.shopping_list = current_shopping_list
+        remember_shopping_list_membership(request, current_shopping_list.pk, current_shopping_list.is_member)
+
+        if request.user.is_superuser:
             return True
 
-        return False
+        return current_shopping_list.is_member
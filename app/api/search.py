@@ -0,0 +1,195 @@
+"""
+Search of shopping item names through the index of migration 0007: an FTS5 table kept in sync
+by triggers on SQLite, a trigram GIN index on PostgreSQL. Every term of a query must match the
+start of a word of the name, single characters a whole word, or with fuzzy also a word within a
+few typos.
+
+The FTS5 table indexes the list of every item too, so that the matches of a term common across
+all lists are narrowed to the lists searched inside the index rather than row by row.
+"""
+import re
+
+from django.db import connections
+from django.db.models import Expression, F, IntegerField, Lookup, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.lookups import In
+
+FTS_TABLE = "api_shoppingitem_fts"
+FTS_VOCAB_TABLE = "api_shoppingitem_fts_vocab"
+
+MAX_TERMS = 8
+# Searches of more lists match in all lists, the lists are filtered afterwards
+MAX_INDEXED_SHOPPING_LISTS = 500
+# Words as the unicode61 tokenizer of the FTS5 table splits them
+TERM_PATTERN = re.compile(r"[^\W_]+")
+
+
+def get_terms(query):
+    return [term.lower() for term in TERM_PATTERN.findall(query)][:MAX_TERMS]
+
+
+def get_max_edits(term):
+    if len(term) < 3:
+        return 0
+    if len(term) < 6:
+        return 1
+
+    return 2
+
+
+def get_edit_distance(source, target, max_edits):
+    """
+    The optimal string alignment distance of source and target, insertions, deletions,
+    substitutions and transpositions of adjacent letters, or max_edits + 1 once it exceeds it.
+    """
+    if abs(len(source) - len(target)) > max_edits:
+        return max_edits + 1
+
+    before_previous_row, previous_row = None, None
+    row = list(range(len(target) + 1))
+    for i, source_char in enumerate(source, 1):
+        before_previous_row, previous_row, row = previous_row, row, [i] + [0] * len(target)
+        for j, target_char in enumerate(target, 1):
+            row[j] = min(
+                previous_row[j] + 1,
+                row[j - 1] + 1,
+                previous_row[j - 1] + (source_char != target_char),
+            )
+            if i > 1 and j > 1 and source_char == target[j - 2] and source[i - 2] == target_char:
+                row[j] = min(row[j], before_previous_row[j - 2] + 1)
+        # Rows never drop below the minimum of the row before, transpositions included
+        if min(row) > max_edits:
+            return max_edits + 1
+
+    return row[-1]
+
+
+class RowId(Expression):
+    """
+    The SQLite rowid of the rows of the base table of the query.
+    """
+    output_field = IntegerField()
+
+    def resolve_expression(self, query=None, allow_joins=True, reuse=None, summarize=False, for_save=False):
+        clone = self.copy()
+        clone.alias = query.get_initial_alias()
+
+        return clone
+
+    def relabeled_clone(self, change_map):
+        clone = self.copy()
+        clone.alias = change_map.get(self.alias, self.alias)
+
+        return clone
+
+    def as_sql(self, compiler, connection):
+        return f"{compiler.quote_name_unless_alias(self.alias)}.rowid", []
+
+
+class TrigramWordSimilar(Lookup):
+    """
+    Whether a word of the field is similar to the value, by pg_trgm.word_similarity_threshold.
+    """
+    lookup_name = "trigram_word_similar"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+
+        return f"{rhs} <%% {lhs}", rhs_params + lhs_params
+
+
+def get_similar_terms(connection, term):
+    """
+    The indexed words within get_max_edits(term) of the term, from the FTS5 vocabulary.
+    """
+    max_edits = get_max_edits(term)
+    if not max_edits:
+        return []
+
+    # Typos rarely hit the first letter, which bounds the scan of the vocabulary. The scan
+    # counts the occurrences of every word it reads, PostgreSQL serves fuzzy terms from its index.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT term FROM {FTS_VOCAB_TABLE} WHERE col = 'name' AND term >= %s AND term < %s",
+            [term[0], chr(ord(term[0]) + 1)],
+        )
+        candidates = [row[0] for row in cursor.fetchall()]
+
+    return [candidate for candidate in candidates if get_edit_distance(term, candidate, max_edits) <= max_edits]
+
+
+def get_sqlite_filter(connection, terms, fuzzy, shopping_lists):
+    conditions = []
+    for term in terms:
+        # Single characters aren't in the prefix indexes, as prefixes they'd read most of the index
+        alternatives = [f'"{term}"*' if len(term) > 1 else f'"{term}"']
+        if fuzzy:
+            alternatives += [f'"{similar}"' for similar in get_similar_terms(connection, term) if similar != term]
+        conditions.append(f"name : ({' OR '.join(alternatives)})")
+
+    search_filter = Q()
+    if shopping_lists is not None:
+        if len(shopping_lists) <= MAX_INDEXED_SHOPPING_LISTS:
+            # As SQLite stores UUIDField values
+            shopping_list_ids = " OR ".join(f'"{pk.hex}"' for pk in shopping_lists)
+            conditions.append(f"shopping_list_id : ({shopping_list_ids})")
+        else:
+            search_filter = Q(shopping_list__in=shopping_lists)
+
+    # The FTS5 table shares the rowids of the items
+    matches = RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [" AND ".join(conditions)])
+
+    return search_filter & Q(In(RowId(), matches))
+
+
+def get_postgresql_filter(terms, fuzzy, shopping_lists):
+    search_filter = Q() if shopping_lists is None else Q(shopping_list__in=shopping_lists)
+    for term in terms:
+        # The trigram index serves regular expressions too, \m and \M match the start and end of a word
+        term_filter = Q(name__iregex=rf"\m{re.escape(term)}" if len(term) > 1 else rf"\m{re.escape(term)}\M")
+        if fuzzy:
+            term_filter |= Q(TrigramWordSimilar(F("name"), term))
+        search_filter &= term_filter
+
+    return search_filter
+
+
+def get_fallback_filter(terms, shopping_lists):
+    # Unindexed, other databases have neither of the indexes
+    search_filter = Q() if shopping_lists is None else Q(shopping_list__in=shopping_lists)
+    for term in terms:
+        search_filter &= Q(name__istartswith=term) | Q(name__icontains=f" {term}")
+
+    return search_filter
+
+
+def get_search_filter(using, query, fuzzy=False, shopping_lists=None):
+    """
+    The filter on the items whose names match the query, of the shopping_lists if passed, or
+    None when the query has no terms.
+    """
+    terms = get_terms(query)
+    if not terms:
+        return None
+
+    connection = connections[using]
+    if connection.vendor == "sqlite":
+        return get_sqlite_filter(connection, terms, fuzzy, shopping_lists)
+    if connection.vendor == "postgresql":
+        return get_postgresql_filter(terms, fuzzy, shopping_lists)
+
+    return get_fallback_filter(terms, shopping_lists)
+
+
+def optimize_search_index(using):
+    """
+    Merge the index after bulk writes, which leave the FTS5 index in many segments that every
+    search reads, and the GIN index with a pending list on PostgreSQL.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        elif connection.vendor == "postgresql":
+            cursor.execute("SELECT gin_clean_pending_list('shoppingitem_name_trgm_idx'::regclass)")
@@ -1,70 +1,321 @@
+from collections import defaultdict
 from typing import List
 
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
 from rest_framework import serializers
 
+from app.api.events import publish_item_events, publish_shopping_list_event
 from app.api.models import ShoppingItem, ShoppingList, User
+from utils.timing import TimedSerializerMixin, stage
 
 
-class AddMemberSerializer(serializers.ModelSerializer):
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """
+    Resolves all related primary keys with a single query instead of one query per key.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, "__iter__"):
+            self.fail("not_a_list", input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail("empty")
+
+        queryset = self.child_relation.get_queryset()
+        pk_field = queryset.model._meta.pk
+        pks = []
+
+        for item in data:
+            try:
+                if isinstance(item, bool):
+                    raise TypeError
+                pks.append(pk_field.to_python(item))
+            except (TypeError, ValueError, DjangoValidationError):
+                self.child_relation.fail("incorrect_type", data_type=type(item).__name__)
+
+        related_objects = queryset.in_bulk(pks)
+        for pk in pks:
+            if pk not in related_objects:
+                self.child_relation.fail("does_not_exist", pk_value=pk)
+
+        return [related_objects[pk] for pk in dict.fromkeys(pks)]
+
+
+class MembersSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    members = BulkManyRelatedField(
+        child_relation=serializers.PrimaryKeyRelatedField(queryset=User.objects.all()), allow_empty=False
+    )
+
     class Meta:
         model = ShoppingList
         fields = ["members"]
 
+
+class AddMemberSerializer(MembersSerializer):
+
     def update(self, instance, validated_data):
-        for member in validated_data["members"]:
-            instance.members.add(member)
-            instance.save()
+        with transaction.atomic():
+            instance.members.add(*validated_data.get("members", []))
+            ShoppingList.objects.filter(pk=instance.pk).touch(members=True)
+            publish_shopping_list_event(instance.pk, "members.added", members=[user.pk for user in validated_data.get("members", [])])
 
         return instance
 
 
-class RemoveMemberSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = ShoppingList
-        fields = ["members"]
+class RemoveMemberSerializer(MembersSerializer):
 
     def update(self, instance, validated_data):
-        for member in validated_data["members"]:
-            instance.members.remove(member)
-            instance.save()
+        with transaction.atomic():
+            instance.members.remove(*validated_data.get("members", []))
+            ShoppingList.objects.filter(pk=instance.pk).touch(members=True)
+            publish_shopping_list_event(instance.pk, "members.removed", members=[user.pk for user in validated_data.get("members", [])])
 
         return instance
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ["id", "username"]
 
 
-class ShoppingItemSerializer(serializers.ModelSerializer):
+class ShoppingItemListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    duplicate_message = "There's already this item on the list"
+
+    def create(self, validated_data):
+        self.outcomes = []
+        if not validated_data:
+            return []
+
+        shopping_list = validated_data[0]["shopping_list"]
+        names = {attrs["name"] for attrs in validated_data}
+        shopping_items = []
+
+        with transaction.atomic():
+            unpurchased_names = set(
+                ShoppingItem.objects.filter(shopping_list=shopping_list, name__in=names, purchased=False)
+                .values_list("name", flat=True)
+            )
+
+            for attrs in validated_data:
+                if attrs["name"] in unpurchased_names:
+                    self.outcomes.append({"status": "duplicate", "name": attrs["name"], "detail": self.duplicate_message})
+                    continue
+
+                shopping_item = ShoppingItem(**attrs)
+                shopping_items.append(shopping_item)
+                self.outcomes.append(shopping_item)
+                if not shopping_item.purchased:
+                    unpurchased_names.add(shopping_item.name)
+
+            if shopping_items:
+                version = ShoppingList.objects.filter(pk=shopping_list.pk).next_version(
+                    items=len(shopping_items), unpurchased=sum(not item.purchased for item in shopping_items)
+                )
+                for shopping_item in shopping_items:
+                    shopping_item.version = version
+                ShoppingItem.objects.bulk_create(shopping_items)
+                publish_item_events("items.created", shopping_items)
+
+        self.outcomes = [
+            {"status": "created", "item": self.child.to_representation(outcome)}
+            if isinstance(outcome, ShoppingItem) else outcome
+            for outcome in self.outcomes
+        ]
+
+        return shopping_items
+
+
+class ShoppingItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = ShoppingItem
         fields = ["id", "name", "purchased", "shopping_list"]
         read_only_fields = ["id", "shopping_list"]
+        list_serializer_class = ShoppingItemListSerializer
 
     def create(self, validated_data, **kwargs):
-        shopping_list_id = self.context["request"].parser_context["kwargs"]["pk"]
+        shopping_list = validated_data.get("shopping_list")
 
-        try:
-            shopping_list = ShoppingList.objects.get(id=shopping_list_id)
-        except:
-            raise serializers.ValidationError("The specified shopping list does not exist")
+        if shopping_list is None:
+            shopping_list_id = self.context["request"].parser_context["kwargs"]["pk"]
 
-        if shopping_list.shopping_items.filter(name=validated_data["name"], purchased=False):  # type: ignore
-            raise serializers.ValidationError("There's already this item on the list")
+            try:
+                shopping_list = ShoppingList.objects.get(id=shopping_list_id)
+            except:
+                raise serializers.ValidationError("The specified shopping list does not exist")
 
-        validated_data["shopping_list_id"] = shopping_list_id
+        if ShoppingItem.objects.filter(shopping_list=shopping_list, name=validated_data["name"], purchased=False).exists():
+            raise serializers.ValidationError(ShoppingItemListSerializer.duplicate_message)
+
+        validated_data["shopping_list"] = shopping_list
         return super().create(validated_data)
 
 
-class ShoppingListSerializer(serializers.ModelSerializer):
+class BulkPurchaseSerializer(serializers.Serializer):
+    shopping_items = serializers.ListField(child=serializers.UUIDField(), allow_empty=False, max_length=10000)
+    purchased = serializers.BooleanField(default=True)
+
+
+class ShoppingItemSearchSerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+    fuzzy = serializers.BooleanField(default=False)
+
+
+class ShoppingListSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     members = UserSerializer(many=True, read_only=True)
     unpurchased_items = serializers.SerializerMethodField()
 
     class Meta:
         model = ShoppingList
-        fields = ["id", "name", "unpurchased_items", "members"]
+        fields = ["id", "name", "item_count", "unpurchased_count", "unpurchased_items", "members"]
 
     def get_unpurchased_items(self, obj) -> List:
-        return [{"name": shopping_item.name} for shopping_item in obj.shopping_items.filter(purchased=False)]
+        unpurchased_items = getattr(obj, "unpurchased_shopping_items", None)
+        if unpurchased_items is None:
+            unpurchased_items = obj.shopping_items.filter(purchased=False)
+
+        return [{"name": shopping_item.name} for shopping_item in unpurchased_items]
+
+
+class ShoppingListSummarySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """
+    A shopping list with the counts of its items rather than the items, for the collection.
+    """
+    members = UserSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = ShoppingList
+        fields = ["id", "name", "item_count", "unpurchased_count", "members"]
+
+
+class ShoppingListDashboardSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """
+    A shopping list in the summary of the lists of a user, with member_count annotated.
+    """
+    member_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = ShoppingList
+        fields = ["id", "name", "version", "member_count", "item_count", "unpurchased_count", "updated_at"]
+
+
+class ValuesSerializer:
+    """
+    Read only serialization of values() rows with the output of serializer_class. The fields of
+    serializer_class are resolved once per class, rows are then mapped without model instances.
+    Nested and method fields are serialized by a get_<field name>(row) method, with anything
+    they need for all rows loaded by prepare(rows).
+    """
+    serializer_class = None
+
+    def __init__(self, rows, many=False):
+        self.rows = rows
+        self.many = many
+
+    @classmethod
+    def get_fields(cls):
+        if "_fields" not in cls.__dict__:
+            fields = []
+            for name, field in cls.serializer_class().fields.items():
+                if field.write_only:
+                    continue
+                if isinstance(field, (serializers.SerializerMethodField, serializers.BaseSerializer)):
+                    fields.append((name, None, None))
+                else:
+                    fields.append((name, field.source, cls.get_converter(field)))
+            cls._fields = fields
+
+        return cls._fields
+
+    @classmethod
+    def get_converter(cls, field):
+        if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+            # values() rows carry the related primary key itself
+            return None
+        if isinstance(field, serializers.UUIDField) and field.uuid_format == "hex_verbose":
+            return str
+        if type(field) in (serializers.BooleanField, serializers.IntegerField) or isinstance(field, serializers.CharField):
+            # Values of these model fields come out of the database in their representation already
+            return None
+
+        return field.to_representation
+
+    @classmethod
+    def get_value_fields(cls):
+        return [source for name, source, converter in cls.get_fields() if source is not None]
+
+    @classmethod
+    def get_row(cls, instance):
+        return {source: getattr(instance, instance._meta.get_field(source).attname) for source in cls.get_value_fields()}
+
+    def to_representation(self, row):
+        ret = {}
+        for name, source, converter in self.get_fields():
+            if source is None:
+                ret[name] = getattr(self, f"get_{name}")(row)
+            elif converter is None or row[source] is None:
+                ret[name] = row[source]
+            else:
+                ret[name] = converter(row[source])
+
+        return ret
+
+    def prepare(self, rows):
+        pass
+
+    @property
+    def data(self):
+        with stage("serialize"):
+            rows = list(self.rows) if self.many else [self.rows]
+            self.prepare(rows)
+            data = [self.to_representation(row) for row in rows]
+
+        return data if self.many else data[0]
+
+
+class UserValuesSerializer(ValuesSerializer):
+    serializer_class = UserSerializer
+
+
+class ShoppingItemValuesSerializer(ValuesSerializer):
+    serializer_class = ShoppingItemSerializer
+
+
+class ShoppingListSummaryValuesSerializer(ValuesSerializer):
+    serializer_class = ShoppingListSummarySerializer
+
+    def prepare(self, rows):
+        shopping_list_ids = [row["id"] for row in rows]
+        self.members = defaultdict(list)
+
+        if shopping_list_ids:
+            # The members of all the lists in one query
+            members = User.objects.filter(shopping_lists__in=shopping_list_ids)
+            member_serializer = UserValuesSerializer(None)
+            for row in members.values("shopping_lists", *UserValuesSerializer.get_value_fields()):
+                self.members[row["shopping_lists"]].append(member_serializer.to_representation(row))
+
+    def get_members(self, row):
+        return self.members[row["id"]]
+
+
+class ShoppingListValuesSerializer(ShoppingListSummaryValuesSerializer):
+    serializer_class = ShoppingListSerializer
+
+    def prepare(self, rows):
+        super().prepare(rows)
+        shopping_list_ids = [row["id"] for row in rows]
+        self.unpurchased_items = defaultdict(list)
+
+        if shopping_list_ids:
+            # The unpurchased items of all the lists in one query
+            unpurchased_items = ShoppingItem.objects.filter(purchased=False, shopping_list__in=shopping_list_ids)
+            for shopping_list_id, name in unpurchased_items.values_list("shopping_list", "name"):
+                self.unpurchased_items[shopping_list_id].append({"name": name})
+
+    def get_unpurchased_items(self, row):
+        return self.unpurchased_items[row["id"]]
+
+
+class ShoppingListDashboardValuesSerializer(ValuesSerializer):
+    serializer_class = ShoppingListDashboardSerializer
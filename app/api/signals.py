@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from app.api.models import User
+from utils.authentication import invalidate_cached_tokens
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    invalidate_cached_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def invalidate_cached_user_tokens(sender, instance, update_fields=None, **kwargs):
+    # Logging in only touches last_login, which authentication does not depend on
+    if update_fields is not None and set(update_fields) == {"last_login"}:
+        return
+
+    invalidate_cached_tokens(Token.objects.filter(user_id=instance.pk).values_list("key", flat=True))
@@ -1,9 +1,52 @@
 import pytest
 
+from django.core.cache import caches
+from django.db import connections
+
 from app.api.models import User
 from rest_framework.test import APIClient
 
 from app.api.models import ShoppingItem, ShoppingList
+from utils.events import _load_event_hub, get_event_hub
+from utils.throttling import _load_rate_store
+
+
+@pytest.fixture(scope="session")
+def django_db_modify_db_settings(django_db_modify_db_settings_parallel_suffix):
+    # A second database standing in for a read replica, which never receives the writes of the
+    # primary, see the replica fixture
+    default = connections.settings["default"]
+    connections.settings["replica"] = {**default, "NAME": "replica", "TEST": {**default["TEST"], "NAME": None}}
+
+
+@pytest.fixture
+def replica(settings):
+    settings.DATABASE_REPLICAS = ["replica"]
+    caches[settings.REPLICA_PIN_CACHE].clear()
+
+    yield "replica"
+
+    caches[settings.REPLICA_PIN_CACHE].clear()
+
+
+@pytest.fixture(autouse=True)
+def local_rate_store(settings):
+    settings.RATE_LIMIT_STORE = "utils.throttling.LocalRateStore"
+    _load_rate_store.cache_clear()
+
+    yield
+
+    _load_rate_store.cache_clear()
+
+
+@pytest.fixture
+def event_hub(settings):
+    settings.EVENTS_BACKEND = "utils.events.LocalEventBackend"
+    _load_event_hub.cache_clear()
+
+    yield get_event_hub()
+
+    _load_event_hub.cache_clear()
 
 
 @pytest.fixture(scope="session")
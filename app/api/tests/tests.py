@@ -1,10 +1,53 @@
+import asyncio
+import base64
+import datetime
+import decimal
+import io
+import json
+import threading
+import time
+import uuid
+
 import pytest
 
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from django.utils.translation import gettext_lazy
+from drf_spectacular.generators import SchemaGenerator
 from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 
-from app.api.models import ShoppingList, User
+from app.api import models, search
+from app.api.checks import check_search_triggers
+from app.api.models import RateLimit, ShoppingItem, ShoppingItemTombstone, ShoppingList, User
+from app.api.permission import is_shopping_list_member
+from app.api.serializers import (
+    ShoppingItemSerializer,
+    ShoppingItemValuesSerializer,
+    ShoppingListSerializer,
+    ShoppingListSummarySerializer,
+    ShoppingListValuesSerializer,
+)
+from app.api.views import ListAddShoppingList
+from utils.asgi import ASGIHandler
+from utils.db.pool import ConnectionPool, PoolTimeout
+from utils.events import EventHub, LocalEventBackend
+from utils import renderers
+from utils.pagination import KeysetPagination, ShoppingItemPagination
+from utils.renderers import FastJSONParser, FastJSONRenderer
+from utils.replicas import ReplicaRouter
+from utils.timing import RequestTimer, ServerTimingMiddleware
+from utils.throttling import DatabaseRateStore, LocalRateStore, MinuteRateThrottle
 
 
 @pytest.mark.django_db
@@ -450,3 +493,1872 @@ def test_remove_members_wrong_data(create_user, create_authenticated_client, cre
     response = client.put(url, data)
 
     assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def _create_populated_shopping_lists(user, count):
+    shopping_lists = []
+    for index in range(count):
+        shopping_list = ShoppingList.objects.create(name=f"List {index}")
+        shopping_list.members.add(user, User.objects.create(username=f"member_{user.id}_{index}"))
+        ShoppingItem.objects.create(name="Eggs", purchased=False, shopping_list=shopping_list)
+        ShoppingItem.objects.create(name="Milk", purchased=True, shopping_list=shopping_list)
+        shopping_lists.append(shopping_list)
+
+    return shopping_lists
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("list_count", [1, 5])
+def test_shopping_lists_query_count_does_not_depend_on_page_size(
+    list_count, create_user, create_authenticated_client, django_assert_num_queries
+):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    _create_populated_shopping_lists(user, list_count)
+
+    url = reverse("all-shopping-lists")
+    # session, user, count, lists, members
+    with django_assert_num_queries(5):
+        response = client.get(url)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.data["results"]) == list_count
+    assert response.data["results"][0]["item_count"] == 2
+    assert response.data["results"][0]["unpurchased_count"] == 1
+    assert len(response.data["results"][0]["members"]) == 2
+
+
+@pytest.mark.django_db
+def test_shopping_list_detail_query_count(create_user, create_authenticated_client, django_assert_num_queries):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    shopping_list = _create_populated_shopping_lists(user, 1)[0]
+
+    url = reverse("shopping-list-detail", args=[shopping_list.id])
+    # session, user, list, members, unpurchased items
+    with django_assert_num_queries(5):
+        response = client.get(url)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["unpurchased_items"] == [{"name": "Eggs"}]
+    assert len(response.data["members"]) == 2
+
+
+@pytest.mark.django_db
+def test_shopping_list_membership_is_checked_once_per_request(
+    create_user, create_shopping_list, rf, django_assert_num_queries
+):
+    user = create_user()
+    another_user = create_user(username="another_user")
+    shopping_list = create_shopping_list(name="Groceries", user=user)
+    request = rf.get("/")
+
+    request.user = user
+    with django_assert_num_queries(1):
+        assert is_shopping_list_member(request, shopping_list.id)
+        assert is_shopping_list_member(request, shopping_list.id)
+
+    request = rf.get("/")
+    request.user = another_user
+    with django_assert_num_queries(1):
+        assert not is_shopping_list_member(request, shopping_list.id)
+        assert not is_shopping_list_member(request, shopping_list.id)
+
+
+@pytest.mark.django_db
+def test_shopping_item_detail_query_count(
+    create_user, create_authenticated_client, create_shopping_item, django_assert_num_queries
+):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    shopping_item = create_shopping_item(list_name="Groceries", item_name="Eggs", user=user)
+
+    url = reverse("shopping-item-detail", kwargs={"pk": shopping_item.shopping_list.id, "item_pk": shopping_item.id})
+    # session, user, item, membership
+    with django_assert_num_queries(4):
+        response = client.get(url)
+
+    assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+def test_shopping_items_of_unknown_shopping_list_not_found(create_user, create_authenticated_client):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+
+    url = reverse("list-add-shopping-item", args=[uuid.uuid4()])
+
+    assert client.get(url).status_code == status.HTTP_404_NOT_FOUND
+    assert client.post(url, {"name": "Eggs", "purchased": False}).status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_list_shopping_items_query_count(
+    create_user, create_authenticated_client, create_shopping_item, django_assert_num_queries
+):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    shopping_item = create_shopping_item(list_name="Groceries", item_name="Eggs", user=user)
+
+    url = reverse("list-add-shopping-item", args=[shopping_item.shopping_list.id])
+    # session, user, shopping list with membership, items
+    with django_assert_num_queries(4):
+        response = client.get(url)
+
+    assert response.status_code == status.HTTP_200_OK
+
+
+@pytest.mark.django_db
+def test_create_shopping_item_query_count(
+    create_user, create_authenticated_client, create_shopping_list, django_assert_num_queries
+):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    shopping_list = create_shopping_list(name="Groceries", user=user)
+
+    url = reverse("list-add-shopping-item", args=[shopping_list.id])
+    # session, user, shopping list with membership, duplicate check, savepoint, version bump, version, insert, release
+    with django_assert_num_queries(9):
+        response = client.post(url, {"name": "Eggs", "purchased": False})
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.data["shopping_list"] == shopping_list.id
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("ordering", [("purchased", "id"), ("-purchased", "id")])
+def test_shopping_items_are_paginated_by_cursor_in_stable_order(
+    ordering, create_user, create_authenticated_client, create_shopping_list, monkeypatch
+):
+    monkeypatch.setattr(ShoppingItemPagination, "ordering", ordering)
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    shopping_list = create_shopping_list(name="Groceries", user=user)
+    for index in range(12):
+        ShoppingItem.objects.create(name=f"Item {index}", purchased=index % 3 == 0, shopping_list=shopping_list)
+
+    expected = [
+        str(item_id) for item_id in
+        ShoppingItem.objects.order_by(*ordering).values_list("id", flat=True)
+    ]
+
+    url = reverse("list-add-shopping-item", args=[shopping_list.id])
+    pages = []
+    while url:
+        response = client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert "count" not in response.data
+        pages.append(response.data)
+        url = response.data["next"]
+
+    assert [len(page["results"]) for page in pages] == [5, 5, 2]
+    assert [item["id"] for page in pages for item in page["results"]] == expected
+    assert pages[0]["previous"] is None
+
+    response = client.get(pages[2]["previous"])
+
+    assert response.data["results"] == pages[1]["results"]
+
+
+@pytest.mark.django_db
+def test_shopping_items_invalid_cursor_not_found(create_user, create_authenticated_client, create_shopping_list):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    shopping_list = create_shopping_list(name="Groceries", user=user)
+
+    url = reverse("list-add-shopping-item", args=[shopping_list.id])
+    cursor = base64.b64encode(b'p=["yes", "not-a-uuid"]').decode()
+    response = client.get(url, {"cursor": cursor})
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_shopping_lists_keyset_pagination_opt_in(
+    create_user, create_authenticated_client, create_shopping_list, monkeypatch
+):
+    monkeypatch.setattr(ListAddShoppingList, "pagination_class", KeysetPagination)
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    for index in range(7):
+        create_shopping_list(name=f"List {index}", user=user)
+
+    response = client.get(reverse("all-shopping-lists"))
+    next_response = client.get(response.data["next"])
+
+    assert len(response.data["results"]) == 5
+    assert len(next_response.data["results"]) == 2
+    assert next_response.data["next"] is None
+    assert {shopping_list["id"] for shopping_list in response.data["results"] + next_response.data["results"]} == {
+        str(shopping_list_id) for shopping_list_id in ShoppingList.objects.values_list("id", flat=True)
+    }
+
+
+@pytest.mark.django_db
+def test_shopping_items_are_created_in_bulk(
+    create_user, create_authenticated_client, create_shopping_item, django_assert_max_num_queries
+):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    shopping_item = create_shopping_item(list_name="Groceries", item_name="Eggs", user=user)
+    data = [{"name": f"Item {index}", "purchased": False} for index in range(50)]
+    data += [{"name": "Eggs", "purchased": False}, {"name": "Item 1", "purchased": True}]
+
+    url = reverse("list-add-shopping-item", args=[shopping_item.shopping_list.id])
+    with django_assert_max_num_queries(9):
+        response = client.post(url, data, format="json")
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert [outcome["status"] for outcome in response.data] == ["created"] * 50 + ["duplicate", "duplicate"]
+    assert response.data[0]["item"]["name"] == "Item 0"
+    assert response.data[50]["name"] == "Eggs"
+    assert ShoppingItem.objects.filter(shopping_list=shopping_item.shopping_list).count() == 51
+
+
+@pytest.mark.django_db
+def test_bulk_create_rejects_batch_with_invalid_item(create_user, create_authenticated_client, create_shopping_list):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    shopping_list = create_shopping_list(name="Groceries", user=user)
+
+    url = reverse("list-add-shopping-item", args=[shopping_list.id])
+    data = [{"name": "Eggs", "purchased": False}, {"purchased": False}]
+    response = client.post(url, data, format="json")
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "name" in response.data[1]
+    assert ShoppingItem.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_bulk_create_of_only_duplicates_creates_nothing(create_user, create_authenticated_client, create_shopping_item):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    shopping_item = create_shopping_item(list_name="Groceries", item_name="Eggs", user=user)
+
+    url = reverse("list-add-shopping-item", args=[shopping_item.shopping_list.id])
+    response = client.post(url, [{"name": "Eggs", "purchased": False}], format="json")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data == [{"status": "duplicate", "name": "Eggs", "detail": "There's already this item on the list"}]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("url_name", ["shopping-list-add-members", "shopping-list-remove-members"])
+def test_member_updates_query_count_does_not_depend_on_batch_size(
+    url_name, create_user, create_authenticated_client, create_shopping_list, django_assert_num_queries
+):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    shopping_list = create_shopping_list(name="Groceries", user=user)
+    users = User.objects.bulk_create(User(username=f"invitee_{index}") for index in range(200))
+    if url_name == "shopping-list-remove-members":
+        shopping_list.members.add(*users)
+
+    url = reverse(url_name, args=[shopping_list.id])
+    # session, user, list, membership, members lookup, savepoint, one through table statement, version bump,
+    # release, response
+    with django_assert_num_queries(10):
+        response = client.put(url, {"members": [invitee.id for invitee in users]}, format="json")
+
+    assert response.status_code == status.HTTP_200_OK
+    expected_count = 201 if url_name == "shopping-list-add-members" else 1
+    assert shopping_list.members.count() == expected_count
+
+
+@pytest.mark.django_db
+def test_add_members_incorrect_type(create_user, create_authenticated_client, create_shopping_list):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    shopping_list = create_shopping_list(name="Groceries", user=user)
+
+    url = reverse("shopping-list-add-members", args=[shopping_list.id])
+    response = client.put(url, {"members": [user.id, "abc"]}, format="json")
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert shopping_list.members.count() == 1
+
+
+@pytest.mark.django_db
+def test_shopping_list_detail_not_modified(
+    create_user, create_authenticated_client, create_shopping_item, django_assert_num_queries
+):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    shopping_item = create_shopping_item(list_name="Groceries", item_name="Eggs", user=user)
+
+    url = reverse("shopping-list-detail", args=[shopping_item.shopping_list.id])
+    response = client.get(url)
+    etag = response["ETag"]
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.has_header("Last-Modified")
+
+    # session, user, list with membership
+    with django_assert_num_queries(3):
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response["ETag"] == etag
+
+    shopping_item.purchased = True
+    shopping_item.save()
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response["ETag"] != etag
+    assert response.data["unpurchased_items"] == []
+
+
+@pytest.mark.django_db
+def test_list_shopping_items_not_modified(
+    create_user, create_authenticated_client, create_shopping_item, django_assert_num_queries
+):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    shopping_item = create_shopping_item(list_name="Groceries", item_name="Eggs", user=user)
+
+    url = reverse("list-add-shopping-item", args=[shopping_item.shopping_list.id])
+    etag = client.get(url)["ETag"]
+
+    # session, user, shopping list with membership
+    with django_assert_num_queries(3):
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert client.get(url, {"page_size": 1}, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_200_OK
+
+    client.post(url, {"name": "Milk", "purchased": False})
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.data["results"]) == 2
+
+
+@pytest.mark.django_db
+def test_shopping_list_version_changes_with_members_and_items(
+    create_user, create_authenticated_client, create_shopping_item
+):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    shopping_item = create_shopping_item(list_name="Groceries", item_name="Eggs", user=user)
+    shopping_list = shopping_item.shopping_list
+    another_user = create_user(username="another_user")
+    versions = [ShoppingList.objects.get(pk=shopping_list.pk).version]
+
+    def assert_version_bumped():
+        versions.append(ShoppingList.objects.get(pk=shopping_list.pk).version)
+        assert versions[-1] > versions[-2]
+
+    client.put(reverse("shopping-list-add-members", args=[shopping_list.id]), {"members": [another_user.id]})
+    assert_version_bumped()
+
+    client.put(reverse("shopping-list-remove-members", args=[shopping_list.id]), {"members": [another_user.id]})
+    assert_version_bumped()
+
+    client.patch(reverse("shopping-list-detail", args=[shopping_list.id]), {"name": "Food"})
+    assert_version_bumped()
+
+    client.post(reverse("list-add-shopping-item", args=[shopping_list.id]), [{"name": "Milk", "purchased": False}], format="json")
+    assert_version_bumped()
+
+    client.delete(reverse("shopping-item-detail", kwargs={"pk": shopping_list.id, "item_pk": shopping_item.id}))
+    assert_version_bumped()
+
+
+@pytest.mark.parametrize("store_class", [LocalRateStore, DatabaseRateStore])
+@pytest.mark.django_db
+def test_rate_store_allows_burst_then_spaces_requests(store_class):
+    store = store_class()
+
+    assert [store.acquire("client", interval=20, period=60, now=1000) for _ in range(3)] == [None, None, None]
+    assert store.acquire("client", interval=20, period=60, now=1000) == 20
+    assert store.acquire("client", interval=20, period=60, now=1019) == 1
+    assert store.acquire("client", interval=20, period=60, now=1020) is None
+    assert store.acquire("another_client", interval=20, period=60, now=1020) is None
+
+
+@pytest.mark.django_db
+def test_database_rate_store_shares_limit_between_processes():
+    first_worker, second_worker = DatabaseRateStore(), DatabaseRateStore()
+
+    assert first_worker.acquire("client", interval=30, period=60, now=1000) is None
+    assert second_worker.acquire("client", interval=30, period=60, now=1000) is None
+    assert first_worker.acquire("client", interval=30, period=60, now=1000) == 30
+    assert RateLimit.objects.count() == 1
+
+
+@pytest.mark.django_db
+def test_database_rate_store_prunes_past_arrivals():
+    store = DatabaseRateStore()
+    for key in ["first", "second", "third"]:
+        store.acquire(key, interval=30, period=60, now=1000)
+    store.acquire("third", interval=30, period=60, now=1100)
+
+    assert store.prune(now=1100, batch_size=1) == 2
+    assert list(RateLimit.objects.values_list("key", flat=True)) == ["third"]
+    # A pruned client starts with a full burst again, as if its arrival had stayed in the past
+    assert store.acquire("first", interval=30, period=60, now=1100) is None
+    assert store.acquire("first", interval=30, period=60, now=1100) is None
+    assert store.acquire("first", interval=30, period=60, now=1100) == 30
+
+
+@pytest.mark.django_db
+def test_purge_rate_limits_command():
+    RateLimit.objects.bulk_create([RateLimit(key="expired", arrival=1000), RateLimit(key="active", arrival=time.time() + 60)])
+    stdout = io.StringIO()
+
+    call_command("purge_rate_limits", batch_size=1, stdout=stdout)
+
+    assert "Deleted 1 expired rate limits" in stdout.getvalue()
+    assert list(RateLimit.objects.values_list("key", flat=True)) == ["active"]
+    with pytest.raises(CommandError):
+        call_command("purge_rate_limits", batch_size=0, stdout=stdout)
+
+
+@pytest.mark.django_db
+def test_requests_are_throttled_per_user(create_user, create_authenticated_client, monkeypatch):
+    monkeypatch.setattr(MinuteRateThrottle, "THROTTLE_RATES", {"user_minute": "2/minute"})
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    another_client = create_authenticated_client(user=create_user(username="another_user"))
+
+    url = reverse("all-shopping-lists")
+    responses = [client.get(url) for _ in range(3)]
+
+    assert [response.status_code for response in responses] == [200, 200, 429]
+    assert int(responses[-1]["Retry-After"]) > 0
+    assert another_client.get(url).status_code == status.HTTP_200_OK
+
+
+def _create_token_client(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=user).key}")
+
+    return client
+
+
+@pytest.mark.django_db
+def test_token_authentication_is_cached(create_user):
+    client = _create_token_client(create_user())
+
+    url = reverse("all-shopping-lists")
+    client.get(url)
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert not [query for query in context.captured_queries if "authtoken_token" in query["sql"]]
+
+
+@pytest.mark.django_db
+def test_deleted_token_is_not_authenticated_from_cache(create_user):
+    user = create_user()
+    client = _create_token_client(user)
+
+    url = reverse("all-shopping-lists")
+    client.get(url)
+    user.auth_token.delete()
+
+    assert client.get(url).status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+def test_deactivated_user_is_not_authenticated_from_cache(create_user):
+    user = create_user()
+    client = _create_token_client(user)
+
+    url = reverse("all-shopping-lists")
+    client.get(url)
+    user.is_active = False
+    user.save()
+
+    assert client.get(url).status_code == status.HTTP_403_FORBIDDEN
+
+
+def _create_async_client(user):
+    client = AsyncClient()
+    client.force_login(user)
+
+    return client
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "sync_name, async_name",
+    [
+        ("shopping-list-detail", "async-shopping-list-detail"),
+        ("list-add-shopping-item", "async-list-shopping-items"),
+    ],
+)
+def test_async_shopping_list_views_match_sync_views(create_user, create_authenticated_client, sync_name, async_name):
+    user = create_user()
+    shopping_list = _create_populated_shopping_lists(user, 1)[0]
+
+    sync_response = create_authenticated_client(user).get(reverse(sync_name, args=[shopping_list.id]))
+    async_response = async_to_sync(_create_async_client(user).get)(reverse(async_name, args=[shopping_list.id]))
+
+    assert async_response.status_code == status.HTTP_200_OK
+    assert async_response.content == sync_response.content
+    assert async_response["ETag"] == sync_response["ETag"]
+
+
+@pytest.mark.django_db
+def test_async_shopping_lists_match_sync_view(create_user, create_authenticated_client):
+    user = create_user()
+    _create_populated_shopping_lists(user, 3)
+
+    sync_response = create_authenticated_client(user).get(reverse("all-shopping-lists"))
+    async_response = async_to_sync(_create_async_client(user).get)(reverse("async-all-shopping-lists"))
+
+    assert async_response.status_code == status.HTTP_200_OK
+    assert async_response.content == sync_response.content
+
+
+@pytest.mark.django_db
+def test_async_shopping_items_follow_keyset_pages(create_user, create_shopping_list):
+    user = create_user()
+    shopping_list = create_shopping_list(name="Groceries", user=user)
+    ShoppingItem.objects.bulk_create(
+        [ShoppingItem(name=f"Item {index}", purchased=False, shopping_list=shopping_list) for index in range(7)]
+    )
+    client = _create_async_client(user)
+
+    first_page = async_to_sync(client.get)(reverse("async-list-shopping-items", args=[shopping_list.id])).json()
+    second_page = async_to_sync(client.get)(first_page["next"]).json()
+
+    names = [item["name"] for item in first_page["results"] + second_page["results"]]
+    assert sorted(names) == [f"Item {index}" for index in range(7)]
+    assert second_page["next"] is None
+
+
+@pytest.mark.django_db
+def test_async_shopping_list_detail_not_modified(create_user, create_shopping_list):
+    user = create_user()
+    shopping_list = create_shopping_list(name="Groceries", user=user)
+    client = _create_async_client(user)
+
+    url = reverse("async-shopping-list-detail", args=[shopping_list.id])
+    etag = async_to_sync(client.get)(url)["ETag"]
+    response = async_to_sync(client.get)(url, headers={"If-None-Match": etag})
+
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+@pytest.mark.django_db
+def test_async_views_are_restricted_to_members(create_user, create_shopping_list):
+    shopping_list = create_shopping_list(name="Groceries", user=create_user("list_creator"))
+    client = _create_async_client(create_user())
+
+    detail = async_to_sync(client.get)(reverse("async-shopping-list-detail", args=[shopping_list.id]))
+    items = async_to_sync(client.get)(reverse("async-list-shopping-items", args=[shopping_list.id]))
+    missing = async_to_sync(client.get)(reverse("async-list-shopping-items", args=[uuid.uuid4()]))
+
+    assert detail.status_code == status.HTTP_403_FORBIDDEN
+    assert items.status_code == status.HTTP_403_FORBIDDEN
+    assert missing.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_async_views_authenticate_tokens(create_user):
+    user = create_user()
+    _create_populated_shopping_lists(user, 1)
+    token = Token.objects.create(user=user)
+
+    url = reverse("async-all-shopping-lists")
+    client = AsyncClient()
+    authenticated = async_to_sync(client.get)(url, headers={"Authorization": f"Token {token.key}"})
+    invalid = async_to_sync(client.get)(url, headers={"Authorization": "Token invalid"})
+    anonymous = async_to_sync(client.get)(url)
+
+    assert authenticated.status_code == status.HTTP_200_OK
+    assert len(authenticated.json()["results"]) == 1
+    assert invalid.status_code == status.HTTP_403_FORBIDDEN
+    assert anonymous.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+def test_async_views_are_throttled(create_user, create_shopping_list, monkeypatch):
+    monkeypatch.setattr(MinuteRateThrottle, "THROTTLE_RATES", {"user_minute": "1/minute"})
+    user = create_user()
+    shopping_list = create_shopping_list(name="Groceries", user=user)
+    client = _create_async_client(user)
+
+    url = reverse("async-shopping-list-detail", args=[shopping_list.id])
+    async_to_sync(client.get)(url)
+    response = async_to_sync(client.get)(url)
+
+    assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+    assert int(response["Retry-After"]) > 0
+
+
+def _read_events(client, url, change):
+    """
+    Open the event stream, make the change once subscribed and return the following chunks.
+    """
+    async def read_events():
+        response = await client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response["Content-Type"] == "text/event-stream"
+
+        stream = aiter(response.streaming_content)
+        assert await anext(stream) == b"retry: 3000\n\n"
+        await sync_to_async(change)()
+
+        chunks = []
+        async for chunk in stream:
+            chunks.append(chunk.decode())
+            if len(chunks) == 2:
+                break
+
+        return chunks
+
+    return async_to_sync(read_events)()
+
+
+def _parse_event(chunk):
+    fields = dict(line.split(": ", 1) for line in chunk.strip().splitlines())
+
+    return fields["event"], json.loads(fields["data"])
+
+
+@pytest.mark.django_db
+def test_event_stream_pushes_item_changes(
+    create_user, create_authenticated_client, create_shopping_list, event_hub, django_capture_on_commit_callbacks
+):
+    user = create_user()
+    shopping_list = create_shopping_list(name="Groceries", user=user)
+
+    def change():
+        with django_capture_on_commit_callbacks(execute=True):
+            shopping_item = ShoppingItem.objects.create(name="Eggs", purchased=False, shopping_list=shopping_list)
+        with django_capture_on_commit_callbacks(execute=True):
+            url = reverse("shopping-item-detail", args=[shopping_list.id, shopping_item.id])
+            create_authenticated_client(user).patch(url, {"purchased": True})
+
+    chunks = _read_events(_create_async_client(user), reverse("shopping-list-events", args=[shopping_list.id]), change)
+    (created_type, created), (purchased_type, purchased) = [_parse_event(chunk) for chunk in chunks]
+
+    assert created_type == "items.created"
+    assert created["shopping_list"] == str(shopping_list.id)
+    assert created["items"] == [{"id": created["items"][0]["id"], "name": "Eggs", "purchased": False}]
+    assert purchased_type == "items.purchased"
+    assert purchased["items"][0]["purchased"] is True
+
+
+@pytest.mark.django_db
+def test_event_stream_ends_when_member_is_removed(
+    create_user, create_authenticated_client, create_shopping_list, event_hub, django_capture_on_commit_callbacks
+):
+    user = create_user()
+    other_user = create_user("other_user")
+    shopping_list = create_shopping_list(name="Groceries", user=user)
+    shopping_list.members.add(other_user)
+
+    def change():
+        with django_capture_on_commit_callbacks(execute=True):
+            url = reverse("shopping-list-remove-members", args=[shopping_list.id])
+            create_authenticated_client(user).put(url, {"members": [other_user.id]})
+
+    chunks = _read_events(_create_async_client(other_user), reverse("shopping-list-events", args=[shopping_list.id]), change)
+
+    assert len(chunks) == 1
+    assert _parse_event(chunks[0]) == (
+        "members.removed", {"type": "members.removed", "shopping_list": str(shopping_list.id), "members": [other_user.id]}
+    )
+    assert event_hub.subscriber_count(f"shopping-list:{shopping_list.id}") == 0
+
+
+@pytest.mark.django_db
+def test_event_stream_sends_keepalives(create_user, create_shopping_list, event_hub, settings):
+    settings.EVENTS_KEEPALIVE = 0.01
+    user = create_user()
+    shopping_list = create_shopping_list(name="Groceries", user=user)
+
+    chunks = _read_events(_create_async_client(user), reverse("shopping-list-events", args=[shopping_list.id]), lambda: None)
+
+    assert chunks == [": keepalive\n\n", ": keepalive\n\n"]
+
+
+@pytest.mark.django_db
+def test_rolled_back_changes_are_not_streamed(create_shopping_list, create_user, event_hub, django_capture_on_commit_callbacks):
+    shopping_list = create_shopping_list(name="Groceries", user=create_user())
+
+    async def subscribe_and_publish():
+        with event_hub.subscribe(f"shopping-list:{shopping_list.id}") as subscription:
+            await sync_to_async(ShoppingItem.objects.create)(name="Eggs", purchased=False, shopping_list=shopping_list)
+            with pytest.raises(asyncio.TimeoutError):
+                await subscription.get(timeout=0.05)
+
+    # Without executing the on commit callbacks, the change is never committed
+    with django_capture_on_commit_callbacks(execute=False) as callbacks:
+        async_to_sync(subscribe_and_publish)()
+
+    assert len(callbacks) == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_open_event_streams_share_a_thread(create_user, create_shopping_list, event_hub, settings):
+    # As under core.asgi
+    settings.MIDDLEWARE = [path for path in settings.MIDDLEWARE if not path.startswith("whitenoise.")]
+    user = create_user()
+    shopping_list = create_shopping_list(name="Groceries", user=user)
+    token = Token.objects.create(user=user)
+    application = ASGIHandler()
+
+    def get_scope(path):
+        headers = [(b"authorization", f"Token {token.key}".encode())]
+        return {
+            "type": "http", "method": "GET", "path": path, "query_string": b"", "headers": headers,
+            "server": ("testserver", 80),
+        }
+
+    async def open_stream(disconnected):
+        opened = asyncio.Event()
+        messages = [{"type": "http.request", "body": b""}]
+        sent = []
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if message["type"] == "http.response.body":
+                opened.set()
+
+        path = reverse("shopping-list-events", args=[shopping_list.id])
+        stream = asyncio.create_task(application(get_scope(path), receive, send))
+        await opened.wait()
+        assert sent[0]["status"] == status.HTTP_200_OK
+        assert sent[1]["body"] == b"retry: 3000\n\n"
+
+        return stream
+
+    async def count_threads():
+        # Unlike under async_to_sync, sync code runs in the threads a server would use
+        disconnected = asyncio.Event()
+        streams = [await open_stream(disconnected)]
+        threads = [threading.active_count()]
+        streams += [await open_stream(disconnected) for _ in range(20)]
+        threads.append(threading.active_count())
+
+        disconnected.set()
+        await asyncio.gather(*streams)
+        await sync_to_async(connections.close_all)()
+
+        return threads
+
+    assert application.is_long_lived(get_scope(reverse("shopping-list-events", args=[shopping_list.id])))
+    assert not application.is_long_lived(get_scope(reverse("async-shopping-list-detail", args=[shopping_list.id])))
+    first, last = asyncio.run(count_threads())
+    assert last == first
+    assert event_hub.subscriber_count(f"shopping-list:{shopping_list.id}") == 0
+
+
+@pytest.mark.django_db
+def test_event_stream_restricted_to_members(create_user, create_shopping_list, event_hub):
+    shopping_list = create_shopping_list(name="Groceries", user=create_user("list_creator"))
+    client = _create_async_client(create_user())
+
+    response = async_to_sync(client.get)(reverse("shopping-list-events", args=[shopping_list.id]))
+
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+    assert event_hub.subscriber_count(f"shopping-list:{shopping_list.id}") == 0
+
+
+def test_event_hubs_share_events_through_backend():
+    backend = LocalEventBackend()
+    hubs = [EventHub(backend), EventHub(backend)]
+
+    async def publish_and_receive():
+        with hubs[0].subscribe("channel") as first, hubs[1].subscribe("channel") as second:
+            hubs[1].publish("channel", {"type": "ping"})
+
+            return [await first.get(timeout=1), await second.get(timeout=1)]
+
+    assert async_to_sync(publish_and_receive)() == [{"type": "ping"}, {"type": "ping"}]
+
+
+def test_slow_event_subscriber_is_ended():
+    hub = EventHub(LocalEventBackend())
+
+    async def overflow():
+        with hub.subscribe("channel") as subscription:
+            for index in range(hub.max_queue_size + 1):
+                hub.publish("channel", {"type": "ping", "index": index})
+            await asyncio.sleep(0)
+
+            return await subscription.get(timeout=1)
+
+    assert async_to_sync(overflow)() is None
+
+
+@pytest.mark.django_db
+def test_shopping_list_changes_without_since_return_whole_list(create_user, create_authenticated_client):
+    user = create_user()
+    client = create_authenticated_client(user)
+    shopping_list = _create_populated_shopping_lists(user, 1)[0]
+    shopping_list.refresh_from_db()
+
+    response = client.get(reverse("shopping-list-changes", args=[shopping_list.id]))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["version"] == shopping_list.version
+    assert response.data["reset"] is True
+    assert sorted(item["name"] for item in response.data["items"]) == ["Eggs", "Milk"]
+    assert response.data["deleted"] == []
+    assert len(response.data["members"]) == 2
+
+
+@pytest.mark.django_db
+def test_shopping_list_changes_since_version(create_user, create_authenticated_client, create_shopping_list):
+    user = create_user()
+    client = create_authenticated_client(user)
+    shopping_list = create_shopping_list(name="Groceries", user=user)
+    items = [ShoppingItem.objects.create(name=f"Item {index}", purchased=False, shopping_list=shopping_list) for index in range(20)]
+
+    url = reverse("shopping-list-changes", args=[shopping_list.id])
+    since = client.get(url).data["version"]
+    client.patch(reverse("shopping-item-detail", args=[shopping_list.id, items[0].id]), {"purchased": True})
+    client.delete(reverse("shopping-item-detail", args=[shopping_list.id, items[1].id]))
+    client.post(reverse("list-add-shopping-item", args=[shopping_list.id]), {"name": "Milk", "purchased": False})
+    response = client.get(url, {"since": since})
+
+    assert response.data["reset"] is False
+    assert response.data["version"] == since + 3
+    assert [(item["name"], item["purchased"]) for item in response.data["items"]] == [("Item 0", True), ("Milk", False)]
+    assert response.data["deleted"] == [str(items[1].id)]
+    assert response.data["members"] is None
+
+    response = client.get(url, {"since": since + 2})
+
+    assert [item["name"] for item in response.data["items"]] == ["Milk"]
+    assert response.data["deleted"] == []
+
+
+@pytest.mark.django_db
+def test_shopping_list_changes_include_saves_of_some_fields(create_user, create_authenticated_client, create_shopping_list):
+    user = create_user()
+    client = create_authenticated_client(user)
+    shopping_list = create_shopping_list(name="Groceries", user=user)
+    item = ShoppingItem.objects.create(name="Eggs", purchased=False, shopping_list=shopping_list)
+
+    url = reverse("shopping-list-changes", args=[shopping_list.id])
+    since = client.get(url).data["version"]
+    item.name = "Milk"
+    item.save(update_fields=["name"])
+    response = client.get(url, {"since": since})
+
+    assert ShoppingItem.objects.get(pk=item.pk).version == response.data["version"] == since + 1
+    assert [item["name"] for item in response.data["items"]] == ["Milk"]
+
+
+@pytest.mark.django_db
+def test_shopping_list_changes_include_members_after_membership_change(
+    create_user, create_authenticated_client, create_shopping_list
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+    shopping_list = create_shopping_list(name="Groceries", user=user)
+    other_user = create_user("other_user")
+
+    url = reverse("shopping-list-changes", args=[shopping_list.id])
+    since = client.get(url).data["version"]
+    client.put(reverse("shopping-list-add-members", args=[shopping_list.id]), {"members": [other_user.id]})
+    response = client.get(url, {"since": since})
+
+    assert response.data["items"] == []
+    assert sorted(member["username"] for member in response.data["members"]) == ["other_user", "user"]
+
+
+@pytest.mark.django_db
+def test_shopping_list_changes_up_to_date_query_count(
+    create_user, create_authenticated_client, django_assert_num_queries
+):
+    user = create_user()
+    client = create_authenticated_client(user)
+    shopping_list = _create_populated_shopping_lists(user, 1)[0]
+    shopping_list.refresh_from_db()
+
+    url = reverse("shopping-list-changes", args=[shopping_list.id])
+    # session, user, shopping list with membership
+    with django_assert_num_queries(3):
+        response = client.get(url, {"since": shopping_list.version})
+
+    assert response.data == {
+        "version": shopping_list.version, "reset": False, "name": "List 0", "items": [], "deleted": [], "members": None
+    }
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("since", ["-1", "latest"])
+def test_shopping_list_changes_invalid_since(create_user, create_authenticated_client, create_shopping_list, since):
+    user = create_user()
+    client = create_authenticated_client(user)
+    shopping_list = create_shopping_list(name="Groceries", user=user)
+
+    response = client.get(reverse("shopping-list-changes", args=[shopping_list.id]), {"since": since})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_shopping_list_changes_restricted_to_members(create_user, create_authenticated_client, create_shopping_list):
+    shopping_list = create_shopping_list(name="Groceries", user=create_user("list_creator"))
+    client = create_authenticated_client(create_user())
+
+    response = client.get(reverse("shopping-list-changes", args=[shopping_list.id]))
+
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {"id": uuid.UUID("4f2c3a5e-8d8b-4b6f-9d51-1f2f0f6b7a10"), "name": "Café \u2028 \u2029", "purchased": False},
+        [{"price": decimal.Decimal("1.50"), "label": gettext_lazy("Eggs")}, None, 1.5, "\"quoted\""],
+        {"shopping_items": {0: ["Must be a valid UUID."]}},
+        {"updated_at": datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc), "day": datetime.date(2024, 1, 1)},
+        {"count": 2 ** 64},
+        {},
+    ],
+)
+def test_fast_json_renderer_matches_json_renderer(data):
+    assert FastJSONRenderer().render(data) == JSONRenderer().render(data)
+
+
+@pytest.mark.parametrize("accepted_media_type", [None, "application/json; indent=4"])
+def test_fast_json_renderer_falls_back_to_json_renderer(monkeypatch, accepted_media_type):
+    data = {"id": uuid.uuid4(), "items": [1, 2]}
+    if accepted_media_type is None:
+        monkeypatch.setattr(renderers, "orjson", None)
+
+    expected = JSONRenderer().render(data, accepted_media_type)
+
+    assert FastJSONRenderer().render(data, accepted_media_type) == expected
+
+
+@pytest.mark.parametrize("fast_encoder", [True, False])
+def test_fast_json_parser(monkeypatch, fast_encoder):
+    if not fast_encoder:
+        monkeypatch.setattr(renderers, "orjson", None)
+
+    assert FastJSONParser().parse(io.BytesIO('{"name": "Café", "items": [1]}'.encode())) == {"name": "Café", "items": [1]}
+    with pytest.raises(ParseError):
+        FastJSONParser().parse(io.BytesIO(b'{"name": '))
+
+
+@pytest.mark.django_db
+def test_shopping_items_are_rendered_with_fast_json_renderer(create_user, create_authenticated_client, create_shopping_item):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    shopping_item = create_shopping_item(list_name="Groceries", item_name="Eggs", user=user)
+
+    response = client.get(reverse("list-add-shopping-item", args=[shopping_item.shopping_list.id]))
+
+    assert isinstance(response.accepted_renderer, FastJSONRenderer)
+    assert response.content == JSONRenderer().render(response.data)
+
+
+@pytest.mark.django_db
+def test_malformed_json_is_bad_request(create_user, create_authenticated_client, create_shopping_list):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    shopping_list = create_shopping_list(name="Groceries", user=user)
+
+    url = reverse("list-add-shopping-item", args=[shopping_list.id])
+    response = client.post(url, '{"name": "Eggs",', content_type="application/json")
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data["detail"].startswith("JSON parse error")
+
+
+@pytest.mark.django_db
+def test_values_serializers_match_model_serializers(create_user):
+    user = create_user()
+    shopping_lists = _create_populated_shopping_lists(user, 3)
+    ShoppingItem.objects.create(name="Crème fraîche \u2028", purchased=False, shopping_list=shopping_lists[0])
+    ShoppingList.objects.create(name="Empty")
+
+    lists = ShoppingList.objects.order_by("id")
+    items = ShoppingItem.objects.order_by("shopping_list", "purchased", "id")
+    renderer = FastJSONRenderer()
+
+    expected = renderer.render(ShoppingListSerializer(lists, many=True).data)
+    rows = lists.values(*ShoppingListValuesSerializer.get_value_fields())
+    assert renderer.render(ShoppingListValuesSerializer(rows, many=True).data) == expected
+
+    expected = renderer.render(ShoppingListSerializer(shopping_lists[0]).data)
+    row = ShoppingListValuesSerializer.get_row(shopping_lists[0])
+    assert renderer.render(ShoppingListValuesSerializer(row).data) == expected
+
+    expected = renderer.render(ShoppingItemSerializer(items, many=True).data)
+    rows = items.values(*ShoppingItemValuesSerializer.get_value_fields())
+    assert renderer.render(ShoppingItemValuesSerializer(rows, many=True).data) == expected
+
+
+def test_shopping_lists_schema_documents_the_summary_for_get():
+    schema = SchemaGenerator().get_schema(request=None, public=True)
+    operations = schema["paths"][reverse("all-shopping-lists")]
+
+    def get_properties(response):
+        name = response["content"]["application/json"]["schema"]["$ref"].rsplit("/", 1)[-1]
+        component = schema["components"]["schemas"][name]
+        if "results" in component["properties"]:
+            name = component["properties"]["results"]["items"]["$ref"].rsplit("/", 1)[-1]
+
+        return set(schema["components"]["schemas"][name]["properties"])
+
+    assert get_properties(operations["get"]["responses"]["200"]) == set(ShoppingListSummarySerializer.Meta.fields)
+    assert get_properties(operations["post"]["responses"]["201"]) == set(ShoppingListSerializer.Meta.fields)
+
+
+def _parse_server_timing(header):
+    entries = {}
+    for entry in header.split(", "):
+        name, *params = entry.split(";")
+        entries[name] = dict(param.split("=", 1) for param in params)
+
+    return entries
+
+
+@pytest.mark.django_db
+def test_server_timing_header_reports_queries_and_stages(create_user, create_authenticated_client):
+    user = create_user()
+    client = create_authenticated_client(user)
+    shopping_list = _create_populated_shopping_lists(user, 1)[0]
+
+    response = client.get(reverse("shopping-list-detail", args=[shopping_list.id]))
+    entries = _parse_server_timing(response["Server-Timing"])
+
+    assert entries["db"]["desc"] == '"5 queries"'
+    assert entries["db-duplicates"]["desc"] == '"0"'
+    assert {"auth", "throttle", "permission", "serialize", "render", "total"} <= set(entries)
+    assert all(float(entry["dur"]) >= 0 for entry in entries.values() if "dur" in entry)
+
+
+@pytest.mark.django_db
+def test_server_timing_middleware_runs_async(create_user):
+    user = create_user()
+
+    async def get_response(request):
+        await User.objects.filter(pk=user.pk).aexists()
+        return HttpResponse()
+
+    middleware = ServerTimingMiddleware(get_response)
+    response = async_to_sync(middleware)(RequestFactory().get("/"))
+
+    assert asyncio.iscoroutinefunction(middleware)
+    assert _parse_server_timing(response["Server-Timing"])["db"]["desc"] == '"1 queries"'
+
+
+@pytest.mark.django_db
+def test_server_timing_middleware_separates_requests_sharing_a_thread(create_user):
+    user = create_user()
+
+    async def run():
+        # Under async_to_sync the ORM calls of both requests run in this thread
+        first_started, second_queried, first_ended = asyncio.Event(), asyncio.Event(), asyncio.Event()
+
+        async def first(request):
+            first_started.set()
+            await second_queried.wait()
+            await User.objects.filter(pk=user.pk).aexists()
+            return HttpResponse()
+
+        async def second(request):
+            await first_started.wait()
+            await User.objects.filter(pk=user.pk).aexists()
+            await User.objects.filter(pk=user.pk).aexists()
+            second_queried.set()
+            await first_ended.wait()
+            await User.objects.filter(pk=user.pk).aexists()
+            return HttpResponse()
+
+        async def run_first():
+            response = await ServerTimingMiddleware(first)(RequestFactory().get("/"))
+            first_ended.set()
+            return response
+
+        return await asyncio.gather(run_first(), ServerTimingMiddleware(second)(RequestFactory().get("/")))
+
+    responses = async_to_sync(run)()
+
+    assert [_parse_server_timing(response["Server-Timing"])["db"]["desc"] for response in responses] == [
+        '"1 queries"', '"3 queries"'
+    ]
+    assert connection.execute_wrappers == []
+
+
+@pytest.mark.django_db
+def test_server_timing_header_can_be_disabled(create_user, create_authenticated_client, settings):
+    settings.SERVER_TIMING_HEADER = False
+    client = create_authenticated_client(create_user())
+
+    response = client.get(reverse("all-shopping-lists"))
+
+    assert "Server-Timing" not in response
+
+
+@pytest.mark.django_db
+def test_request_timer_counts_duplicate_queries(create_user):
+    user = create_user()
+    timer = RequestTimer()
+
+    with connection.execute_wrapper(timer.record_query):
+        User.objects.filter(pk=user.pk).exists()
+        User.objects.filter(pk=user.pk).exists()
+        User.objects.filter(pk=user.pk + 1).exists()
+
+    assert timer.query_count == 3
+    assert timer.duplicate_queries == 1
+
+
+@pytest.mark.django_db
+def test_slow_requests_are_logged(create_user, create_authenticated_client, settings, caplog):
+    settings.SLOW_REQUEST_MS = 0
+    client = create_authenticated_client(create_user())
+
+    with caplog.at_level("WARNING", logger="utils.timing"):
+        client.get(reverse("all-shopping-lists"))
+
+    [record] = [record for record in caplog.records if record.name == "utils.timing"]
+    assert record.request_timing["path"] == reverse("all-shopping-lists")
+    # session, user, count
+    assert record.request_timing["db_queries"] == 3
+    assert "db_queries=3" in record.getMessage()
+
+
+def _seed_data(**options):
+    options = {"users": 6, "lists": 4, "members_per_list": 3, "items_per_list": 5, "batch_size": 3, **options}
+    call_command("seed_data", stdout=io.StringIO(), **options)
+
+
+@pytest.mark.django_db
+def test_seed_data_creates_rows_in_batches():
+    _seed_data(seed=1, purchased_ratio=0)
+
+    assert User.objects.filter(username__startswith="seed-1-").count() == 6
+    assert ShoppingList.objects.count() == 4
+    assert ShoppingList.members.through.objects.count() == 12
+    assert ShoppingItem.objects.count() == 20
+    assert not ShoppingItem.objects.filter(purchased=True).exists()
+    assert all(shopping_list.members.count() == 3 for shopping_list in ShoppingList.objects.all())
+
+
+@pytest.mark.django_db
+def test_seed_data_users_can_log_in():
+    _seed_data(seed=1, password="secret")
+
+    assert APIClient().login(username="seed-1-0", password="secret")
+
+
+@pytest.mark.django_db
+def test_seed_data_is_deterministic():
+    _seed_data(seed=2)
+    rows = list(ShoppingItem.objects.order_by("id").values_list("id", "name", "purchased", "shopping_list_id"))
+    members = set(ShoppingList.members.through.objects.values_list("shoppinglist_id", "user__username"))
+
+    ShoppingList.objects.all().delete()
+    User.objects.all().delete()
+    _seed_data(seed=2)
+
+    assert list(ShoppingItem.objects.order_by("id").values_list("id", "name", "purchased", "shopping_list_id")) == rows
+    assert set(ShoppingList.members.through.objects.values_list("shoppinglist_id", "user__username")) == members
+
+
+@pytest.mark.django_db
+def test_seed_data_refuses_to_reseed():
+    _seed_data(seed=3)
+
+    with pytest.raises(CommandError):
+        _seed_data(seed=3)
+
+    _seed_data(seed=4)
+    assert ShoppingList.objects.count() == 8
+
+
+def _create_items(shopping_list, purchased, count):
+    shopping_items = ShoppingItem.objects.bulk_create(
+        ShoppingItem(name=f"Item {index}", purchased=purchased, shopping_list=shopping_list) for index in range(count)
+    )
+    ShoppingList.objects.filter(pk=shopping_list.pk).recount()
+
+    return shopping_items
+
+
+@pytest.mark.django_db
+def test_delete_purchased_deletes_in_batches_with_one_delete_each(create_user, create_shopping_list):
+    shopping_list = create_shopping_list("Groceries", create_user())
+    _create_items(shopping_list, True, 5)
+    _create_items(shopping_list, False, 2)
+
+    with CaptureQueriesContext(connection) as queries:
+        deleted = ShoppingItem.objects.filter(shopping_list=shopping_list).delete_purchased(batch_size=2)
+
+    assert deleted == 5
+    assert ShoppingItem.objects.filter(shopping_list=shopping_list).count() == 2
+    deletes = [query["sql"] for query in queries if query["sql"].startswith('DELETE FROM "api_shoppingitem"')]
+    assert len(deletes) == 3
+    assert shopping_list.tombstones.count() == 5
+
+
+@pytest.mark.django_db
+def test_delete_purchased_keeps_items_unpurchased_before_the_lock(create_user, create_shopping_list, monkeypatch):
+    shopping_list = create_shopping_list("Groceries", create_user())
+    unpurchased, purchased = _create_items(shopping_list, True, 2)
+    select_for_update = models.ShoppingListQuerySet.select_for_update
+
+    def unpurchase_then_lock(queryset, *args, **kwargs):
+        # Another request that locked the list first, such as a save of the item
+        ShoppingItem.objects.filter(pk=unpurchased.pk).update(purchased=False)
+        ShoppingList.objects.filter(pk=shopping_list.pk).count_items(unpurchased=1)
+        return select_for_update(queryset, *args, **kwargs)
+
+    monkeypatch.setattr(models.ShoppingListQuerySet, "select_for_update", unpurchase_then_lock)
+    deleted = ShoppingItem.objects.filter(shopping_list=shopping_list).delete_purchased()
+
+    assert deleted == 1
+    assert list(ShoppingItem.objects.values_list("pk", flat=True)) == [unpurchased.pk]
+    assert list(shopping_list.tombstones.values_list("shopping_item_id", flat=True)) == [purchased.pk]
+    shopping_list.refresh_from_db()
+    assert (shopping_list.item_count, shopping_list.unpurchased_count) == (1, 1)
+
+
+@pytest.mark.django_db
+def test_delete_purchased_is_scoped_to_the_lists_of_the_user(create_user, create_authenticated_client, create_shopping_list):
+    user = create_user()
+    other_user = create_user("other")
+    shopping_list = create_shopping_list("Groceries", user)
+    other_shopping_list = create_shopping_list("Hardware", user)
+    foreign_shopping_list = create_shopping_list("Garden", other_user)
+    for each in [shopping_list, other_shopping_list, foreign_shopping_list]:
+        _create_items(each, True, 2)
+    client = create_authenticated_client(user)
+
+    response = client.delete(reverse("delete-all-purchased") + f"?shopping_list={shopping_list.id}")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data == {"deleted": 2}
+    assert ShoppingItem.objects.filter(purchased=True).count() == 4
+
+    response = client.delete(reverse("delete-all-purchased"))
+
+    assert response.data == {"deleted": 2}
+    assert list(ShoppingItem.objects.values_list("shopping_list", flat=True)) == [foreign_shopping_list.id] * 2
+
+
+@pytest.mark.django_db
+def test_delete_purchased_invalid_shopping_list(create_user, create_authenticated_client):
+    client = create_authenticated_client(create_user())
+
+    response = client.delete(reverse("delete-all-purchased") + "?shopping_list=invalid")
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_delete_purchased_bumps_versions_and_publishes(create_user, create_shopping_list, monkeypatch):
+    shopping_list = create_shopping_list("Groceries", create_user())
+    _create_items(shopping_list, True, 3)
+    version = ShoppingList.objects.get(pk=shopping_list.pk).version
+    published = []
+    monkeypatch.setattr(models, "publish_item_events", lambda event_type, items: published.append((event_type, len(items))))
+
+    ShoppingItem.objects.filter(shopping_list=shopping_list).delete_purchased(batch_size=2)
+
+    assert ShoppingList.objects.get(pk=shopping_list.pk).version == version + 2
+    assert published == [("items.deleted", 2), ("items.deleted", 1)]
+
+
+@pytest.mark.django_db
+def test_purge_purchased_command(create_user, create_shopping_list):
+    user = create_user()
+    shopping_list = create_shopping_list("Groceries", user)
+    other_shopping_list = create_shopping_list("Garden", create_user("other"))
+    _create_items(shopping_list, True, 3)
+    _create_items(other_shopping_list, True, 2)
+    stdout = io.StringIO()
+
+    call_command("purge_purchased", user=user.username, batch_size=2, stdout=stdout)
+
+    assert stdout.getvalue().splitlines() == ["Deleted 3 purchased shopping items", "Pruned 0 tombstones older than 30 days"]
+
+    call_command("purge_purchased", shopping_list=str(other_shopping_list.id), stdout=stdout)
+
+    assert not ShoppingItem.objects.exists()
+
+    with pytest.raises(CommandError):
+        call_command("purge_purchased", shopping_list="invalid", stdout=stdout)
+    with pytest.raises(CommandError):
+        call_command("purge_purchased", user="nobody", stdout=stdout)
+
+
+@pytest.mark.django_db
+def test_purge_purchased_command_prunes_old_tombstones(create_user, create_authenticated_client, create_shopping_list):
+    user = create_user()
+    client = create_authenticated_client(user)
+    shopping_list = create_shopping_list("Groceries", user)
+    eggs, milk, bread = [
+        ShoppingItem.objects.create(name=name, purchased=False, shopping_list=shopping_list) for name in ["Eggs", "Milk", "Bread"]
+    ]
+    url = reverse("shopping-list-changes", args=[shopping_list.id])
+    since = client.get(url).data["version"]
+    milk_id = milk.id
+    eggs.delete()
+    ShoppingItemTombstone.objects.update(deleted_at=timezone.now() - datetime.timedelta(days=31))
+    milk.delete()
+    stdout = io.StringIO()
+
+    call_command("purge_purchased", all=True, batch_size=1, stdout=stdout)
+
+    assert stdout.getvalue().splitlines()[1] == "Pruned 1 tombstones older than 30 days"
+    assert list(ShoppingItemTombstone.objects.values_list("shopping_item_id", flat=True)) == [milk_id]
+    # Behind the pruned tombstone, the client starts over
+    response = client.get(url, {"since": since})
+    assert response.data["reset"] is True
+    assert [item["name"] for item in response.data["items"]] == ["Bread"]
+    response = client.get(url, {"since": since + 1})
+    assert response.data["reset"] is False
+    assert response.data["deleted"] == [str(milk_id)]
+
+
+@pytest.mark.django_db
+def test_mark_bulk_purchased_counts_per_list(create_user, create_authenticated_client, create_shopping_list):
+    user = create_user()
+    shopping_list = create_shopping_list("Groceries", user)
+    other_shopping_list = create_shopping_list("Hardware", user)
+    items = _create_items(shopping_list, False, 3) + _create_items(other_shopping_list, False, 1)
+    versions = dict(ShoppingList.objects.values_list("id", "version"))
+    client = create_authenticated_client(user)
+
+    response = client.patch(
+        reverse("mark-bulk-purchased"), {"shopping_items": [item.id for item in items] + [items[0].id]}, format="json"
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data == {"updated": 4, "shopping_lists": {str(shopping_list.id): 3, str(other_shopping_list.id): 1}}
+    assert not ShoppingItem.objects.filter(purchased=False).exists()
+    for pk, version in ShoppingList.objects.values_list("id", "version"):
+        assert version == versions[pk] + 1
+        assert set(ShoppingItem.objects.filter(shopping_list=pk).values_list("version", flat=True)) == {version}
+
+
+@pytest.mark.django_db
+def test_mark_bulk_unpurchased(create_user, create_authenticated_client, create_shopping_list):
+    user = create_user()
+    shopping_list = create_shopping_list("Groceries", user)
+    items = _create_items(shopping_list, True, 2) + _create_items(shopping_list, False, 1)
+    client = create_authenticated_client(user)
+
+    response = client.patch(
+        reverse("mark-bulk-purchased"), {"shopping_items": [item.id for item in items], "purchased": False}, format="json"
+    )
+
+    assert response.data == {"updated": 2, "shopping_lists": {str(shopping_list.id): 2}}
+    assert not ShoppingItem.objects.filter(purchased=True).exists()
+
+
+@pytest.mark.django_db
+def test_mark_bulk_purchased_restricted_to_member_lists(create_user, create_authenticated_client, create_shopping_list):
+    user = create_user()
+    foreign_shopping_list = create_shopping_list("Garden", create_user("other"))
+    items = _create_items(foreign_shopping_list, False, 2)
+    version = ShoppingList.objects.get(pk=foreign_shopping_list.pk).version
+    client = create_authenticated_client(user)
+
+    response = client.patch(reverse("mark-bulk-purchased"), {"shopping_items": [item.id for item in items]}, format="json")
+
+    assert response.data == {"updated": 0, "shopping_lists": {}}
+    assert not ShoppingItem.objects.filter(purchased=True).exists()
+    assert ShoppingList.objects.get(pk=foreign_shopping_list.pk).version == version
+
+
+@pytest.mark.django_db
+def test_mark_bulk_purchased_chunks_large_id_sets(create_user, create_shopping_list):
+    user = create_user()
+    shopping_list = create_shopping_list("Groceries", user)
+    items = _create_items(shopping_list, False, 5)
+    ids = [item.id for item in items] + [uuid.uuid4() for _ in range(3000)]
+
+    with CaptureQueriesContext(connection) as queries:
+        counts = ShoppingItem.objects.filter(shopping_list__members=user).set_purchased(ids, True, batch_size=1000)
+
+    assert counts == {shopping_list.id: 5}
+    # The lists are locked in batches before the items are read in batches
+    selects = [query for query in queries if query["sql"].startswith("SELECT")]
+    assert len(selects) == 8
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("data", [{}, {"shopping_items": []}, {"shopping_items": ["invalid"]}])
+def test_mark_bulk_purchased_invalid(create_user, create_authenticated_client, data):
+    client = create_authenticated_client(create_user())
+
+    response = client.patch(reverse("mark-bulk-purchased"), data, format="json")
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = False
+        self.usable = True
+
+    def close(self):
+        self.closed = True
+
+
+def _create_pool(**options):
+    return ConnectionPool(
+        connect=FakeConnection,
+        close=FakeConnection.close,
+        reset=lambda conn: not conn.closed,
+        ping=lambda conn: conn.usable,
+        **{"max_size": 2, "timeout": 0.01, **options},
+    )
+
+
+def test_connection_pool_reuses_connections():
+    pool = _create_pool()
+
+    conn = pool.getconn()
+    pool.putconn(conn)
+
+    assert pool.getconn() is conn
+    assert pool.getconn() is not conn
+    metrics = pool.get_metrics()
+    assert (metrics["size"], metrics["in_use"], metrics["checkouts"], metrics["connects"]) == (2, 2, 3, 2)
+
+
+def test_connection_pool_times_out_when_exhausted():
+    pool = _create_pool(max_size=1)
+    pool.getconn()
+
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+
+    assert pool.get_metrics()["timeouts"] == 1
+
+
+def test_connection_pool_replaces_broken_connections():
+    pool = _create_pool(check_after=0)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.usable = False
+
+    assert pool.getconn() is not conn
+    assert conn.closed
+
+    other = pool.getconn()
+    pool.putconn(other, broken=True)
+
+    assert other.closed
+    metrics = pool.get_metrics()
+    assert (metrics["size"], metrics["reconnects"]) == (1, 2)
+
+
+def test_connection_pool_pings_only_idle_connections():
+    pool = _create_pool(check_after=60)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.usable = False
+
+    assert pool.getconn() is conn
+
+
+def test_connection_pool_retires_old_connections():
+    pool = _create_pool(max_lifetime=0)
+    conn = pool.getconn()
+    pool.putconn(conn)
+
+    assert conn.closed
+    assert pool.get_metrics()["reconnects"] == 0
+
+
+def test_connection_pool_fills_to_min_size():
+    pool = _create_pool(min_size=2, max_size=3)
+
+    pool.fill()
+
+    assert pool.get_metrics()["idle"] == 2
+    assert pool.get_metrics()["connects"] == 2
+
+
+
+@pytest.mark.django_db(databases=["default", "replica"])
+def test_safe_requests_read_from_replica(create_user, create_authenticated_client, create_shopping_list, replica):
+    user = create_user()
+    create_shopping_list("Groceries", user)
+    client = create_authenticated_client(user)
+
+    response = client.get(reverse("all-shopping-lists"))
+
+    # The replica never received the list
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["results"] == []
+
+
+@pytest.mark.django_db(databases=["default", "replica"])
+def test_writes_pin_the_user_to_primary(create_user, create_authenticated_client, replica):
+    user = create_user()
+    other_user = create_user("other")
+    client = create_authenticated_client(user)
+
+    response = client.post(reverse("all-shopping-lists"), {"name": "Groceries"}, format="json")
+    ShoppingList.objects.get(pk=response.data["id"]).members.add(other_user)
+
+    assert [item["name"] for item in client.get(reverse("all-shopping-lists")).data["results"]] == ["Groceries"]
+    assert create_authenticated_client(other_user).get(reverse("all-shopping-lists")).data["results"] == []
+
+
+@pytest.mark.django_db(databases=["default", "replica"])
+def test_token_writes_pin_the_user_to_primary(create_user, replica):
+    user = create_user()
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=user).key}")
+
+    client.post(reverse("all-shopping-lists"), {"name": "Groceries"}, format="json")
+
+    assert len(client.get(reverse("all-shopping-lists")).data["results"]) == 1
+
+
+@pytest.mark.django_db(databases=["default", "replica"])
+def test_primary_pin_expires(create_user, create_authenticated_client, replica, settings):
+    settings.REPLICA_PIN_SECONDS = 0
+    client = create_authenticated_client(create_user())
+
+    client.post(reverse("all-shopping-lists"), {"name": "Groceries"}, format="json")
+
+    assert client.get(reverse("all-shopping-lists")).data["results"] == []
+
+
+@pytest.mark.django_db(databases=["default", "replica"])
+def test_async_views_read_from_replica(create_user, create_shopping_list, replica):
+    user = create_user()
+    create_shopping_list("Groceries", user)
+
+    response = async_to_sync(_create_async_client(user).get)(reverse("async-all-shopping-lists"))
+
+    assert response.status_code == status.HTTP_200_OK
+    assert json.loads(response.content)["results"] == []
+
+
+@pytest.mark.django_db(databases=["default", "replica"])
+def test_async_writes_pin_the_user_to_primary(create_user, create_shopping_list, replica, settings):
+    # As under core.asgi
+    settings.MIDDLEWARE = [path for path in settings.MIDDLEWARE if not path.startswith("whitenoise.")]
+    user = create_user()
+    client = _create_async_client(user)
+
+    async_to_sync(client.post)(reverse("all-shopping-lists"), {"name": "Groceries"}, content_type="application/json")
+    response = async_to_sync(client.get)(reverse("async-all-shopping-lists"))
+
+    assert [item["name"] for item in json.loads(response.content)["results"]] == ["Groceries"]
+
+
+def test_asgi_middleware_is_async_capable(settings):
+    asgi_middleware = [path for path in settings.MIDDLEWARE if not path.startswith("whitenoise.")]
+
+    assert [path for path in asgi_middleware if not getattr(import_string(path), "async_capable", False)] == []
+
+
+@pytest.mark.django_db
+def test_replica_router_without_replicas_or_requests(settings):
+    router = ReplicaRouter()
+
+    assert router.db_for_read(ShoppingList) == "default"
+    settings.DATABASE_REPLICAS = ["replica"]
+    # Outside of safe requests, such as in management commands
+    assert router.db_for_read(ShoppingList) == "default"
+    assert router.db_for_write(ShoppingList, instance=ShoppingList(name="Groceries")) == "default"
+
+
+def _get_counts(shopping_list):
+    return ShoppingList.objects.values_list("item_count", "unpurchased_count").get(pk=shopping_list.pk)
+
+
+@pytest.mark.django_db
+def test_item_counters_follow_item_changes(create_user, create_authenticated_client, create_shopping_list):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    shopping_list = create_shopping_list(name="Groceries", user=user)
+    url = reverse("list-add-shopping-item", args=[shopping_list.id])
+
+    client.post(url, {"name": "Eggs", "purchased": False}, format="json")
+    client.post(url, [{"name": "Milk", "purchased": True}, {"name": "Bread", "purchased": False}], format="json")
+    assert _get_counts(shopping_list) == (3, 2)
+
+    eggs = ShoppingItem.objects.get(name="Eggs")
+    client.patch(reverse("shopping-item-detail", args=[shopping_list.id, eggs.id]), {"purchased": True})
+    assert _get_counts(shopping_list) == (3, 1)
+
+    client.delete(reverse("shopping-item-detail", args=[shopping_list.id, eggs.id]))
+    assert _get_counts(shopping_list) == (2, 1)
+
+    bread = ShoppingItem.objects.get(name="Bread")
+    bread.delete()
+    assert _get_counts(shopping_list) == (1, 0)
+
+
+@pytest.mark.django_db
+def test_item_counters_follow_bulk_changes(create_user, create_shopping_list, monkeypatch):
+    user = create_user()
+    shopping_list = create_shopping_list("Groceries", user)
+    other_shopping_list = create_shopping_list("Hardware", user)
+    items = _create_items(shopping_list, False, 3) + _create_items(other_shopping_list, False, 2)
+    monkeypatch.setattr(models, "publish_item_events", lambda event_type, items: None)
+
+    ShoppingItem.objects.set_purchased([item.id for item in items[1:]], True)
+    assert (_get_counts(shopping_list), _get_counts(other_shopping_list)) == ((3, 1), (2, 0))
+
+    ShoppingItem.objects.delete_purchased(batch_size=3)
+    assert (_get_counts(shopping_list), _get_counts(other_shopping_list)) == ((1, 1), (0, 0))
+
+
+@pytest.mark.django_db
+def test_item_counters_follow_stale_instances(create_user, create_shopping_list, monkeypatch):
+    user = create_user()
+    shopping_list = create_shopping_list("Groceries", user)
+    eggs, milk = _create_items(shopping_list, False, 2)
+    monkeypatch.setattr(models, "publish_item_events", lambda event_type, items: None)
+
+    # Two members mark the same item purchased from instances loaded before either save
+    first, second = ShoppingItem.objects.get(pk=eggs.pk), ShoppingItem.objects.get(pk=eggs.pk)
+    first.purchased = second.purchased = True
+    first.save()
+    second.save()
+    assert _get_counts(shopping_list) == (2, 1)
+
+    # Saved again as loaded before a bulk change
+    stale = ShoppingItem.objects.get(pk=milk.pk)
+    ShoppingItem.objects.set_purchased([milk.pk], True)
+    stale.save()
+    assert _get_counts(shopping_list) == (2, 1)
+
+    first, second = ShoppingItem.objects.get(pk=eggs.pk), ShoppingItem.objects.get(pk=eggs.pk)
+    first.delete()
+    second.delete()
+    assert _get_counts(shopping_list) == (1, 1)
+    assert ShoppingItemTombstone.objects.filter(shopping_item_id=eggs.pk).count() == 1
+
+
+@pytest.mark.django_db
+def test_shopping_list_detail_includes_counters(create_user, create_authenticated_client):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    shopping_list = _create_populated_shopping_lists(user, 1)[0]
+
+    response = client.get(reverse("shopping-list-detail", args=[shopping_list.id]))
+
+    assert (response.data["item_count"], response.data["unpurchased_count"]) == (2, 1)
+
+
+@pytest.mark.django_db
+def test_recount_items_command(create_user, create_shopping_list):
+    user = create_user()
+    shopping_lists = [create_shopping_list(f"List {index}", user) for index in range(3)]
+    for shopping_list in shopping_lists:
+        _create_items(shopping_list, True, 2)
+        _create_items(shopping_list, False, 1)
+    ShoppingList.objects.update(item_count=7, unpurchased_count=7)
+    stdout = io.StringIO()
+
+    call_command("recount_items", shopping_list=str(shopping_lists[0].id), stdout=stdout)
+
+    assert [_get_counts(shopping_list) for shopping_list in shopping_lists] == [(3, 1), (7, 7), (7, 7)]
+
+    call_command("recount_items", batch_size=2, stdout=stdout)
+
+    assert [_get_counts(shopping_list) for shopping_list in shopping_lists] == [(3, 1)] * 3
+    assert stdout.getvalue().splitlines()[-1] == "Recounted the items of 3 shopping lists"
+
+    with pytest.raises(CommandError):
+        call_command("recount_items", shopping_list="invalid", stdout=stdout)
+
+
+@pytest.mark.django_db
+def test_seed_data_counts_items():
+    _seed_data(seed=3, purchased_ratio=0)
+
+    assert set(ShoppingList.objects.values_list("item_count", "unpurchased_count")) == {(5, 5)}
+
+
+@pytest.mark.django_db
+def test_user_summary_counts_in_one_query(create_user, create_authenticated_client, django_assert_num_queries):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    shopping_lists = _create_populated_shopping_lists(user, 3)
+    ShoppingItem.objects.create(name="Bread", purchased=False, shopping_list=shopping_lists[0])
+    foreign_shopping_list = ShoppingList.objects.create(name="Foreign")
+    foreign_shopping_list.members.add(create_user(username="other"))
+
+    # session, user, summary
+    with django_assert_num_queries(3):
+        response = client.get(reverse("user-summary"))
+
+    assert response.status_code == status.HTTP_200_OK
+    summary = response.data["shopping_lists"]
+    # Most recently changed first, the first list changed last
+    order = [shopping_lists[0], shopping_lists[2], shopping_lists[1]]
+    assert [shopping_list["id"] for shopping_list in summary] == [str(shopping_list.id) for shopping_list in order]
+    assert {key: summary[0][key] for key in ["member_count", "item_count", "unpurchased_count"]} == {
+        "member_count": 2, "item_count": 3, "unpurchased_count": 2
+    }
+    assert summary[0]["version"] == ShoppingList.objects.get(pk=shopping_lists[0].pk).version
+    assert (response.data["item_count"], response.data["unpurchased_count"]) == (7, 4)
+
+
+@pytest.mark.django_db
+def test_user_summary_without_lists(create_user, create_authenticated_client):
+    client = create_authenticated_client(user=create_user())
+
+    response = client.get(reverse("user-summary"))
+
+    assert response.data == {"shopping_lists": [], "item_count": 0, "unpurchased_count": 0}
+
+
+@pytest.mark.django_db
+def test_user_summary_requires_authentication():
+    response = APIClient().get(reverse("user-summary"))
+
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+def _search(client, query, **params):
+    response = client.get(reverse("search-shopping-items"), {"q": query, **params})
+    assert response.status_code == status.HTTP_200_OK
+
+    return [shopping_item["name"] for shopping_item in response.data["results"]]
+
+
+@pytest.mark.django_db
+def test_search_items_by_word_prefix(create_user, create_authenticated_client, create_shopping_list):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    shopping_list = create_shopping_list("Groceries", user)
+    other_shopping_list = create_shopping_list("Hardware", user)
+    for name in ["Oat milk", "Silk scarf", "Bread", "Eggs 3", "Eggs 30"]:
+        ShoppingItem.objects.create(name=name, purchased=False, shopping_list=shopping_list)
+    ShoppingItem.objects.create(name="Milkshake", purchased=True, shopping_list=other_shopping_list)
+    ShoppingItem.objects.create(name="Milk", purchased=False, shopping_list=create_shopping_list("Foreign", create_user("other")))
+
+    assert _search(client, "mil") == ["Milkshake", "Oat milk"]
+    assert _search(client, "OAT  mi!") == ["Oat milk"]
+    assert _search(client, "ilk") == []
+    # Single characters match whole words
+    assert _search(client, "eggs 3") == ["Eggs 3"]
+    assert _search(client, "!!!") == []
+
+
+@pytest.mark.django_db
+def test_search_items_of_more_lists_than_indexed(create_user, create_authenticated_client, create_shopping_list, monkeypatch):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    ShoppingItem.objects.create(name="Milk", purchased=False, shopping_list=create_shopping_list("Groceries", user))
+    ShoppingItem.objects.create(name="Milk", purchased=False, shopping_list=create_shopping_list("Foreign", create_user("other")))
+    monkeypatch.setattr(search, "MAX_INDEXED_SHOPPING_LISTS", 0)
+
+    assert _search(client, "milk") == ["Milk"]
+
+
+@pytest.mark.django_db
+def test_search_items_fuzzy(create_user, create_authenticated_client, create_shopping_list):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    shopping_list = create_shopping_list("Groceries", user)
+    for name in ["Oat milk", "Bananas", "Silk scarf"]:
+        ShoppingItem.objects.create(name=name, purchased=False, shopping_list=shopping_list)
+
+    assert _search(client, "mlik") == []
+    assert _search(client, "mlik", fuzzy="true") == ["Oat milk"]
+    assert _search(client, "banannas", fuzzy="true") == ["Bananas"]
+    assert _search(client, "ba", fuzzy="true") == ["Bananas"]
+
+
+@pytest.mark.django_db
+def test_search_index_follows_item_changes(create_user, create_authenticated_client, create_shopping_list, monkeypatch):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    shopping_list = create_shopping_list("Groceries", user)
+    shopping_item = ShoppingItem.objects.create(name="Milk", purchased=False, shopping_list=shopping_list)
+
+    client.patch(reverse("shopping-item-detail", args=[shopping_list.id, shopping_item.id]), {"name": "Butter"})
+    assert (_search(client, "milk"), _search(client, "butter")) == ([], ["Butter"])
+
+    client.patch(reverse("shopping-item-detail", args=[shopping_list.id, shopping_item.id]), {"purchased": True})
+    assert _search(client, "butter") == ["Butter"]
+
+    client.delete(reverse("shopping-item-detail", args=[shopping_list.id, shopping_item.id]))
+    assert _search(client, "butter") == []
+
+    _create_items(shopping_list, True, 2)
+    assert _search(client, "item") == ["Item 0", "Item 1"]
+
+    monkeypatch.setattr(models, "publish_item_events", lambda event_type, items: None)
+    ShoppingItem.objects.delete_purchased()
+    assert _search(client, "item") == []
+
+
+@pytest.mark.django_db
+def test_search_items_keyset_pagination(create_user, create_authenticated_client, create_shopping_list, django_assert_num_queries):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    shopping_items = _create_items(create_shopping_list("Groceries", user), False, 15)
+    url = reverse("search-shopping-items")
+
+    # session, user, lists of the user, page
+    with django_assert_num_queries(4):
+        response = client.get(url, {"q": "item", "page_size": 10})
+    names = [shopping_item["name"] for shopping_item in response.data["results"]]
+    response = client.get(response.data["next"])
+    names += [shopping_item["name"] for shopping_item in response.data["results"]]
+
+    assert names == sorted(shopping_item.name for shopping_item in shopping_items)
+    assert response.data["next"] is None
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("params", [{}, {"q": ""}, {"q": "milk", "fuzzy": "maybe"}])
+def test_search_items_invalid(create_user, create_authenticated_client, params):
+    client = create_authenticated_client(create_user())
+
+    response = client.get(reverse("search-shopping-items"), params)
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.parametrize(
+    "source, target, distance",
+    [("milk", "milk", 0), ("milk", "mlik", 1), ("milk", "milc", 1), ("banana", "bananna", 1), ("milk", "bread", 3)],
+)
+def test_edit_distance(source, target, distance):
+    assert search.get_edit_distance(source, target, max_edits=2) == distance
+
+
+@pytest.mark.django_db
+def test_optimize_search_index_command(create_user, create_authenticated_client, create_shopping_list):
+    user = create_user()
+    client = create_authenticated_client(user=user)
+    _create_items(create_shopping_list("Groceries", user), False, 3)
+    stdout = io.StringIO()
+
+    call_command("optimize_search_index", stdout=stdout)
+
+    assert stdout.getvalue().strip() == "Optimized the item search index"
+    assert _search(client, "item") == ["Item 0", "Item 1", "Item 2"]
+
+
+@pytest.mark.django_db
+def test_search_triggers_check():
+    assert check_search_triggers(None, databases=["default"]) == []
+
+    # As a later migration that rebuilds the items table would
+    with connection.cursor() as cursor:
+        cursor.execute("DROP TRIGGER api_shoppingitem_fts_update")
+
+    assert [error.id for error in check_search_triggers(None, databases=["default"])] == ["api.W001"]
@@ -1,22 +1,48 @@
 from django.urls import include, path
 from rest_framework.authtoken.views import obtain_auth_token
 
+from app.api.async_views import (
+    AsyncListShoppingItems,
+    AsyncListShoppingLists,
+    AsyncShoppingListDetail,
+    ShoppingListEvents,
+)
 from app.api.views import (
     ListAddShoppingItem,
     ListAddShoppingList,
     ShoppingItemDetail,
     ShoppingListAddMembers,
+    ShoppingListChanges,
     ShoppingListDetail,
     ShoppingListRemoveMembers,
+    UserSummary,
 )
+from app.api.viewsets import ShoppingItemViewSet
 
 urlpatterns = [
     path("api-auth/", include("rest_framework.urls", namespace="rest-framework")),
     path("api-token-auth/", obtain_auth_token, name="api_token_auth"),
+    path("me/summary/", UserSummary.as_view(), name="user-summary"),
     path("shopping-lists/", ListAddShoppingList.as_view(), name="all-shopping-lists"),
     path("shopping-lists/<uuid:pk>/", ShoppingListDetail.as_view(), name="shopping-list-detail"),
     path('shopping-lists/<uuid:pk>/add-members/', ShoppingListAddMembers.as_view(), name="shopping-list-add-members"),
     path("shopping-lists/<uuid:pk>/remove-members/", ShoppingListRemoveMembers.as_view(), name="shopping-list-remove-members"),
     path("shopping-lists/<uuid:pk>/shopping-items/", ListAddShoppingItem.as_view(), name="list-add-shopping-item"),
     path("shopping-lists/<uuid:pk>/shopping-items/<uuid:item_pk>/", ShoppingItemDetail.as_view(), name="shopping-item-detail"),
+    path("shopping-lists/<uuid:pk>/changes/", ShoppingListChanges.as_view(), name="shopping-list-changes"),
+    path("shopping-lists/<uuid:pk>/events/", ShoppingListEvents.as_view(), name="shopping-list-events"),
+    path(
+        "shopping-items/delete-all-purchased/",
+        ShoppingItemViewSet.as_view({"delete": "delete_purchased"}),
+        name="delete-all-purchased",
+    ),
+    path(
+        "shopping-items/mark-bulk-purchased/",
+        ShoppingItemViewSet.as_view({"patch": "mark_bulk_purchased"}),
+        name="mark-bulk-purchased",
+    ),
+    path("shopping-items/search/", ShoppingItemViewSet.as_view({"get": "search"}), name="search-shopping-items"),
+    path("async/shopping-lists/", AsyncListShoppingLists.as_view(), name="async-all-shopping-lists"),
+    path("async/shopping-lists/<uuid:pk>/", AsyncShoppingListDetail.as_view(), name="async-shopping-list-detail"),
+    path("async/shopping-lists/<uuid:pk>/shopping-items/", AsyncListShoppingItems.as_view(), name="async-list-shopping-items"),
 ]
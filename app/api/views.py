@@ -1,26 +1,60 @@
-from rest_framework import generics, status
+from django.db import transaction
+from django.db.models import Count
+from rest_framework import generics, serializers, status
 from rest_framework.response import Response
 
+from app.api.events import publish_shopping_list_event
+from app.api.mixins import ShoppingListConditionalGetMixin
 from app.api.permission import (
     AllShoppingItemsShoppingListMembersOnly,
     ShoppingItemShoppingListMembersOnly,
-    ShoppingListMembersOnly
+    ShoppingListMembersOnly,
+    annotate_membership
 )
 
-from app.api.models import ShoppingItem, ShoppingList
-from app.api.serializers import AddMemberSerializer, RemoveMemberSerializer, ShoppingItemSerializer, ShoppingListSerializer
-from utils.pagination import LargerResultsSetPagination
+from app.api.models import ShoppingItem, ShoppingItemTombstone, ShoppingList
+from app.api.serializers import (
+    AddMemberSerializer,
+    RemoveMemberSerializer,
+    ShoppingItemSerializer,
+    ShoppingItemValuesSerializer,
+    ShoppingListDashboardValuesSerializer,
+    ShoppingListSerializer,
+    ShoppingListSummarySerializer,
+    ShoppingListSummaryValuesSerializer,
+    ShoppingListValuesSerializer,
+    UserSerializer,
+)
+from utils.pagination import ShoppingItemPagination
+from utils.timing import TimedAPIViewMixin
 
 
-class ListAddShoppingList(generics.ListCreateAPIView):
+class ListAddShoppingList(TimedAPIViewMixin, generics.ListCreateAPIView):
     serializer_class = ShoppingListSerializer
 
+    def get_serializer_class(self):
+        # The collection lists the counts of the items, see list(), a created list its items
+        if self.request.method == "GET":
+            return ShoppingListSummarySerializer
+
+        return super().get_serializer_class()
+
     def perform_create(self, serializer):
         shopping_list = serializer.save()
         shopping_list.members.add(self.request.user)
 
         return shopping_list
 
+    def list(self, request, *args, **kwargs):
+        # Read only path over values() rows, producing the output of ShoppingListSummarySerializer
+        queryset = self.filter_queryset(self.get_queryset()).values(*ShoppingListSummaryValuesSerializer.get_value_fields())
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(ShoppingListSummaryValuesSerializer(page, many=True).data)
+
+        return Response(ShoppingListSummaryValuesSerializer(queryset, many=True).data)
+
     def get_queryset(self):
         members = self.request.user
         queryset = ShoppingList.objects.filter(members=members)
@@ -28,7 +62,7 @@ class ListAddShoppingList(generics.ListCreateAPIView):
         return queryset
 
 
-class ShoppingListAddMembers(generics.UpdateAPIView):
+class ShoppingListAddMembers(TimedAPIViewMixin, generics.UpdateAPIView):
     queryset = ShoppingList.objects.all()
     serializer_class = AddMemberSerializer
     permission_classes = [ShoppingListMembersOnly]
@@ -44,13 +78,38 @@ class ShoppingListAddMembers(generics.UpdateAPIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class ShoppingListDetail(generics.RetrieveUpdateDestroyAPIView):
-    queryset = ShoppingList.objects.all()
+class ShoppingListDetail(TimedAPIViewMixin, ShoppingListConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = ShoppingListSerializer
     permission_classes = [ShoppingListMembersOnly]
 
+    def get_queryset(self):
+        return annotate_membership(ShoppingList.objects.all(), self.request.user)
+
+    def retrieve(self, request, *args, **kwargs):
+        shopping_list = self.get_object()
+
+        not_modified = self.get_not_modified_response(request, shopping_list)
+        if not_modified is not None:
+            return not_modified
 
-class ShoppingListRemoveMembers(generics.UpdateAPIView):
+        serializer = ShoppingListValuesSerializer(ShoppingListValuesSerializer.get_row(shopping_list))
+        response = Response(serializer.data)
+
+        return self.set_conditional_headers(request, response, shopping_list)
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            shopping_list = serializer.save()
+            ShoppingList.objects.filter(pk=shopping_list.pk).touch()
+            publish_shopping_list_event(shopping_list.pk, "list.updated", name=shopping_list.name)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            publish_shopping_list_event(instance.pk, "list.deleted")
+            instance.delete()
+
+
+class ShoppingListRemoveMembers(TimedAPIViewMixin, generics.UpdateAPIView):
     queryset = ShoppingList.objects.all()
     serializer_class = RemoveMemberSerializer
     permission_classes = [ShoppingListMembersOnly]
@@ -66,20 +125,134 @@ class ShoppingListRemoveMembers(generics.UpdateAPIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class ListAddShoppingItem(generics.ListCreateAPIView):
+class ListAddShoppingItem(TimedAPIViewMixin, ShoppingListConditionalGetMixin, generics.ListCreateAPIView):
     serializer_class = ShoppingItemSerializer
     permission_classes = [AllShoppingItemsShoppingListMembersOnly]
-    pagination_class = LargerResultsSetPagination
+    pagination_class = ShoppingItemPagination
+    max_bulk_create = 500
+
+    def create(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            return super().create(request, *args, **kwargs)
+
+        serializer = self.get_serializer(data=request.data, many=True, max_length=self.max_bulk_create)
+        serializer.is_valid(raise_exception=True)
+        shopping_items = serializer.save(shopping_list=self.shopping_list)
+
+        if shopping_items:
+            return Response(serializer.outcomes, status=status.HTTP_201_CREATED)
+
+        return Response(serializer.outcomes, status=status.HTTP_200_OK)
+
+    def list(self, request, *args, **kwargs):
+        # The shopping list was resolved by AllShoppingItemsShoppingListMembersOnly
+        not_modified = self.get_not_modified_response(request, self.shopping_list)
+        if not_modified is not None:
+            return not_modified
+
+        # Read only path over values() rows, producing the output of ShoppingItemSerializer
+        queryset = self.filter_queryset(self.get_queryset()).values(*ShoppingItemValuesSerializer.get_value_fields())
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            response = self.get_paginated_response(ShoppingItemValuesSerializer(page, many=True).data)
+        else:
+            response = Response(ShoppingItemValuesSerializer(queryset, many=True).data)
+
+        return self.set_conditional_headers(request, response, self.shopping_list)
+
+    def perform_create(self, serializer):
+        serializer.save(shopping_list=self.shopping_list)
 
     def get_queryset(self):
         shopping_list = self.kwargs["pk"]
-        queryset = ShoppingItem.objects.filter(shopping_list=shopping_list).order_by("purchased")
+        queryset = ShoppingItem.objects.filter(shopping_list=shopping_list).order_by("purchased", "id")
 
         return queryset
 
 
-class ShoppingItemDetail(generics.RetrieveUpdateDestroyAPIView):
+class ShoppingItemDetail(TimedAPIViewMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = ShoppingItem.objects.all()
     serializer_class = ShoppingItemSerializer
     permission_classes = [ShoppingItemShoppingListMembersOnly]
     lookup_url_kwarg = "item_pk"
+
+
+class ShoppingListChanges(TimedAPIViewMixin, generics.GenericAPIView):
+    """
+    The changes to a shopping list after the version passed as since: the created or changed
+    items, the ids of deleted items and the members if they changed. Without since, when the
+    client is ahead of the list, or behind its pruned tombstones, the whole list with reset set.
+    Clients pass the returned version as since on their next call.
+    """
+    permission_classes = [AllShoppingItemsShoppingListMembersOnly]
+
+    def get(self, request, *args, **kwargs):
+        # The list, read before the changes so that none can be missed, was resolved by the permission
+        shopping_list = self.shopping_list
+        since = self.get_since(request)
+        # Clients behind the pruned tombstones would miss deletes
+        reset = since is None or since > shopping_list.version or since < shopping_list.pruned_version
+        changes = {"version": shopping_list.version, "reset": reset, "name": shopping_list.name}
+        if since == shopping_list.version and not reset:
+            return Response({**changes, "items": [], "deleted": [], "members": None})
+
+        deleted = []
+        if not reset:
+            tombstones = ShoppingItemTombstone.objects.filter(shopping_list=shopping_list, version__gt=since)
+            deleted = [str(pk) for pk in tombstones.values_list("shopping_item_id", flat=True)]
+            # Or pruned after the list was read, checked after reading the tombstones so that none go missing
+            reset = changes["reset"] = ShoppingList.objects.filter(pk=shopping_list.pk, pruned_version__gt=since).exists()
+        if reset:
+            since, deleted = -1, []
+
+        shopping_items = ShoppingItem.objects.filter(shopping_list=shopping_list, version__gt=since).order_by("version", "id")
+        changes["items"] = ShoppingItemSerializer(shopping_items, many=True).data
+        changes["deleted"] = deleted
+
+        if shopping_list.members_version > since:
+            changes["members"] = UserSerializer(shopping_list.members.only("id", "username"), many=True).data
+        else:
+            changes["members"] = None
+
+        return Response(changes)
+
+    def get_since(self, request):
+        since = request.query_params.get("since")
+        if since is None:
+            return None
+
+        try:
+            since = int(since)
+        except ValueError:
+            since = -1
+
+        if since < 0:
+            raise serializers.ValidationError({"since": "A valid version is required."})
+
+        return since
+
+
+class UserSummary(TimedAPIViewMixin, generics.GenericAPIView):
+    """
+    Every list of the user with its member, item and unpurchased item counts and the time of its
+    last change, most recently changed first, and the totals over the lists. One grouped query,
+    the item counts are the counters of the lists.
+    """
+
+    def get(self, request, *args, **kwargs):
+        # Not filtered through members, the filter would restrict the counted members to the user
+        memberships = ShoppingList.members.through.objects.filter(user=request.user).values("shoppinglist_id")
+        queryset = (
+            ShoppingList.objects.filter(pk__in=memberships)
+            .annotate(member_count=Count("members"))
+            .order_by("-updated_at", "id")
+            .values(*ShoppingListDashboardValuesSerializer.get_value_fields())
+        )
+        shopping_lists = ShoppingListDashboardValuesSerializer(queryset, many=True).data
+
+        return Response({
+            "shopping_lists": shopping_lists,
+            "item_count": sum(shopping_list["item_count"] for shopping_list in shopping_lists),
+            "unpurchased_count": sum(shopping_list["unpurchased_count"] for shopping_list in shopping_lists),
+        })
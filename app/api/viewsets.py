@@ -1,30 +1,75 @@
+import uuid
+
 from rest_framework import status
 from rest_framework.decorators import action
-from rest_framework.renderers import JSONRenderer
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
-from app.api.models import ShoppingItem
-from app.api.serializers import ShoppingItemSerializer
+from app.api.models import ShoppingItem, ShoppingList
+from app.api.serializers import (
+    BulkPurchaseSerializer,
+    ShoppingItemSearchSerializer,
+    ShoppingItemSerializer,
+    ShoppingItemValuesSerializer,
+)
+from utils.pagination import ShoppingItemSearchPagination
+from utils.timing import TimedAPIViewMixin
 
 
-class ShoppingItemViewSet(ModelViewSet):
+class ShoppingItemViewSet(TimedAPIViewMixin, ModelViewSet):
     queryset = ShoppingItem.objects.all()
     serializer_class = ShoppingItemSerializer
-    # renderer_classes = [JSONRenderer]
+    # Only the search is paginated
+    pagination_class = ShoppingItemSearchPagination
+    purge_batch_size = 1000
+
+    def get_queryset(self):
+        # Items of the lists the user is a member of
+        return super().get_queryset().filter(shopping_list__members=self.request.user)
 
     @action(detail=False, methods=["Delete"], url_path="delete-all-purchased", url_name="delete-all-purchased")
     def delete_purchased(self, request):
-        ShoppingItem.objects.filter(purchased=True).delete()
+        queryset = self.get_queryset()
+
+        shopping_list_id = request.query_params.get("shopping_list")
+        if shopping_list_id is not None:
+            try:
+                queryset = queryset.filter(shopping_list_id=uuid.UUID(shopping_list_id))
+            except ValueError:
+                raise ValidationError({"shopping_list": "Must be a valid UUID."})
+
+        # Not atomic, every batch commits on its own
+        deleted = queryset.delete_purchased(batch_size=self.purge_batch_size)
 
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response({"deleted": deleted}, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=["PATCH"], url_path="mark-bulk-purchased", url_name="mark-bulk-purchased")
     def mark_bulk_purchased(self, request):
-        try:
-            queryset = ShoppingItem.objects.filter(id__in=request.data["shopping_items"])
-            queryset.update(purchased=True)
-        except Exception:
-            return Response(status=status.HTTP_400_BAD_REQUEST)
+        serializer = BulkPurchaseSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        counts = self.get_queryset().set_purchased(
+            serializer.validated_data["shopping_items"], serializer.validated_data["purchased"]
+        )
+
+        return Response(
+            {"updated": sum(counts.values()), "shopping_lists": {str(pk): count for pk, count in counts.items()}},
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=False, methods=["GET"], url_path="search", url_name="search")
+    def search(self, request):
+        serializer = ShoppingItemSearchSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        # The ids of the lists of the user let the search index match only within them
+        shopping_lists = list(
+            ShoppingList.members.through.objects.filter(user=request.user).values_list("shoppinglist_id", flat=True)
+        )
+        queryset = ShoppingItem.objects.search(
+            serializer.validated_data["q"], fuzzy=serializer.validated_data["fuzzy"], shopping_lists=shopping_lists
+        )
+        page = self.paginate_queryset(queryset.values(*ShoppingItemValuesSerializer.get_value_fields()))
 
-        return Response(status=status.HTTP_200_OK)
+        return self.get_paginated_response(ShoppingItemValuesSerializer(page, many=True).data)
@@ -0,0 +1,94 @@
+"""
+Concurrent load on the read endpoints through the ASGI handler: the sync views, which
+Django runs in a thread per request, against their async counterparts under /async/.
+Throttling is disabled so that every request reaches the view. SQLite serializes the
+async ORM onto one thread, run it against PostgreSQL for representative numbers.
+
+    python -m benchmarks.async_views --concurrency 1 10 50 --requests 20
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.utils import benchmark_database, setup_django, summarize
+
+
+async def run_client(client, urls, requests, timings):
+    for index in range(requests):
+        start = time.perf_counter()
+        response = await client.get(urls[index % len(urls)])
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+
+
+async def run_load(user, urls, concurrency, requests):
+    from django.test import AsyncClient
+
+    clients = []
+    for _ in range(concurrency):
+        client = AsyncClient()
+        await client.aforce_login(user)
+        clients.append(client)
+
+    timings = []
+    start = time.perf_counter()
+    await asyncio.gather(*[run_client(client, urls, requests, timings) for client in clients])
+
+    return timings, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--requests", type=int, default=20, help="requests per concurrent client")
+    parser.add_argument("--lists", type=int, default=20)
+    parser.add_argument("--items", type=int, default=50, help="items per list")
+    args = parser.parse_args()
+
+    # As core.asgi, for the async middleware chain
+    os.environ.setdefault("DJANGO_ASGI", "1")
+    setup_django()
+    from django.test.utils import setup_test_environment
+    from django.urls import reverse
+    from rest_framework.settings import api_settings
+
+    from app.api.models import ShoppingItem, ShoppingList, User
+
+    # Lets the test client's "testserver" host through ALLOWED_HOSTS
+    setup_test_environment()
+    for scope in api_settings.DEFAULT_THROTTLE_RATES:
+        api_settings.DEFAULT_THROTTLE_RATES[scope] = None
+
+    with benchmark_database():
+        user = User.objects.create_user(username="benchmark")
+        shopping_lists = ShoppingList.objects.bulk_create(ShoppingList(name=f"List {index}") for index in range(args.lists))
+        ShoppingList.members.through.objects.bulk_create(
+            ShoppingList.members.through(shoppinglist=shopping_list, user=user) for shopping_list in shopping_lists
+        )
+        ShoppingItem.objects.bulk_create(
+            ShoppingItem(name=f"Item {index}", purchased=index % 3 == 0, shopping_list=shopping_list)
+            for shopping_list in shopping_lists
+            for index in range(args.items)
+        )
+
+        endpoints = [
+            ("lists", "all-shopping-lists", "async-all-shopping-lists", [[]]),
+            ("detail", "shopping-list-detail", "async-shopping-list-detail", [[sl.pk] for sl in shopping_lists]),
+            ("items", "list-add-shopping-item", "async-list-shopping-items", [[sl.pk] for sl in shopping_lists]),
+        ]
+
+        for concurrency in args.concurrency:
+            print(f"\n{concurrency} concurrent clients, {args.requests} requests each")
+
+            for name, sync_name, async_name, url_args in endpoints:
+                for kind, url_name in (("sync", sync_name), ("async", async_name)):
+                    urls = [reverse(url_name, args=url_arg) for url_arg in url_args]
+                    timings, elapsed = asyncio.run(run_load(user, urls, concurrency, args.requests))
+                    throughput = len(timings) / elapsed
+
+                    print(f"  {name:<7} {kind:<6} {throughput:8.1f} req/s  {summarize(timings)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Per-request latency with a new database connection per request (CONN_MAX_AGE 0) against
+persistent, health-checked connections, and against the connection pool when run with
+SQL_POOL=1. Connections are closed or kept around each request like the request signals
+of a server do. Threads share the pool, pass --threads to see the checkout wait.
+
+SQLite keeps its in-memory test database open, run it against PostgreSQL for
+representative numbers:
+
+    SQL_ENGINE=django.db.backends.postgresql python -m benchmarks.connections --requests 200
+    SQL_POOL=1 SQL_POOL_MAX_SIZE=4 python -m benchmarks.connections --threads 8
+"""
+import argparse
+import concurrent.futures
+import time
+
+from benchmarks.utils import benchmark_database, percentile, setup_django, summarize
+
+
+def run_client(user, path, requests):
+    from django.db import close_old_connections
+    from django.test import Client
+
+    client = Client()
+    client.force_login(user)
+
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        close_old_connections()
+        response = client.get(path)
+        close_old_connections()
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="requests per thread")
+    parser.add_argument("--threads", type=int, default=1)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection, connections
+    from django.test.utils import setup_test_environment
+    from django.urls import reverse
+    from rest_framework.settings import api_settings
+
+    from app.api.models import ShoppingList, User
+    from utils.db.pool import get_pool_metrics
+
+    setup_test_environment()
+    for scope in api_settings.DEFAULT_THROTTLE_RATES:
+        api_settings.DEFAULT_THROTTLE_RATES[scope] = None
+
+    pooled = connection.settings_dict["ENGINE"] == "utils.db.postgresql"
+    modes = [
+        ("pooled" if pooled else "connect per request", {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False}),
+        ("persistent", {"CONN_MAX_AGE": 600, "CONN_HEALTH_CHECKS": True}),
+    ]
+
+    with benchmark_database():
+        user = User.objects.create(username="benchmark")
+        shopping_list = ShoppingList.objects.create(name="Groceries")
+        shopping_list.members.add(user)
+        path = reverse("shopping-list-detail", args=[shopping_list.pk])
+
+        print(f"{connection.vendor}, {args.threads} threads of {args.requests} requests")
+        for name, options in modes:
+            connection.settings_dict.update(options)
+            connections.close_all()
+
+            with concurrent.futures.ThreadPoolExecutor(args.threads) as executor:
+                futures = [executor.submit(run_client, user, path, args.requests) for _ in range(args.threads)]
+                timings = [timing for future in futures for timing in future.result()]
+
+            print(f"  {name:<20} {summarize(timings)}  p99 {percentile(timings, 99) * 1000:8.3f} ms")
+            for key, metrics in get_pool_metrics().items():
+                print(f"    {key}: {', '.join(f'{metric} {value:g}' for metric, value in metrics.items())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""
+Latency, query count, SQL time and peak memory of every route in app/api/urls.py against
+seeded data, compared with the budgets in benchmarks/baseline.json. Exits with status 1
+when a route exceeds its budget: more queries than its baseline, or latency, SQL time or
+memory beyond the tolerances. Baselines are kept per database vendor and seed size, latencies
+are machine dependent so record them where the budgets are enforced.
+
+    python -m benchmarks.endpoints
+    python -m benchmarks.endpoints --update-baseline
+    SQL_ENGINE=django.db.backends.postgresql SQL_DATABASE=... python -m benchmarks.endpoints
+"""
+import argparse
+import gc
+import json
+import pathlib
+import sys
+import time
+import tracemalloc
+
+from collections import namedtuple
+
+from benchmarks.utils import analyze, benchmark_database, percentile, setup_django
+
+BASELINE_PATH = pathlib.Path(__file__).with_name("baseline.json")
+
+# prepare(index) returns the client, path and data of the index-th request, untimed
+Scenario = namedtuple("Scenario", ["name", "route", "method", "prepare"])
+
+# Routes that can't be measured as a request and response
+SKIPPED_ROUTES = {
+    "shopping-list-events": "a stream that stays open until the client disconnects",
+}
+
+
+def seed(users, members, items, lists, batch_size=1000):
+    from django.contrib.auth.hashers import make_password
+    from django.db import DEFAULT_DB_ALIAS
+
+    from app.api.models import ShoppingItem, ShoppingList, User
+    from app.api.search import optimize_search_index
+
+    password = make_password("benchmark")
+    user = User.objects.create(username="benchmark", password=password)
+    others = User.objects.bulk_create(
+        (User(username=f"user-{index:06d}", password=password) for index in range(users)), batch_size=batch_size
+    )
+
+    crowded = ShoppingList.objects.create(name="Crowded")
+    large = ShoppingList.objects.create(name="Large")
+    small = ShoppingList.objects.bulk_create(ShoppingList(name=f"List {index}") for index in range(lists))
+
+    memberships = [(shopping_list, user) for shopping_list in [crowded, large, *small]]
+    memberships += [(crowded, member) for member in others[:members]]
+    ShoppingList.members.through.objects.bulk_create(
+        (ShoppingList.members.through(shoppinglist=shopping_list, user=member) for shopping_list, member in memberships),
+        batch_size=batch_size,
+    )
+
+    for shopping_list, count in [(large, items), *[(shopping_list, 20) for shopping_list in small]]:
+        ShoppingItem.objects.bulk_create(
+            (
+                ShoppingItem(name=f"item-{index:06d}", purchased=index % 2 == 1, shopping_list=shopping_list)
+                for index in range(count)
+            ),
+            batch_size=batch_size,
+        )
+
+    ShoppingList.objects.recount()
+    optimize_search_index(DEFAULT_DB_ALIAS)
+    ShoppingList.objects.update(version=1, members_version=1)
+    ShoppingItem.objects.update(version=1)
+
+    return {"user": user, "others": others[members:], "crowded": crowded, "large": large, "small": small}
+
+
+def get_scenarios(data):
+    from django.test import Client
+    from django.urls import reverse
+    from rest_framework.authtoken.models import Token
+
+    from app.api.models import ShoppingItem, ShoppingList
+
+    user, others, crowded, large = data["user"], data["others"], data["crowded"], data["large"]
+    small = data["small"][0]
+    client = Client()
+    client.force_login(user)
+    token_client = Client(headers={"Authorization": f"Token {Token.objects.create(user=user).key}"})
+    item = ShoppingItem.objects.filter(shopping_list=small, purchased=False).first()
+
+    def get(path, params=None, current_client=client):
+        return lambda index: (current_client, path, params)
+
+    def new_item(index):
+        shopping_item = ShoppingItem.objects.create(name=f"new-{index}", purchased=False, shopping_list=small)
+        return client, reverse("shopping-item-detail", args=[small.pk, shopping_item.pk]), None
+
+    def new_list(index):
+        shopping_list = ShoppingList.objects.create(name=f"New {index}")
+        shopping_list.members.add(user)
+        return client, reverse("shopping-list-detail", args=[shopping_list.pk]), None
+
+    def new_session(index):
+        session_client = Client()
+        session_client.force_login(user)
+        return session_client, reverse("rest-framework:logout"), None
+
+    def remove_member(index):
+        crowded.members.add(others[index])
+        return client, reverse("shopping-list-remove-members", args=[crowded.pk]), {"members": [others[index].pk]}
+
+    def purchased_items(index):
+        ShoppingItem.objects.bulk_create(
+            ShoppingItem(name=f"purged-{index}-{position}", purchased=True, shopping_list=small) for position in range(100)
+        )
+        ShoppingList.objects.filter(pk=small.pk).recount()
+        return client, f"{reverse('delete-all-purchased')}?shopping_list={small.pk}", None
+
+    def flip_purchased(index):
+        # Not of the large list, whose changes the changes since scenario reads
+        ids = [str(pk) for pk in ShoppingItem.objects.filter(shopping_list=data["small"][1]).values_list("id", flat=True)]
+        return client, reverse("mark-bulk-purchased"), {"shopping_items": ids, "purchased": index % 2 == 0}
+
+    def changes_since(index):
+        version = ShoppingList.objects.values_list("version", flat=True).get(pk=large.pk)
+        return client, reverse("shopping-list-changes", args=[large.pk]), {"since": version - 1}
+
+    return [
+        Scenario("login page", "rest-framework:login", "GET", get(reverse("rest-framework:login"), current_client=Client())),
+        Scenario("logout", "rest-framework:logout", "POST", new_session),
+        Scenario(
+            "obtain token", "api_token_auth", "POST",
+            lambda index: (Client(), reverse("api_token_auth"), {"username": "benchmark", "password": "benchmark"}),
+        ),
+        Scenario("lists", "all-shopping-lists", "GET", get(reverse("all-shopping-lists"))),
+        Scenario("lists with token", "all-shopping-lists", "GET", get(reverse("all-shopping-lists"), current_client=token_client)),
+        Scenario("summary", "user-summary", "GET", get(reverse("user-summary"))),
+        Scenario(
+            "create list", "all-shopping-lists", "POST",
+            lambda index: (client, reverse("all-shopping-lists"), {"name": f"Created {index}"}),
+        ),
+        Scenario("crowded list", "shopping-list-detail", "GET", get(reverse("shopping-list-detail", args=[crowded.pk]))),
+        Scenario("large list", "shopping-list-detail", "GET", get(reverse("shopping-list-detail", args=[large.pk]))),
+        Scenario(
+            "rename list", "shopping-list-detail", "PATCH",
+            lambda index: (client, reverse("shopping-list-detail", args=[small.pk]), {"name": f"Renamed {index}"}),
+        ),
+        Scenario("delete list", "shopping-list-detail", "DELETE", new_list),
+        Scenario(
+            "add member", "shopping-list-add-members", "PUT",
+            lambda index: (client, reverse("shopping-list-add-members", args=[crowded.pk]), {"members": [others[-index - 1].pk]}),
+        ),
+        Scenario("remove member", "shopping-list-remove-members", "PUT", remove_member),
+        Scenario("large list items", "list-add-shopping-item", "GET", get(reverse("list-add-shopping-item", args=[large.pk]))),
+        Scenario(
+            "create item", "list-add-shopping-item", "POST",
+            lambda index: (client, reverse("list-add-shopping-item", args=[large.pk]), {"name": f"created-{index}", "purchased": False}),
+        ),
+        Scenario(
+            "create items in bulk", "list-add-shopping-item", "POST",
+            lambda index: (
+                client,
+                reverse("list-add-shopping-item", args=[large.pk]),
+                [{"name": f"bulk-{index}-{position}", "purchased": False} for position in range(50)],
+            ),
+        ),
+        Scenario("item", "shopping-item-detail", "GET", get(reverse("shopping-item-detail", args=[small.pk, item.pk]))),
+        Scenario(
+            "rename item", "shopping-item-detail", "PATCH",
+            lambda index: (client, reverse("shopping-item-detail", args=[small.pk, item.pk]), {"name": f"renamed-{index}"}),
+        ),
+        Scenario("delete item", "shopping-item-detail", "DELETE", new_item),
+        Scenario(
+            "search items", "search-shopping-items", "GET",
+            get(reverse("search-shopping-items"), {"q": "item 0001", "page_size": 10}),
+        ),
+        Scenario("delete purchased items", "delete-all-purchased", "DELETE", purchased_items),
+        Scenario("mark items purchased", "mark-bulk-purchased", "PATCH", flip_purchased),
+        Scenario("changes since", "shopping-list-changes", "GET", changes_since),
+        Scenario("all changes", "shopping-list-changes", "GET", get(reverse("shopping-list-changes", args=[small.pk]))),
+        Scenario("async lists", "async-all-shopping-lists", "GET", get(reverse("async-all-shopping-lists"))),
+        Scenario(
+            "async large list", "async-shopping-list-detail", "GET", get(reverse("async-shopping-list-detail", args=[large.pk]))
+        ),
+        Scenario(
+            "async large list items", "async-list-shopping-items", "GET",
+            get(reverse("async-list-shopping-items", args=[large.pk])),
+        ),
+    ]
+
+
+def get_route_names():
+    from django.urls import URLResolver
+
+    from app.api.urls import urlpatterns
+
+    names = set()
+    for pattern in urlpatterns:
+        if isinstance(pattern, URLResolver):
+            names.update(f"{pattern.namespace}:{child.name}" for child in pattern.url_patterns if child.name)
+        elif pattern.name:
+            names.add(pattern.name)
+
+    return names
+
+
+def send(scenario, current_client, path, data):
+    if scenario.method == "GET":
+        response = current_client.get(path, data)
+    else:
+        response = current_client.generic(scenario.method, path, json.dumps(data or {}), content_type="application/json")
+
+    if response.status_code >= 400:
+        raise RuntimeError(f"{scenario.name}: {scenario.method} {path} answered {response.status_code}")
+
+
+class QueryTimer:
+    """
+    Counts and times the queries run through the connection. Unlike the captured queries of
+    CaptureQueriesContext, the times are not rounded to milliseconds.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - start
+            self.count += 1
+
+
+def run(scenario, repeat):
+    from django.db import connection
+
+    # Not counted, the first request of a scenario pays for cold caches, such as of imports,
+    # templates and the database pages it reads
+    send(scenario, *scenario.prepare(repeat + 1))
+    # Nor the garbage of the scenarios before, a full collection of it lands in a random request
+    gc.collect()
+
+    timings, sql_timings, query_counts = [], [], []
+    for index in range(repeat):
+        request = scenario.prepare(index)
+        query_timer = QueryTimer()
+
+        with connection.execute_wrapper(query_timer):
+            start = time.perf_counter()
+            send(scenario, *request)
+            timings.append(time.perf_counter() - start)
+
+        query_counts.append(query_timer.count)
+        sql_timings.append(query_timer.time)
+
+    request = scenario.prepare(repeat)
+    tracemalloc.start()
+    send(scenario, *request)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "p50_ms": round(percentile(timings, 50) * 1000, 3),
+        "p95_ms": round(percentile(timings, 95) * 1000, 3),
+        "queries": max(query_counts),
+        "sql_ms": round(percentile(sql_timings, 50) * 1000, 3),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def check(result, baseline, args):
+    """
+    The budgets the result exceeds, compared with its baseline.
+    """
+    budgets = {
+        "queries": baseline["queries"],
+        "p95_ms": baseline["p95_ms"] * args.latency_tolerance + args.latency_slack,
+        "sql_ms": baseline["sql_ms"] * args.latency_tolerance + args.latency_slack,
+        "peak_kb": baseline["peak_kb"] * args.memory_tolerance + args.memory_slack,
+    }
+
+    return [f"{metric} {result[metric]} > {budget:.1f}" for metric, budget in budgets.items() if result[metric] > budget]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--members", type=int, default=300, help="members of the crowded list")
+    parser.add_argument("--items", type=int, default=20000, help="items of the large list")
+    parser.add_argument("--lists", type=int, default=50, help="small lists of the benchmark user")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--latency-tolerance", type=float, default=1.5, help="allowed factor over the baseline")
+    parser.add_argument("--latency-slack", type=float, default=2.0, help="allowed milliseconds over the baseline")
+    parser.add_argument("--memory-tolerance", type=float, default=1.25)
+    parser.add_argument("--memory-slack", type=float, default=64.0, help="allowed KiB over the baseline")
+    parser.add_argument("--update-baseline", action="store_true", help="record the results as the new baseline")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import override_settings, setup_test_environment
+    from rest_framework.settings import api_settings
+
+    # Lets the test client's "testserver" host through ALLOWED_HOSTS
+    setup_test_environment()
+    override_settings(
+        # Password hashing would dominate the token route
+        PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+        # The login page links static files, which are not collected into a manifest here
+        STORAGES={**settings.STORAGES, "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"}},
+    ).enable()
+    for scope in api_settings.DEFAULT_THROTTLE_RATES:
+        api_settings.DEFAULT_THROTTLE_RATES[scope] = None
+
+    seed_size = {"users": args.users, "members": args.members, "items": args.items, "lists": args.lists}
+    baselines = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+
+    with benchmark_database():
+        vendor = connection.vendor
+        baseline = baselines.get(vendor, {})
+        if not args.update_baseline and baseline and baseline["seed"] != seed_size:
+            sys.exit(f"The {vendor} baseline was recorded with {baseline['seed']}, pass the same sizes or --update-baseline")
+
+        scenarios = get_scenarios(seed(**seed_size))
+        analyze()
+
+        uncovered = get_route_names() - {scenario.route for scenario in scenarios} - set(SKIPPED_ROUTES)
+        if uncovered:
+            sys.exit(f"No benchmark scenario for the routes {', '.join(sorted(uncovered))}")
+
+        results = {}
+        failures = 0
+        print(f"{'':<24} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8} {'sql ms':>9} {'peak KiB':>10}")
+
+        for scenario in scenarios:
+            result = results[scenario.name] = run(scenario, args.repeat)
+            exceeded = []
+            if not args.update_baseline and scenario.name in baseline.get("results", {}):
+                exceeded = check(result, baseline["results"][scenario.name], args)
+            failures += bool(exceeded)
+
+            print(
+                f"{scenario.name:<24} {result['p50_ms']:9.3f} {result['p95_ms']:9.3f} {result['queries']:8} "
+                f"{result['sql_ms']:9.3f} {result['peak_kb']:10.1f}  {'OVER BUDGET: ' + ', '.join(exceeded) if exceeded else ''}"
+            )
+
+    if args.update_baseline:
+        baselines[vendor] = {"seed": seed_size, "results": results}
+        BASELINE_PATH.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"\nRecorded the {vendor} baseline in {BASELINE_PATH}")
+    elif failures:
+        sys.exit(f"\n{failures} scenarios over budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Query plans and latency of the hot ShoppingItem access paths, with the composite
+indexes from migration 0002 and with only the original foreign key index.
+
+    python -m benchmarks.item_indexes --items 100000
+    SQL_ENGINE=django.db.backends.postgresql SQL_DATABASE=... python -m benchmarks.item_indexes
+"""
+import argparse
+
+from benchmarks.utils import analyze, benchmark_database, measure, setup_django, summarize
+
+
+def seed(item_count, noise_lists, batch_size):
+    from app.api.models import ShoppingItem, ShoppingList
+
+    shopping_list = ShoppingList.objects.create(name="Benchmark")
+    lists = [(shopping_list, item_count)]
+    lists += [(ShoppingList.objects.create(name=f"Noise {index}"), item_count // 10) for index in range(noise_lists)]
+
+    for current_list, count in lists:
+        for start in range(0, count, batch_size):
+            ShoppingItem.objects.bulk_create(
+                ShoppingItem(name=f"item-{index:07d}", purchased=index % 2 == 1, shopping_list=current_list)
+                for index in range(start, min(start + batch_size, count))
+            )
+
+    return shopping_list
+
+
+def get_queries(shopping_list):
+    from app.api.models import ShoppingItem
+    from utils.pagination import ShoppingItemPagination
+
+    items = ShoppingItem.objects.filter(shopping_list=shopping_list)
+    middle = items.order_by("purchased", "id")[items.count() // 2]
+    pagination = ShoppingItemPagination()
+    page_size = pagination.page_size + 1
+    seek = pagination.get_seek_filter(items, [middle.purchased, str(middle.id)], reverse=False)
+
+    return {
+        "first page": items.order_by("purchased", "id")[:page_size],
+        "middle page": items.filter(seek).order_by("purchased", "id")[:page_size],
+        "unpurchased items": items.filter(purchased=False).values_list("name", flat=True),
+        "duplicate check": items.filter(name=middle.name, purchased=False),
+    }
+
+
+def drop_composite_indexes():
+    from django.db import connection, models
+
+    from app.api.models import ShoppingItem
+
+    with connection.schema_editor() as schema_editor:
+        for index in ShoppingItem._meta.indexes:
+            schema_editor.remove_index(ShoppingItem, index)
+        schema_editor.add_index(ShoppingItem, models.Index(fields=["shopping_list"], name="bench_shoppingitem_list_idx"))
+
+
+def run(queries, repeat):
+    for name, queryset in queries.items():
+        # Exists is how the duplicate check runs in ShoppingItemSerializer.create
+        execute = queryset.exists if name == "duplicate check" else lambda queryset=queryset: list(queryset.all())
+        timings = measure(execute, repeat)
+
+        print(f"  {name:<18} {summarize(timings)}")
+        for line in queryset.explain().splitlines():
+            print(f"      {line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100_000, help="items on the benchmarked list")
+    parser.add_argument("--noise-lists", type=int, default=10, help="other lists holding a tenth as many items each")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=5_000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+
+    with benchmark_database():
+        shopping_list = seed(args.items, args.noise_lists, args.batch_size)
+        queries = get_queries(shopping_list)
+        print(f"{connection.vendor}, {args.items} items on the benchmarked list")
+
+        analyze()
+        print("\nwith composite indexes")
+        run(queries, args.repeat)
+
+        drop_composite_indexes()
+        analyze()
+        print("\nwith the foreign key index only")
+        run(queries, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
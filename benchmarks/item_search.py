@@ -0,0 +1,100 @@
+"""
+Latency and query plans of the first page of item searches of one user, as the search endpoint
+runs them, through the search index of migration 0007 and through an unindexed icontains scan
+of the items of the lists of the user. Items are generated by the seed_data command, named
+after 20 products and a number, so every word matches a twentieth of the items or more. Users
+are members of about lists * members-per-list / users lists.
+
+    python -m benchmarks.item_search --lists 10000 --items-per-list 100
+    SQL_ENGINE=django.db.backends.postgresql SQL_DATABASE=... python -m benchmarks.item_search
+"""
+import argparse
+import io
+import time
+
+from benchmarks.utils import analyze, benchmark_database, measure, setup_django, summarize
+
+SEARCHES = [
+    ("word", "milk", False),
+    ("prefix", "mi", False),
+    ("two words", "bread 3", False),
+    ("no match", "zucchini", False),
+    ("fuzzy", "mlik", True),
+]
+
+
+def get_queries(user, page_size):
+    from django.db.models import Q
+
+    from app.api.models import ShoppingItem, ShoppingList
+    from app.api.search import get_terms
+    from app.api.serializers import ShoppingItemValuesSerializer
+    from utils.pagination import ShoppingItemSearchPagination
+
+    fields = ShoppingItemValuesSerializer.get_value_fields()
+    ordering = ShoppingItemSearchPagination.ordering
+
+    def get_shopping_lists():
+        return list(ShoppingList.members.through.objects.filter(user=user).values_list("shoppinglist_id", flat=True))
+
+    # As app.api.viewsets.ShoppingItemViewSet.search runs them, the lists of the user included
+    def indexed(query, fuzzy):
+        items = ShoppingItem.objects.search(query, fuzzy=fuzzy, shopping_lists=get_shopping_lists())
+        return items.order_by(*ordering).values(*fields)[:page_size + 1]
+
+    def unindexed(query):
+        search_filter = Q()
+        for term in get_terms(query):
+            search_filter &= Q(name__icontains=term)
+        items = ShoppingItem.objects.filter(search_filter, shopping_list__in=get_shopping_lists())
+        return items.order_by(*ordering).values(*fields)[:page_size + 1]
+
+    queries = {}
+    for name, query, fuzzy in SEARCHES:
+        queries[f"{name} indexed"] = lambda query=query, fuzzy=fuzzy: indexed(query, fuzzy)
+        if not fuzzy:
+            queries[f"{name} unindexed"] = lambda query=query: unindexed(query)
+
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--lists", type=int, default=10000)
+    parser.add_argument("--members-per-list", type=int, default=10)
+    parser.add_argument("--items-per-list", type=int, default=100)
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+    from django.db import connection
+
+    from app.api.models import ShoppingItem, User
+
+    with benchmark_database():
+        start = time.perf_counter()
+        call_command(
+            "seed_data", users=args.users, lists=args.lists, members_per_list=args.members_per_list,
+            items_per_list=args.items_per_list, stdout=io.StringIO(),
+        )
+        analyze()
+        user = User.objects.get(username="seed-0-0")
+        user_items = ShoppingItem.objects.filter(shopping_list__members=user).count()
+        print(
+            f"{connection.vendor}, {ShoppingItem.objects.count()} items, {user_items} in the lists of the user,"
+            f" seeded in {time.perf_counter() - start:.0f}s"
+        )
+
+        for name, get_queryset in get_queries(user, args.page_size).items():
+            # Building the queries reads the lists of the user, and the vocabulary for fuzzy searches
+            timings = measure(lambda: list(get_queryset()), args.repeat)
+            print(f"  {name:<20} {summarize(timings)}")
+            for line in get_queryset().explain().splitlines():
+                print(f"      {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Encode time per page of the shopping list and shopping item payloads, DRF's JSONRenderer
+against utils.renderers.FastJSONRenderer. The payloads are real serializer output, so they
+carry the UUID objects of the related primary keys.
+
+    python -m benchmarks.json_rendering --page-sizes 5 10 100
+"""
+import argparse
+
+from benchmarks.utils import benchmark_database, measure, setup_django, summarize
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-sizes", type=int, nargs="+", default=[5, 10, 100])
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db.models import Prefetch
+    from rest_framework.renderers import JSONRenderer
+
+    from app.api.models import ShoppingItem, ShoppingList, User
+    from app.api.serializers import ShoppingItemSerializer, ShoppingListSerializer
+    from utils.renderers import FastJSONRenderer, orjson
+
+    if orjson is None:
+        print("orjson is not installed, FastJSONRenderer falls back to JSONRenderer")
+
+    with benchmark_database():
+        page_size = max(args.page_sizes)
+        users = User.objects.bulk_create(User(username=f"member-{index}") for index in range(3))
+        shopping_lists = ShoppingList.objects.bulk_create(ShoppingList(name=f"List {index}") for index in range(page_size))
+        ShoppingList.members.through.objects.bulk_create(
+            ShoppingList.members.through(shoppinglist=shopping_list, user=user)
+            for shopping_list in shopping_lists
+            for user in users
+        )
+        ShoppingItem.objects.bulk_create(
+            ShoppingItem(name=f"Item {index}", purchased=index % 2 == 0, shopping_list=shopping_list)
+            for shopping_list in shopping_lists
+            for index in range(page_size)
+        )
+
+        unpurchased_items = ShoppingItem.objects.filter(purchased=False)
+        lists = ShoppingList.objects.prefetch_related(
+            "members", Prefetch("shopping_items", queryset=unpurchased_items, to_attr="unpurchased_shopping_items")
+        ).order_by("id")
+        items = ShoppingItem.objects.filter(shopping_list=shopping_lists[0]).order_by("purchased", "id")
+        renderers = [("JSONRenderer", JSONRenderer()), ("FastJSONRenderer", FastJSONRenderer())]
+
+        for page_size in args.page_sizes:
+            payloads = [
+                ("lists", ShoppingListSerializer(lists[:page_size], many=True).data),
+                ("items", ShoppingItemSerializer(items[:page_size], many=True).data),
+            ]
+            print(f"\npages of {page_size}")
+
+            for payload_name, data in payloads:
+                for renderer_name, renderer in renderers:
+                    size = len(renderer.render(data))
+                    timings = measure(lambda: renderer.render(data), args.repeat)
+                    print(f"  {payload_name:<6} {renderer_name:<17} {size:7} bytes  {summarize(timings)}")
+
+
+if __name__ == "__main__":
+    main()
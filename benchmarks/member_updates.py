@@ -0,0 +1,89 @@
+"""
+Adding and removing shopping list members one at a time, the way AddMemberSerializer
+and RemoveMemberSerializer used to, against the current set-based serializers.
+Timings include the set-based reset of the membership between runs.
+
+    python -m benchmarks.member_updates --batch-sizes 10 100 500
+"""
+import argparse
+
+from benchmarks.utils import benchmark_database, measure, setup_django, summarize
+
+
+def loop_add(shopping_list, pks):
+    from app.api.models import User
+
+    for member in [User.objects.get(pk=pk) for pk in pks]:
+        shopping_list.members.add(member)
+        shopping_list.save()
+
+
+def loop_remove(shopping_list, pks):
+    from app.api.models import User
+
+    for member in [User.objects.get(pk=pk) for pk in pks]:
+        shopping_list.members.remove(member)
+        shopping_list.save()
+
+
+def serializer_update(serializer_class):
+    def update(shopping_list, pks):
+        serializer = serializer_class(shopping_list, data={"members": pks}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+    return update
+
+
+def count_queries(func):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    with CaptureQueriesContext(connection) as context:
+        func()
+
+    return len(context)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    from app.api.models import ShoppingList, User
+    from app.api.serializers import AddMemberSerializer, RemoveMemberSerializer
+
+    with benchmark_database():
+        users = User.objects.bulk_create(User(username=f"member-{index}") for index in range(max(args.batch_sizes)))
+        shopping_list = ShoppingList.objects.create(name="Benchmark")
+        implementations = [
+            ("loop", loop_add, loop_remove),
+            ("set-based", serializer_update(AddMemberSerializer), serializer_update(RemoveMemberSerializer)),
+        ]
+
+        for batch_size in args.batch_sizes:
+            pks = [user.pk for user in users[:batch_size]]
+            print(f"\n{batch_size} members")
+
+            for name, add, remove in implementations:
+                queries = count_queries(lambda: add(shopping_list, pks))
+                remove(shopping_list, pks)
+
+                def add_and_reset():
+                    add(shopping_list, pks)
+                    shopping_list.members.clear()
+
+                def reset_and_remove():
+                    shopping_list.members.add(*users[:batch_size])
+                    remove(shopping_list, pks)
+
+                print(f"  add    {name:<10} {queries:5} queries  {summarize(measure(add_and_reset, args.repeat))}")
+                shopping_list.members.add(*users[:batch_size])
+                queries = count_queries(lambda: remove(shopping_list, pks))
+                print(f"  remove {name:<10} {queries:5} queries  {summarize(measure(reset_and_remove, args.repeat))}")
+
+
+if __name__ == "__main__":
+    main()
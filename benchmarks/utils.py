@@ -0,0 +1,52 @@
+import os
+import statistics
+import time
+
+from contextlib import contextmanager
+
+import django
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+    django.setup()
+
+
+@contextmanager
+def benchmark_database():
+    # Benchmarks run against a throwaway test database of the configured engine
+    from django.test.utils import setup_databases, teardown_databases
+
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+
+def analyze():
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    return timings
+
+
+def percentile(timings, percent):
+    if len(timings) == 1:
+        return timings[0]
+
+    return statistics.quantiles(timings, n=100, method="inclusive")[percent - 1]
+
+
+def summarize(timings):
+    return f"p50 {percentile(timings, 50) * 1000:8.3f} ms  p95 {percentile(timings, 95) * 1000:8.3f} ms"
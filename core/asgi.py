@@ -1,8 +1,21 @@
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+
+from utils.asgi import ASGIHandler
 
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+# Leaves the sync only WhiteNoise middleware out of the settings, see MIDDLEWARE
+os.environ.setdefault("DJANGO_ASGI", "1")
+
+django.setup(set_prefix=False)
+# Serves event streams without a thread per open stream
+application = ASGIHandler()
 
-application = get_asgi_application()
+if settings.DEBUG:
+    # Like runserver, static files in production come from the proxy or CDN, see the README
+    application = ASGIStaticFilesHandler(application)
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 import os
 
+from django.core.exceptions import ImproperlyConfigured
 from django.core.management.utils import get_random_secret_key
 from pathlib import Path
 
@@ -56,6 +57,8 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    "utils.timing.ServerTimingMiddleware",
+    "utils.replicas.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -63,9 +66,14 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    'whitenoise.middleware.WhiteNoiseMiddleware',
 ]
 
+# Set by core.asgi. WhiteNoise only has a sync middleware, which would run every ASGI request
+# and its async view in a thread, so under ASGI the proxy serves STATIC_ROOT instead
+ASGI = bool(int(os.environ.get("DJANGO_ASGI", default=0)))
+if not ASGI:
+    MIDDLEWARE.append("whitenoise.middleware.WhiteNoiseMiddleware")
+
 ROOT_URLCONF = "core.urls"
 
 TEMPLATES = [
@@ -98,9 +106,91 @@ DATABASES = {
         "PASSWORD": os.environ.get("SQL_PASSWORD", "password"),
         "HOST": os.environ.get("SQL_HOST", "localhost"),
         "PORT": os.environ.get("SQL_PORT", "5432"),
+        # Seconds to keep a connection open across requests, 0 closes it after every request.
+        # Under ASGI every request runs its queries in a new thread, whose persistent connection
+        # would never be reused or closed, so connections aren't kept by default there
+        "CONN_MAX_AGE": int(os.environ.get("SQL_CONN_MAX_AGE", default=0 if ASGI else 60)),
+        # Check reused connections before a request uses them
+        "CONN_HEALTH_CHECKS": bool(int(os.environ.get("SQL_CONN_HEALTH_CHECKS", default=1))),
     }
 }
 
+# Gunicorn runs WEB_CONCURRENCY worker processes of GUNICORN_THREADS threads, each thread keeps
+# up to one connection, so the database sees up to WEB_CONCURRENCY * GUNICORN_THREADS of them
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", default=1))
+GUNICORN_THREADS = int(os.environ.get("GUNICORN_THREADS", default=1))
+
+# Share a pool of connections between the threads of a worker process, PostgreSQL only
+if int(os.environ.get("SQL_POOL", default=0)):
+    DATABASES["default"].update({
+        "ENGINE": "utils.db.postgresql",
+        # Returned to the pool after every request instead
+        "CONN_MAX_AGE": 0,
+        "CONN_HEALTH_CHECKS": False,
+        "OPTIONS": {
+            "pool": {
+                "max_size": int(os.environ.get("SQL_POOL_MAX_SIZE", default=GUNICORN_THREADS)),
+                "min_size": int(os.environ.get("SQL_POOL_MIN_SIZE", default=0)),
+                # Seconds to wait for a free connection
+                "timeout": float(os.environ.get("SQL_POOL_TIMEOUT", default=10)),
+                # Seconds a connection may sit idle before it's pinged on reuse
+                "check_after": float(os.environ.get("SQL_POOL_CHECK_AFTER", default=30)),
+                "max_lifetime": float(os.environ.get("SQL_POOL_MAX_LIFETIME", default=3600)),
+            },
+        },
+    })
+
+# Read replicas, comma separated hosts, or database files with SQLite, configured like the
+# primary otherwise. PostgreSQL replicas get the schema through replication, migrate SQLite
+# ones with "migrate --database replica0"
+DATABASE_REPLICAS = []
+for index, replica in enumerate(filter(None, os.environ.get("SQL_REPLICAS", "").split(","))):
+    location = "NAME" if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3" else "HOST"
+    DATABASES[f"replica{index}"] = {**DATABASES["default"], location: replica, "TEST": {"MIRROR": "default"}}
+    DATABASE_REPLICAS.append(f"replica{index}")
+
+DATABASE_ROUTERS = ["utils.replicas.ReplicaRouter"]
+
+# Seconds that the reads of a user go to the primary after they wrote, longer than the replica lag
+REPLICA_PIN_SECONDS = float(os.environ.get("REPLICA_PIN_SECONDS", default=5))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Resolved API tokens, see utils.authentication.CachedTokenAuthentication. A per process cache
+    # only sees invalidations made by its own worker, so TIMEOUT bounds how stale it can get. Point
+    # it at a shared cache server to invalidate across workers.
+    "tokens": {
+        "BACKEND": os.environ.get("TOKEN_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get("TOKEN_CACHE_LOCATION", "tokens"),
+        "TIMEOUT": int(os.environ.get("TOKEN_CACHE_TIMEOUT", default=60)),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.environ.get("TOKEN_CACHE_MAX_ENTRIES", default=10000)),
+        },
+    },
+    # Users pinned to the primary database, shared between the workers, see REPLICA_PIN_CACHE
+    "replica_pins": {
+        "BACKEND": os.environ.get("REPLICA_PIN_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get("REPLICA_PIN_CACHE_LOCATION", "replica-pins"),
+    },
+}
+
+TOKEN_AUTH_CACHE = "tokens"
+
+# Users pinned to the primary database, see utils.replicas. Point REPLICA_PIN_CACHE_BACKEND at
+# a shared cache server when running more than one worker
+REPLICA_PIN_CACHE = "replica_pins"
+
+# A per process cache only pins the user on the worker that took their write, their next
+# request may land on another worker and read a replica that hasn't caught up
+if DATABASE_REPLICAS and WEB_CONCURRENCY > 1 and CACHES[REPLICA_PIN_CACHE]["BACKEND"].endswith(".LocMemCache"):
+    raise ImproperlyConfigured("SQL_REPLICAS with WEB_CONCURRENCY > 1 needs a shared REPLICA_PIN_CACHE_BACKEND")
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -153,12 +243,25 @@ REST_FRAMEWORK = {
     # Allow flexibility for both web users and API clients
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.SessionAuthentication",
-        "rest_framework.authentication.TokenAuthentication",
+        "utils.authentication.CachedTokenAuthentication",
     ],
-    # Setup pagination for API responses
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    # Setup pagination for API responses, "utils.pagination.KeysetPagination" opts into cursors
+    "DEFAULT_PAGINATION_CLASS": os.environ.get(
+        "DEFAULT_PAGINATION_CLASS", "rest_framework.pagination.PageNumberPagination"
+    ),
     "PAGE_SIZE": 5,
 
+    # orjson backed JSON, see utils.renderers
+    "DEFAULT_RENDERER_CLASSES": [
+        "utils.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "utils.renderers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
+
     # Ensure only logged-in users can access API
     "DEFAULT_PERMISSION_CLASSES": ["rest_framework.permissions.IsAuthenticated"],
 
@@ -167,7 +270,7 @@ REST_FRAMEWORK = {
 
     # Prevent API overload
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.AnonRateThrottle",
+        "utils.throttling.AnonRateThrottle",
         "utils.throttling.DailyRateThrottle",
         "utils.throttling.MinuteRateThrottle",
     ],
@@ -178,6 +281,24 @@ REST_FRAMEWORK = {
     },
 }
 
+# Where utils.throttling keeps the per client rate limit state, shared by all workers unless
+# "utils.throttling.LocalRateStore" is used. "utils.throttling.RedisRateStore" needs the redis package.
+# The rows of the database store stay after their clients go quiet, run purge_rate_limits periodically.
+RATE_LIMIT_STORE = os.environ.get("RATE_LIMIT_STORE", "utils.throttling.DatabaseRateStore")
+RATE_LIMIT_REDIS_URL = os.environ.get("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+
+# How utils.events relays shopping list events between worker processes. "utils.events.LocalEventBackend"
+# only reaches subscribers of the same process, "utils.events.RedisEventBackend" needs the redis package.
+EVENTS_BACKEND = os.environ.get("EVENTS_BACKEND", "utils.events.LocalEventBackend")
+EVENTS_REDIS_URL = os.environ.get("EVENTS_REDIS_URL", "redis://localhost:6379/0")
+# Seconds between keepalive comments on idle event streams
+EVENTS_KEEPALIVE = int(os.environ.get("EVENTS_KEEPALIVE", default=15))
+
+# utils.timing.ServerTimingMiddleware reports per request SQL and stage timings in a Server-Timing
+# header, and logs requests slower than SLOW_REQUEST_MS milliseconds
+SERVER_TIMING_HEADER = int(os.environ.get("SERVER_TIMING_HEADER", default=1))
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", default=500))
+
 # SETTINGS for OpenAPI Documentation
 SPECTACULAR_SETTINGS = {
     "TITLE": "DJANGO BACKEND",
@@ -0,0 +1,32 @@
+from django.core.handlers import asgi
+from django.urls import Resolver404, resolve
+
+
+class ASGIHandler(asgi.ASGIHandler):
+    """
+    Django's ASGI handler, except that views with long_lived = True, such as event streams,
+    don't get a thread of their own. Django runs the sync code of a request, such as most
+    middleware and the async ORM, in a thread that lives until the response is sent, which
+    for a stream means until the client disconnects. Requests to long lived views run that
+    code in the one thread shared by sync code outside of a request instead, so an open
+    stream costs a coroutine. Their sync code must therefore be short and leave no state
+    on the thread, such as an open transaction.
+    """
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and self.is_long_lived(scope):
+            await self.handle(scope, receive, send)
+        else:
+            await super().__call__(scope, receive, send)
+
+    def is_long_lived(self, scope):
+        # The path_info of the request, see ASGIRequest
+        script_name = asgi.get_script_prefix(scope)
+        path_info = scope["path"].removeprefix(script_name) if script_name else scope["path"]
+
+        try:
+            match = resolve(path_info)
+        except Resolver404:
+            return False
+
+        return getattr(getattr(match.func, "view_class", None), "long_lived", False)
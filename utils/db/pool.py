@@ -0,0 +1,181 @@
+import threading
+import time
+
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    A thread safe pool of up to max_size connections, checked out with getconn() and returned
+    with putconn(). Waits up to timeout seconds for a free connection. Connections idle for
+    longer than check_after seconds are pinged before reuse and replaced when the ping fails,
+    connections older than max_lifetime seconds are replaced. Connections returned broken are
+    closed and counted in the reconnects.
+
+    The pool is independent of the database driver, connect() opens a connection, close(conn)
+    closes it, reset(conn) readies a returned connection for reuse and returns whether it is
+    still usable, and ping(conn) returns whether the server still answers.
+    """
+
+    def __init__(
+        self, connect, close, reset, ping, max_size, min_size=0, timeout=10.0, check_after=30.0, max_lifetime=3600.0
+    ):
+        self.connect = connect
+        self.close = close
+        self.reset = reset
+        self.ping = ping
+        self.max_size = max_size
+        self.min_size = min_size
+        self.timeout = timeout
+        self.check_after = check_after
+        self.max_lifetime = max_lifetime
+
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_size)
+        # (connection, opened at, returned at), the most recently returned last
+        self.idle = deque()
+        self.opened_at = {}
+
+        self.checkouts = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.timeouts = 0
+        self.connects = 0
+        self.reconnects = 0
+
+    def getconn(self):
+        start = time.perf_counter()
+        if not self.slots.acquire(timeout=self.timeout):
+            with self.lock:
+                self.timeouts += 1
+            raise PoolTimeout(f"No free connection in the pool of {self.max_size} within {self.timeout}s")
+
+        waited = time.perf_counter() - start
+        with self.lock:
+            self.checkouts += 1
+            self.wait_time += waited
+            self.max_wait_time = max(self.max_wait_time, waited)
+
+        try:
+            return self.get_idle() or self.open()
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def putconn(self, conn, broken=False):
+        try:
+            now = time.monotonic()
+            if broken or not self.reset(conn):
+                self.discard(conn, broken=True)
+            elif now - self.opened_at[id(conn)] >= self.max_lifetime:
+                self.discard(conn)
+            else:
+                with self.lock:
+                    self.idle.append((conn, self.opened_at[id(conn)], now))
+        finally:
+            self.slots.release()
+
+    def get_idle(self):
+        while True:
+            with self.lock:
+                if not self.idle:
+                    return None
+                # Reuse the warmest connection, the coldest ones age out
+                conn, opened_at, returned_at = self.idle.pop()
+
+            now = time.monotonic()
+            if now - opened_at >= self.max_lifetime:
+                self.discard(conn)
+            elif now - returned_at >= self.check_after and not self.ping(conn):
+                self.discard(conn, broken=True)
+            else:
+                return conn
+
+    def open(self):
+        conn = self.connect()
+        with self.lock:
+            self.opened_at[id(conn)] = time.monotonic()
+            self.connects += 1
+
+        return conn
+
+    def discard(self, conn, broken=False):
+        with self.lock:
+            self.opened_at.pop(id(conn), None)
+            # Replaced by a new connection on a later checkout
+            self.reconnects += broken
+        try:
+            self.close(conn)
+        except Exception:
+            # Already broken
+            pass
+
+    def fill(self):
+        """
+        Open connections until min_size are idle.
+        """
+        while True:
+            with self.lock:
+                if len(self.idle) >= self.min_size or len(self.opened_at) >= self.max_size:
+                    return
+
+            conn = self.open()
+            with self.lock:
+                self.idle.append((conn, self.opened_at[id(conn)], time.monotonic()))
+
+    def close_idle(self):
+        with self.lock:
+            idle, self.idle = self.idle, deque()
+
+        for conn, _, _ in idle:
+            self.discard(conn)
+
+    def get_metrics(self):
+        with self.lock:
+            return {
+                "size": len(self.opened_at),
+                "idle": len(self.idle),
+                "in_use": len(self.opened_at) - len(self.idle),
+                "max_size": self.max_size,
+                "checkouts": self.checkouts,
+                "wait_ms": self.wait_time * 1000,
+                "max_wait_ms": self.max_wait_time * 1000,
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "reconnects": self.reconnects,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, **kwargs):
+    """
+    The process wide pool of the key, such as the alias and database, created with the
+    arguments on first use.
+    """
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(**kwargs)
+
+        return _pools[key]
+
+
+def get_pool_metrics():
+    with _pools_lock:
+        pools = dict(_pools)
+
+    return {key: pool.get_metrics() for key, pool in pools.items()}
+
+
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+
+    for pool in pools:
+        pool.close_idle()
@@ -0,0 +1,99 @@
+"""
+The PostgreSQL backend with a process wide connection pool per database, see
+utils.db.pool.ConnectionPool. Configured through OPTIONS["pool"], with the arguments of
+the pool: max_size, min_size, timeout, check_after and max_lifetime. Closing a
+connection, such as at the end of a request with CONN_MAX_AGE 0, returns it to the pool.
+"""
+import functools
+
+from django.db.backends.postgresql import base, creation
+from django.utils.asyncio import async_unsafe
+
+from utils.db.pool import close_pools, get_pool
+from utils.timing import stage
+
+Database = base.Database
+
+
+def reset_connection(conn):
+    if conn.closed:
+        return False
+
+    # The transaction status values are the same for psycopg2 and psycopg, 0 idle and 4 unknown
+    status = conn.info.transaction_status
+    if status == 4:
+        return False
+
+    if status != 0:
+        try:
+            conn.rollback()
+        except Database.Error:
+            return False
+
+    return True
+
+
+def ping_connection(conn):
+    if not reset_connection(conn):
+        return False
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    except Database.Error:
+        return False
+
+    # Without autocommit the ping opened a transaction
+    return reset_connection(conn)
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled connections to the test database would block dropping it
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop("pool", None)
+
+        return conn_params
+
+    def get_pool(self, conn_params):
+        key = "{alias}:{user}@{host}:{port}/{dbname}".format(alias=self.alias, **{
+            name: conn_params.get(name, "") for name in ["user", "host", "port", "dbname"]
+        })
+        pool = get_pool(
+            key,
+            connect=functools.partial(super().get_new_connection, conn_params),
+            close=lambda conn: conn.close(),
+            reset=reset_connection,
+            ping=ping_connection,
+            **self.settings_dict["OPTIONS"].get("pool", {}),
+        )
+        pool.fill()
+
+        return pool
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        # Set by connecting, reused connections keep the isolation level they were opened with
+        self.isolation_level = base.IsolationLevel(
+            self.settings_dict["OPTIONS"].get("isolation_level", base.IsolationLevel.READ_COMMITTED)
+        )
+
+        with stage("db-connect"):
+            self.pool = self.get_pool(conn_params)
+            return self.pool.getconn()
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                # Most errors, such as integrity errors, leave the connection usable
+                broken = self.errors_occurred and not ping_connection(self.connection)
+                self.pool.putconn(self.connection, broken=broken)
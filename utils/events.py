@@ -0,0 +1,157 @@
+import asyncio
+import json
+import threading
+
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+class Subscription:
+    """
+    A subscriber of an EventHub channel. Events wait in a bounded queue on the subscriber's
+    event loop, so an idle connection costs a queue and a suspended coroutine, not a thread.
+    A subscriber that falls max_queue_size events behind is ended with None.
+    """
+
+    def __init__(self, hub, channel, max_queue_size):
+        self.hub = hub
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(max_queue_size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.hub.unsubscribe(self)
+
+    def put(self, event):
+        # Events are published from any thread, the queue belongs to the subscriber's loop
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The loop is closed, the subscriber is gone
+            self.hub.unsubscribe(self)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class EventHub:
+    """
+    Fans events out to the subscribers of this process. Events are published through the
+    backend, which delivers them to the hub of every worker process.
+    """
+    max_queue_size = 100
+
+    def __init__(self, backend):
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+        self.backend = backend
+        self.backend.attach(self)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, self.max_queue_size)
+        with self.lock:
+            self.subscriptions.setdefault(channel, set()).add(subscription)
+
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.channel, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self.subscriptions.pop(subscription.channel, None)
+
+    def subscriber_count(self, channel):
+        with self.lock:
+            return len(self.subscriptions.get(channel, ()))
+
+    def publish(self, channel, event):
+        self.backend.publish(channel, event)
+
+    def deliver(self, channel, event):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(channel, ()))
+
+        for subscription in subscriptions:
+            subscription.put(event)
+
+
+class LocalEventBackend:
+    """
+    Delivers events to the hubs of this process only, so subscribers only see changes made
+    by the same worker. Meant for tests and single process deployments.
+    """
+
+    def __init__(self):
+        self.hubs = []
+
+    def attach(self, hub):
+        self.hubs.append(hub)
+
+    def publish(self, channel, event):
+        for hub in self.hubs:
+            hub.deliver(channel, event)
+
+
+class RedisEventBackend:
+    """
+    Relays events between worker processes and hosts through Redis pub/sub. Every process
+    holds a single Redis subscription, however many clients it streams to. Requires the
+    redis package and EVENTS_REDIS_URL.
+    """
+    prefix = "events:"
+
+    def __init__(self):
+        import redis
+
+        self.client = redis.Redis.from_url(settings.EVENTS_REDIS_URL)
+        self.hubs = []
+        self.listener = None
+
+    def attach(self, hub):
+        self.hubs.append(hub)
+
+        if self.listener is None:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            pubsub.psubscribe(**{f"{self.prefix}*": self.handle_message})
+            self.listener = pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def handle_message(self, message):
+        channel = message["channel"].decode()[len(self.prefix):]
+        event = json.loads(message["data"])
+
+        for hub in self.hubs:
+            hub.deliver(channel, event)
+
+    def publish(self, channel, event):
+        self.client.publish(self.prefix + channel, json.dumps(event))
+
+
+@lru_cache
+def _load_event_hub(path):
+    return EventHub(import_string(path)())
+
+
+def get_event_hub():
+    return _load_event_hub(settings.EVENTS_BACKEND)
+
+
+def publish(channel, event):
+    """
+    Publish the event once the current transaction commits, rolled back changes are never seen.
+    """
+    transaction.on_commit(lambda: get_event_hub().publish(channel, event), robust=True)
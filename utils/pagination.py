@@ -1,7 +1,166 @@
-from rest_framework.pagination import PageNumberPagination
+import json
 
+from django.core.exceptions import ValidationError
+from django.db.models import F, Field, Func, Q, Value
+from django.db.models.lookups import GreaterThan, LessThan
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, _reverse_ordering
+from rest_framework.utils.urls import remove_query_param
 
-class LargerResultsSetPagination(PageNumberPagination):
+
+class RowValue(Func):
+    function = ""
+    output_field = Field()
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination that seeks on every field of the ordering rather than only the
+    first one, so that orderings such as ("purchased", "id") page without offsets or
+    count queries. The last ordering field must be unique and no field may be null.
+    """
+    ordering = ("id",)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+
+        return self.set_page(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+
+        return self.set_page([instance async for instance in page_queryset])
+
+    def get_page_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (self.reverse, self.current_position) = (False, None)
+        else:
+            (self.reverse, self.current_position) = (self.cursor.reverse, self.cursor.position)
+
+        if self.reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if self.current_position is not None:
+            try:
+                queryset = queryset.filter(self.get_seek_filter(queryset, self.current_position, self.reverse))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        # Fetch an extra item to find out whether another page follows
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        self.page = list(results[:self.page_size])
+        has_following_page = len(results) > len(self.page)
+
+        if self.reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = True
+            self.has_previous = has_following_page
+        else:
+            self.has_next = has_following_page
+            self.has_previous = self.current_position is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_seek_filter(self, queryset, position, reverse):
+        descending = {order.startswith("-") for order in self.ordering}
+
+        if len(descending) == 1:
+            # A row value comparison lets the database seek straight into a matching composite index
+            fields = [queryset.model._meta.get_field(order.lstrip("-")) for order in self.ordering]
+            columns = RowValue(*[F(field.name) for field in fields])
+            values = RowValue(*[Value(field.to_python(value), output_field=field) for field, value in zip(fields, position)])
+            lookup = LessThan if descending.pop() != reverse else GreaterThan
+
+            return lookup(columns, values)
+
+        seek_filter = Q()
+        preceding_fields_equal = Q()
+
+        for order, value in zip(self.ordering, position):
+            field_name = order.lstrip("-")
+            lookup = "lt" if order.startswith("-") != reverse else "gt"
+
+            seek_filter |= preceding_fields_equal & Q(**{f"{field_name}__{lookup}": value})
+            preceding_fields_equal &= Q(**{field_name: value})
+
+        return seek_filter
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        if not self.page:
+            # Nothing precedes the cursor position, so the next page is the first one
+            return remove_query_param(self.base_url, self.cursor_query_param)
+
+        position = self._get_position_from_instance(self.page[-1], self.ordering)
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+
+        if not self.page:
+            position = self.cursor.position
+        else:
+            position = self._get_position_from_instance(self.page[0], self.ordering)
+
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def decode_cursor(self, request):
+        cursor = super().decode_cursor(request)
+        if cursor is None or cursor.position is None:
+            return cursor
+
+        try:
+            position = json.loads(cursor.position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        return Cursor(offset=0, reverse=cursor.reverse, position=position)
+
+    def encode_cursor(self, cursor):
+        return super().encode_cursor(cursor._replace(position=json.dumps(cursor.position, default=str)))
+
+    def _get_position_from_instance(self, instance, ordering):
+        if isinstance(instance, dict):
+            return [instance[order.lstrip("-")] for order in ordering]
+
+        return [getattr(instance, order.lstrip("-")) for order in ordering]
+
+
+class ShoppingItemPagination(KeysetPagination):
+    ordering = ("purchased", "id")
     page_size = 5
     page_size_query_param = "page_size"
     max_page_size = 10
+
+
+class ShoppingItemSearchPagination(KeysetPagination):
+    ordering = ("name", "id")
+    page_size = 10
+    page_size_query_param = "page_size"
+    max_page_size = 50
@@ -0,0 +1,74 @@
+from django.conf import settings
+from rest_framework import renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.utils import encoders
+
+from utils.timing import stage
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+_encoder = encoders.JSONEncoder()
+
+
+def _default(obj):
+    # orjson handles UUIDs natively, the rest falls back to DRF's encoder (datetimes, decimals, lazy strings, ...)
+    return _encoder.default(obj)
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """
+    Renders with orjson, byte for byte like JSONRenderer with the default settings, except that
+    NaN and infinities render as null rather than failing. Falls back to JSONRenderer without
+    orjson, for the options orjson does not support, such as indents, and for the values it
+    cannot encode, such as integers beyond 64 bits.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with stage("render"):
+            if orjson is None or not self.is_compatible(accepted_media_type, renderer_context):
+                return super().render(data, accepted_media_type, renderer_context)
+
+            if data is None:
+                return b""
+
+            try:
+                # Like json, stringify non-string keys, such as the indexes in the errors of ListField.
+                # Datetimes go through DRF's encoder, which renders UTC as Z.
+                ret = orjson.dumps(
+                    data, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+                )
+            except orjson.JSONEncodeError:
+                return super().render(data, accepted_media_type, renderer_context)
+
+        # Like JSONRenderer, escape the separators that are valid JSON but end lines in javascript
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+
+    def is_compatible(self, accepted_media_type, renderer_context):
+        return (
+            self.get_indent(accepted_media_type, renderer_context or {}) is None
+            and self.compact
+            and not self.ensure_ascii
+        )
+
+
+class FastJSONParser(JSONParser):
+    """
+    Parses with orjson, falls back to JSONParser without orjson and for other charsets than UTF-8.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+
+        if orjson is None or encoding.lower().replace("-", "") != "utf8":
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError("JSON parse error - %s" % str(exc))
@@ -0,0 +1,146 @@
+import random
+
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.functional import SimpleLazyObject, empty
+
+_current_reads = ContextVar("replica_reads", default=None)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def get_pin_cache_key(user_pk):
+    return f"primary-pin:{user_pk}"
+
+
+def pin_to_primary(user_pk):
+    """
+    Send the reads of the user to the primary for the next REPLICA_PIN_SECONDS, so the user
+    reads their own writes while the replicas catch up.
+    """
+    caches[settings.REPLICA_PIN_CACHE].set(get_pin_cache_key(user_pk), True, timeout=settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned_to_primary(user_pk):
+    return caches[settings.REPLICA_PIN_CACHE].get(get_pin_cache_key(user_pk), False)
+
+
+class ReplicaReads:
+    """
+    Whether the reads of a safe request may go to the replicas. Known once the request is
+    authenticated, reads before then, such as the ones authenticating it, go to the primary.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.pinned = None
+
+    def get_user(self):
+        user = getattr(self.request, "user", None)
+        # Not evaluated here, loading the session user reads through the router
+        if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+            return None
+
+        return user
+
+    def use_primary(self):
+        if self.pinned is None:
+            user = self.get_user()
+            if user is not None and user.is_authenticated:
+                self.pinned = is_pinned_to_primary(user.pk)
+
+        return self.pinned is not False
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of the replicated models in safe requests to a random database of
+    DATABASE_REPLICAS, unless the user wrote recently, see ReplicaRoutingMiddleware. Everything
+    else goes to the primary, the default database.
+    """
+    # Rate limits, sessions and tokens are read to be written or right after being written
+    replicated_models = {
+        "api.shoppinglist", "api.shoppinglist_members", "api.shoppingitem", "api.shoppingitemtombstone", "api.user"
+    }
+
+    def db_for_read(self, model, **hints):
+        reads = _current_reads.get()
+        if (
+            reads is None
+            or not settings.DATABASE_REPLICAS
+            or model._meta.label_lower not in self.replicated_models
+            or reads.use_primary()
+        ):
+            return DEFAULT_DB_ALIAS
+
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        # Also for instances read from a replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets ReplicaRouter send the reads of safe requests to the replicas, and pins the user of an
+    unsafe request to the primary for REPLICA_PIN_SECONDS.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        token = _current_reads.set(self.get_reads(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_reads.reset(token)
+
+        if self.pins(request):
+            self.pin_user(request)
+
+        return response
+
+    async def __acall__(self, request):
+        token = _current_reads.set(self.get_reads(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_reads.reset(token)
+
+        if self.pins(request):
+            # Checking the user of a session may read it
+            await sync_to_async(self.pin_user)(request)
+
+        return response
+
+    def get_reads(self, request):
+        return ReplicaReads(request) if request.method in SAFE_METHODS else None
+
+    def pins(self, request):
+        return request.method not in SAFE_METHODS and bool(settings.DATABASE_REPLICAS)
+
+    def pin_user(self, request):
+        # DRF sets the user of token authenticated requests on the request too
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            pin_to_primary(user.pk)
@@ -1,9 +1,160 @@
-from rest_framework.throttling import UserRateThrottle
+import threading
 
+from functools import lru_cache
 
-class DailyRateThrottle(UserRateThrottle):
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Greatest
+from django.utils.module_loading import import_string
+from rest_framework import throttling
+
+
+class LocalRateStore:
+    """
+    Keeps the rate limit state in process memory. Every worker process enforces its own
+    limit, so this is meant for tests and single process deployments.
+    """
+    max_entries = 100_000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.arrivals = {}
+
+    def acquire(self, key, interval, period, now):
+        with self.lock:
+            arrival = max(self.arrivals.get(key, now), now)
+            if arrival + interval - now > period:
+                return arrival + interval - now - period
+
+            if len(self.arrivals) >= self.max_entries:
+                # Arrivals in the past carry no state, a missing key means the same thing
+                self.arrivals = {key: value for key, value in self.arrivals.items() if value > now}
+
+            self.arrivals[key] = arrival + interval
+            return None
+
+
+class DatabaseRateStore:
+    """
+    Keeps the rate limit state in the database, shared by every worker process. An allowed
+    request costs a single conditional UPDATE.
+    """
+
+    def acquire(self, key, interval, period, now):
+        from app.api.models import RateLimit
+
+        latest_allowed_arrival = now + period - interval
+        rate_limits = RateLimit.objects.filter(key=key)
+
+        for _ in range(3):
+            updated = rate_limits.filter(arrival__lte=latest_allowed_arrival).update(
+                arrival=Greatest(F("arrival"), Value(now, output_field=FloatField())) + interval
+            )
+            if updated:
+                return None
+
+            arrival = rate_limits.values_list("arrival", flat=True).first()
+            if arrival is not None and arrival > latest_allowed_arrival:
+                return arrival - latest_allowed_arrival
+
+            if arrival is None:
+                try:
+                    with transaction.atomic():
+                        RateLimit.objects.create(key=key, arrival=now + interval)
+                    return None
+                except IntegrityError:
+                    # Another process created the row first, apply the update to it
+                    pass
+
+        return None
+
+    def prune(self, now, batch_size=1000):
+        """
+        Deletes the rows whose arrival is in the past, which acquire treats like missing ones.
+        Returns the number of deleted rows.
+        """
+        from app.api.models import RateLimit
+
+        expired = RateLimit.objects.filter(arrival__lt=now)
+        pruned = 0
+        while True:
+            keys = list(expired.values_list("key", flat=True)[:batch_size])
+            if not keys:
+                return pruned
+
+            # Rows acquired again since they were read keep their state
+            pruned += expired.filter(key__in=keys).delete()[0]
+
+
+class RedisRateStore:
+    """
+    Keeps the rate limit state in Redis, shared by every worker process and host. Requires
+    the redis package and RATE_LIMIT_REDIS_URL.
+    """
+    script = """
+        local arrival = math.max(tonumber(redis.call("GET", KEYS[1]) or ARGV[3]), tonumber(ARGV[3]))
+        local next_arrival = arrival + tonumber(ARGV[1])
+        if next_arrival - tonumber(ARGV[3]) > tonumber(ARGV[2]) then
+            return tostring(next_arrival - tonumber(ARGV[3]) - tonumber(ARGV[2]))
+        end
+        redis.call("SET", KEYS[1], tostring(next_arrival), "PX", math.ceil(tonumber(ARGV[2]) * 1000))
+        return false
+    """
+
+    def __init__(self):
+        import redis
+
+        self.client = redis.Redis.from_url(settings.RATE_LIMIT_REDIS_URL)
+        self.acquire_script = self.client.register_script(self.script)
+
+    def acquire(self, key, interval, period, now):
+        wait = self.acquire_script(keys=[key], args=[interval, period, now])
+
+        return None if wait is None else float(wait)
+
+
+@lru_cache
+def _load_rate_store(path):
+    return import_string(path)()
+
+
+def get_rate_store():
+    return _load_rate_store(settings.RATE_LIMIT_STORE)
+
+
+class GCRAThrottleMixin:
+    """
+    Throttles with the generic cell rate algorithm: instead of a history of request
+    timestamps, each client is tracked by a single theoretical arrival time that moves
+    forward by duration / num_requests with every allowed request.
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.wait_time = get_rate_store().acquire(
+            self.key, interval=self.duration / self.num_requests, period=self.duration, now=self.timer()
+        )
+
+        return self.wait_time is None
+
+    def wait(self):
+        return self.wait_time
+
+
+class AnonRateThrottle(GCRAThrottleMixin, throttling.AnonRateThrottle):
+    pass
+
+
+class DailyRateThrottle(GCRAThrottleMixin, throttling.UserRateThrottle):
     scope = "user_day"
 
 
-class MinuteRateThrottle(UserRateThrottle):
+class MinuteRateThrottle(GCRAThrottleMixin, throttling.UserRateThrottle):
     scope = "user_minute"
@@ -0,0 +1,211 @@
+import logging
+import time
+
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from utils.db.pool import get_pool_metrics
+
+logger = logging.getLogger(__name__)
+
+_current_timer = ContextVar("request_timer", default=None)
+
+
+class RequestTimer:
+    """
+    Collects the queries and stage durations of a single request.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.query_count = 0
+        self.query_time = 0.0
+        self.duplicate_queries = 0
+        self.seen_queries = set()
+        self.stages = {}
+        self.active_stages = set()
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_time += time.perf_counter() - start
+            self.query_count += 1
+
+            if not many:
+                try:
+                    key = (sql, tuple(params) if isinstance(params, list) else params)
+                    if key in self.seen_queries:
+                        self.duplicate_queries += 1
+                    else:
+                        self.seen_queries.add(key)
+                except TypeError:
+                    # Unhashable parameters, such as lists for array columns
+                    pass
+
+    @contextmanager
+    def stage(self, name):
+        # Nested stages of the same name, such as serializers calling serializers, count once
+        if name in self.active_stages:
+            yield
+            return
+
+        self.active_stages.add(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+            self.active_stages.discard(name)
+
+    def get_metrics(self):
+        metrics = {
+            "total_ms": (time.perf_counter() - self.start) * 1000,
+            "db_ms": self.query_time * 1000,
+            "db_queries": self.query_count,
+            "duplicate_queries": self.duplicate_queries,
+        }
+        metrics.update({f"{name}_ms": duration * 1000 for name, duration in self.stages.items()})
+
+        return metrics
+
+    def get_header(self, metrics):
+        entries = [
+            f'db;dur={metrics["db_ms"]:.2f};desc="{self.query_count} queries"',
+            f'db-duplicates;desc="{self.duplicate_queries}"',
+        ]
+        entries += [f"{name};dur={duration * 1000:.2f}" for name, duration in self.stages.items()]
+        entries.append(f"total;dur={metrics['total_ms']:.2f}")
+
+        return ", ".join(entries)
+
+
+@contextmanager
+def stage(name):
+    """
+    Time a stage of the current request, if any.
+    """
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+
+    with timer.stage(name):
+        yield
+
+
+class ServerTimingMiddleware:
+    """
+    Reports the query count, SQL time, duplicate queries and the durations of the request
+    stages in a Server-Timing header, and logs requests slower than SLOW_REQUEST_MS along with
+    the state of the connection pools.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        timer = RequestTimer()
+        token = _current_timer.set(timer)
+
+        try:
+            with self.record_queries(timer):
+                response = self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+
+        return self.process_timing(request, response, timer)
+
+    async def __acall__(self, request):
+        timer = RequestTimer()
+        token = _current_timer.set(timer)
+
+        # Connections are per thread, the wrappers go on the ones of the thread that runs the
+        # ORM calls of the request
+        queries = await sync_to_async(self.record_queries)(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(queries.close)()
+            _current_timer.reset(token)
+
+        return self.process_timing(request, response, timer)
+
+    def record_queries(self, timer):
+        def record_query(execute, sql, params, many, context):
+            # The connections of a thread shared by requests, see utils.asgi.ASGIHandler, carry
+            # the wrappers of all of them
+            if _current_timer.get() is not timer:
+                return execute(sql, params, many, context)
+
+            return timer.record_query(execute, sql, params, many, context)
+
+        stack = ExitStack()
+        for connection in connections.all():
+            connection.execute_wrappers.append(record_query)
+            # Not the last wrapper when the requests sharing the thread end in another order
+            stack.callback(connection.execute_wrappers.remove, record_query)
+
+        return stack
+
+    def process_timing(self, request, response, timer):
+        metrics = timer.get_metrics()
+        if settings.SERVER_TIMING_HEADER:
+            response["Server-Timing"] = timer.get_header(metrics)
+
+        if metrics["total_ms"] >= settings.SLOW_REQUEST_MS:
+            fields = {"method": request.method, "path": request.path, "status": response.status_code, **metrics}
+            logger.warning(
+                "Slow request %s",
+                " ".join(f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}" for key, value in fields.items()),
+                # Waiting for a pooled connection is a common cause
+                extra={"request_timing": fields, "db_pools": get_pool_metrics()},
+            )
+
+        return response
+
+
+class TimedAPIViewMixin:
+    """
+    Times the authentication, throttling and permission stages of a DRF view.
+    """
+
+    def perform_authentication(self, request):
+        with stage("auth"):
+            super().perform_authentication(request)
+
+    def check_throttles(self, request):
+        with stage("throttle"):
+            super().check_throttles(request)
+
+    def check_permissions(self, request):
+        with stage("permission"):
+            super().check_permissions(request)
+
+    def check_object_permissions(self, request, obj):
+        with stage("permission"):
+            super().check_object_permissions(request, obj)
+
+
+class TimedSerializerMixin:
+    """
+    Times the serialization of a serializer's data.
+    """
+
+    @property
+    def data(self):
+        with stage("serialize"):
+            return super().data